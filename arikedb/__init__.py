@@ -1,5 +1,15 @@
 from .arikedb import TsVariable, Stack, Fifo, SortedList, Collection, Arikedb
+from .aio import AsyncTsVariable, AsyncStack, AsyncFifo, AsyncSortedList, AsyncCollection, AsyncArikedb
+from .cache import ValueCache
 from .common import ValueType, Event, VarEvent
+from .dispatch import CallbackDispatcher
+from .policy import CallPolicy, CallStats
+from .prepared import PreparedGet, PreparedSet
+from .scheduler import SamplingScheduler
+from .sharding import HashRing, ShardedArikedb, ShardedCollection, ShardedPreparedGet, ShardedPreparedSet, \
+    ShardedSubscriptionManager
+from .subscriptions import SubscriptionManager, Subscription, SubscriptionThread
+from .writers import SetCoalescer, BufferedWriter, DeadbandWriter
 
 __version__ = "1.1.3"
 
@@ -11,7 +21,32 @@ __all__ = [
     "SortedList",
     "Collection",
     "Arikedb",
+    "AsyncTsVariable",
+    "AsyncStack",
+    "AsyncFifo",
+    "AsyncSortedList",
+    "AsyncCollection",
+    "AsyncArikedb",
     "Event",
     "VarEvent",
     "ValueType",
+    "SetCoalescer",
+    "BufferedWriter",
+    "DeadbandWriter",
+    "ValueCache",
+    "SubscriptionManager",
+    "Subscription",
+    "SubscriptionThread",
+    "CallbackDispatcher",
+    "CallPolicy",
+    "CallStats",
+    "PreparedGet",
+    "PreparedSet",
+    "SamplingScheduler",
+    "HashRing",
+    "ShardedArikedb",
+    "ShardedCollection",
+    "ShardedPreparedGet",
+    "ShardedPreparedSet",
+    "ShardedSubscriptionManager",
 ]
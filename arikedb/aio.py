@@ -0,0 +1,697 @@
+from __future__ import annotations
+import asyncio
+import time
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import grpc
+
+from .common import ValueType, Status, VarEvent
+from .arikedb import TsVariable, Array, channel_credentials
+from .policy import CallPolicy
+from .arike_main_pb2_grpc import ArikedbRPCStub
+from .arike_collection_pb2 import CollectionMeta, ListCollectionsRequest, CreateCollectionsRequest, DeleteCollectionsRequest
+from .arike_ts_variable_pb2 import TsVariableMeta, ListVariablesRequest, CreateVariablesRequest, DeleteVariablesRequest, \
+    SetVariablesRequest, GetVariablesRequest, SubscribeVariablesRequest
+from .arike_stack_pb2 import StackMeta, ListStacksRequest, CreateStacksRequest, DeleteStacksRequest, \
+    PutStacksRequest, PopStacksRequest, StackValue, StackNamesCount
+from .arike_fifo_pb2 import FifoMeta, ListFifosRequest, CreateFifosRequest, DeleteFifosRequest, \
+    PushFifosRequest, PullFifosRequest, FifoValue, FifoNamesCount
+from .arike_sorted_list_pb2 import SortedListMeta, ListSortedListsRequest, CreateSortedListsRequest, DeleteSortedListsRequest, \
+    InsertSortedListsRequest, BiggestSortedListsRequest, SmallestSortedListsRequest, SortedListValue, SortedListNamesCount
+from .arike_auth_pb2 import AuthenticateRequest
+from .codec import Buffer, check_status, set_variables_kwargs, add_ts_columns, variable_events, array_values, \
+    names_counts, ts_value, array_values_result, named_out, already_exists_result, not_found_result, split_request, \
+    already_exists_results, get_results, insert_results, set_results
+
+
+class AsyncTsVariable(TsVariable):
+
+    async def set(
+        self,
+        value: Union[int, float, str, bool],
+        timestamp_ns: Optional[int] = None
+    ) -> Dict[str, List[str]]:
+        return await self.collection.ts_variables_set([(self.name, value, timestamp_ns)])
+
+    async def get(
+        self
+    ) -> Optional[Tuple[str, int, Union[int, float, str, bool]]]:
+        val = await self.collection.ts_variables_get([self.name])
+        return val[0] if val else None
+
+
+class AsyncStack(Array):
+
+    async def put(
+        self,
+        values: Iterable[Union[int, float, str, bool]],
+    ) -> Dict[str, List[str]]:
+        return await self.collection.stacks_put([(self.name, values)])
+
+    async def pop(
+        self,
+        n: Optional[int] = None,
+        numpy: bool = False,
+        out: Optional[Buffer] = None
+    ) -> Tuple[str, Sequence[Union[int, float, str, bool]]]:
+        return (await self.collection.stacks_pop([(self.name, n or 1)], numpy, named_out(self.name, out)))[0]
+
+
+class AsyncFifo(Array):
+
+    async def push(
+        self,
+        values: Iterable[Union[int, float, str, bool]],
+    ) -> Dict[str, List[str]]:
+        return await self.collection.fifos_push([(self.name, values)])
+
+    async def pull(
+        self,
+        n: Optional[int] = None,
+        numpy: bool = False,
+        out: Optional[Buffer] = None
+    ) -> Tuple[str, Sequence[Union[int, float, str, bool]]]:
+        return (await self.collection.fifos_pull([(self.name, n or 1)], numpy, named_out(self.name, out)))[0]
+
+
+class AsyncSortedList(Array):
+
+    async def insert(
+        self,
+        values: Iterable[Union[int, float, str, bool]],
+    ) -> Dict[str, List[str]]:
+        return await self.collection.sorted_lists_insert([(self.name, values)])
+
+    async def biggest(
+        self,
+        n: Optional[int] = None,
+        remove: bool = False,
+        numpy: bool = False,
+        out: Optional[Buffer] = None
+    ) -> Tuple[str, Sequence[Union[int, float, str, bool]]]:
+        return (await self.collection.sorted_lists_biggest([(self.name, n or 1)], remove, numpy, named_out(self.name, out)))[0]
+
+    async def smallest(
+        self,
+        n: Optional[int] = None,
+        remove: bool = False,
+        numpy: bool = False,
+        out: Optional[Buffer] = None
+    ) -> Tuple[str, Sequence[Union[int, float, str, bool]]]:
+        return (await self.collection.sorted_lists_smallest([(self.name, n or 1)], remove, numpy, named_out(self.name, out)))[0]
+
+
+class AsyncCollection:
+
+    def __init__(
+        self,
+        name: str,
+        client: AsyncArikedb
+    ):
+        """Async collection handle. Unlike `Collection`, constructing it performs no I/O,
+        use `AsyncArikedb.create_collections` to create the collection on the server.
+        """
+        self.name = name
+        self.client = client
+
+    async def ts_variables(
+        self,
+        pattern: Optional[str] = None
+    ) -> List[AsyncTsVariable]:
+
+        response = await self.client._exec_request(
+            "ListVariables",
+            ListVariablesRequest,
+            {"collection": self.name, "pattern": pattern}
+        )
+        check_status(response, "Failed to listing variables")
+        return [AsyncTsVariable(v.name, ValueType(v.val_type), self) for v in response.variables]
+
+    async def ts_variable(
+        self,
+        name: str
+    ) -> Optional[AsyncTsVariable]:
+
+        ts_variables = await self.ts_variables(name)
+        return ts_variables[0] if len(ts_variables) > 0 else None
+
+    async def create_ts_variables(
+        self,
+        variables: Iterable[Tuple[str, ValueType]]
+    ) -> Dict[str, List[str]]:
+
+        request = CreateVariablesRequest(
+            collection=self.name,
+            variables=[TsVariableMeta(name=name, val_type=vt.value) for name, vt in variables]
+        )
+        responses = await self.client._exec_chunked("CreateVariables", request, "variables")
+        return already_exists_results(responses, "Failed creating variables")
+
+    async def delete_ts_variables(
+        self,
+        names: Iterable[str]
+    ) -> Dict[str, List[str]]:
+
+        response = await self.client._exec_request(
+            "DeleteVariables",
+            DeleteVariablesRequest,
+            {"collection": self.name, "names": names}
+        )
+        return not_found_result(response, "Failed deleting variables")
+
+    async def ts_variables_set(
+        self,
+        values: Iterable[Tuple[str, Union[int, float, str, bool], Optional[int]]],
+        timestamp_ns: Optional[int] = None
+    ) -> Dict[str, List[str]]:
+
+        request = SetVariablesRequest(**set_variables_kwargs(self.name, values, timestamp_ns))
+        responses = await self.client._exec_chunked("SetVariables", request, "values")
+        return set_results(responses)
+
+    async def ts_variables_set_columns(
+        self,
+        names: Sequence[str],
+        values: Sequence[Union[int, float, str, bool]],
+        timestamps: Optional[Sequence[int]] = None,
+        timestamp_ns: Optional[int] = None
+    ) -> Dict[str, List[str]]:
+
+        request = SetVariablesRequest(collection=self.name)
+        if timestamp_ns:
+            request.timestamp = timestamp_ns
+        add_ts_columns(request.values, names, values, timestamps)
+
+        responses = await self.client._exec_chunked("SetVariables", request, "values")
+        return set_results(responses)
+
+    async def ts_variables_get(
+        self,
+        names: Iterable[str],
+        columnar: bool = False
+    ) -> Union[List[Tuple[str, int, Union[int, float, str, bool]]], Tuple[List[str], Sequence, Sequence]]:
+
+        # Values take more room in the response than their names in the request
+        request = GetVariablesRequest(collection=self.name, names=names)
+        max_size = self.client._max_request_size and self.client._max_request_size // 4
+        responses = await self.client._exec_chunked("GetVariables", request, "names", max_size)
+        return get_results(responses, columnar)
+
+    async def variables_subscribe(
+        self,
+        names: Iterable[str],
+        events: Iterable[VarEvent],
+    ) -> AsyncIterator[Tuple[str, int, Union[int, float, str, bool]]]:
+        """Subscribe to variable events. Use it as `async for name, ts, value in collection.variables_subscribe(...)`,
+        the server stream is cancelled when the iteration stops.
+        """
+
+        call = self.client._stub.SubscribeVariables(
+            SubscribeVariablesRequest(
+                collection=self.name,
+                names=names,
+                events=variable_events(events)
+            ),
+            metadata=self.client._metadata()
+        )
+        try:
+            async for response in call:
+                value = ts_value(response)
+                if value is not None:
+                    yield value
+        finally:
+            call.cancel()
+
+    async def stacks(
+        self,
+        pattern: Optional[str] = None
+    ) -> List[AsyncStack]:
+
+        response = await self.client._exec_request(
+            "ListStacks",
+            ListStacksRequest,
+            {"collection": self.name, "pattern": pattern}
+        )
+        check_status(response, "Failed listing stacks")
+        return [AsyncStack(s.name, ValueType(s.val_type), s.max_size, self) for s in response.stacks]
+
+    async def stack(
+        self,
+        name: str
+    ) -> Optional[AsyncStack]:
+
+        stacks = await self.stacks(name)
+        return stacks[0] if len(stacks) > 0 else None
+
+    async def create_stacks(
+        self,
+        stacks: Iterable[Tuple[str, ValueType, Optional[int]]]
+    ) -> Dict[str, List[str]]:
+
+        response = await self.client._exec_request(
+            "CreateStacks",
+            CreateStacksRequest,
+            {"collection": self.name,
+             "stacks": [StackMeta(name=name, val_type=vtype.value, max_size=max_size) for name, vtype, max_size in stacks]}
+        )
+        return already_exists_result(response, "Failed creating stacks")
+
+    async def delete_stacks(
+        self,
+        names: Iterable[str]
+    ) -> Dict[str, List[str]]:
+
+        response = await self.client._exec_request(
+            "DeleteStacks",
+            DeleteStacksRequest,
+            {"collection": self.name, "names": names}
+        )
+        return not_found_result(response, "Failed deleting stacks")
+
+    async def stacks_put(
+        self,
+        values: Iterable[Tuple[str, Iterable[Union[int, float, str, bool]]]]
+    ) -> Dict:
+
+        stk_values, _ = array_values(StackValue, values, self.client._max_request_size)
+        request = PutStacksRequest(collection=self.name, values=stk_values)
+        # Parts are sent in order to keep the order of the values
+        responses = await self.client._exec_chunked("PutStacks", request, "values", concurrent=False)
+        return insert_results(responses, "Failed putting stacks")
+
+    async def stacks_pop(
+        self,
+        names: Iterable[Union[str, Tuple[str, int]]],
+        numpy: bool = False,
+        out: Optional[Dict[str, Buffer]] = None
+    ) -> List[Tuple[str, Sequence[Union[int, float, str, bool]]]]:
+
+        response = await self.client._exec_request(
+            "PopStacks",
+            PopStacksRequest,
+            {"collection": self.name,
+             "names_counts": names_counts(StackNamesCount, names)}
+        )
+        return array_values_result(response, "Failed popping stacks", numpy, out)
+
+    async def fifos(
+        self,
+        pattern: Optional[str] = None
+    ) -> List[AsyncFifo]:
+
+        response = await self.client._exec_request(
+            "ListFifos",
+            ListFifosRequest,
+            {"collection": self.name, "pattern": pattern}
+        )
+        check_status(response, "Failed listing fifos")
+        return [AsyncFifo(s.name, ValueType(s.val_type), s.max_size, self) for s in response.fifos]
+
+    async def fifo(
+        self,
+        name: str
+    ) -> Optional[AsyncFifo]:
+
+        fifos = await self.fifos(name)
+        return fifos[0] if len(fifos) > 0 else None
+
+    async def create_fifos(
+        self,
+        fifos: Iterable[Tuple[str, ValueType, Optional[int]]]
+    ) -> Dict[str, List[str]]:
+
+        response = await self.client._exec_request(
+            "CreateFifos",
+            CreateFifosRequest,
+            {"collection": self.name,
+             "fifos": [FifoMeta(name=name, val_type=vtype.value, max_size=max_size) for name, vtype, max_size in fifos]}
+        )
+        return already_exists_result(response, "Failed creating fifos")
+
+    async def delete_fifos(
+        self,
+        names: Iterable[str]
+    ) -> Dict[str, List[str]]:
+
+        response = await self.client._exec_request(
+            "DeleteFifos",
+            DeleteFifosRequest,
+            {"collection": self.name, "names": names}
+        )
+        return not_found_result(response, "Failed deleting fifos")
+
+    async def fifos_push(
+        self,
+        values: Iterable[Tuple[str, Iterable[Union[int, float, str, bool]]]]
+    ) -> Dict:
+
+        fifo_values, _ = array_values(FifoValue, values, self.client._max_request_size)
+        request = PushFifosRequest(collection=self.name, values=fifo_values)
+        # Parts are sent in order to keep the order of the values
+        responses = await self.client._exec_chunked("PushFifos", request, "values", concurrent=False)
+        return insert_results(responses, "Failed pushing fifos")
+
+    async def fifos_pull(
+        self,
+        names: Iterable[Union[str, Tuple[str, int]]],
+        numpy: bool = False,
+        out: Optional[Dict[str, Buffer]] = None
+    ) -> List[Tuple[str, Sequence[Union[int, float, str, bool]]]]:
+
+        response = await self.client._exec_request(
+            "PullFifos",
+            PullFifosRequest,
+            {"collection": self.name,
+             "names_counts": names_counts(FifoNamesCount, names)}
+        )
+        return array_values_result(response, "Failed pulling fifos", numpy, out)
+
+    async def sorted_lists(
+        self,
+        pattern: Optional[str] = None
+    ) -> List[AsyncSortedList]:
+
+        response = await self.client._exec_request(
+            "ListSortedLists",
+            ListSortedListsRequest,
+            {"collection": self.name, "pattern": pattern}
+        )
+        check_status(response, "Failed listing sorted lists")
+        return [AsyncSortedList(s.name, ValueType(s.val_type), s.max_size, self) for s in response.sorted_lists]
+
+    async def sorted_list(
+        self,
+        name: str
+    ) -> Optional[AsyncSortedList]:
+
+        sorted_lists = await self.sorted_lists(name)
+        return sorted_lists[0] if len(sorted_lists) > 0 else None
+
+    async def create_sorted_lists(
+        self,
+        sorted_lists: Iterable[Tuple[str, ValueType, Optional[int]]]
+    ) -> Dict[str, List[str]]:
+
+        response = await self.client._exec_request(
+            "CreateSortedLists",
+            CreateSortedListsRequest,
+            {"collection": self.name,
+             "sorted_lists": [SortedListMeta(name=name, val_type=vtype.value, max_size=max_size)
+                              for name, vtype, max_size in sorted_lists]}
+        )
+        return already_exists_result(response, "Failed creating sorted lists")
+
+    async def delete_sorted_lists(
+        self,
+        names: Iterable[str]
+    ) -> Dict[str, List[str]]:
+
+        response = await self.client._exec_request(
+            "DeleteSortedLists",
+            DeleteSortedListsRequest,
+            {"collection": self.name, "names": names}
+        )
+        return not_found_result(response, "Failed deleting sorted lists")
+
+    async def sorted_lists_insert(
+        self,
+        values: Iterable[Tuple[str, Iterable[Union[int, float, str, bool]]]]
+    ) -> Dict:
+
+        sorted_list_values, _ = array_values(SortedListValue, values, self.client._max_request_size)
+        request = InsertSortedListsRequest(collection=self.name, values=sorted_list_values)
+        responses = await self.client._exec_chunked("InsertSortedLists", request, "values")
+        return insert_results(responses, "Failed pushing sorted lists")
+
+    async def sorted_lists_biggest(
+        self,
+        names: Iterable[Union[str, Tuple[str, int]]],
+        remove: bool,
+        numpy: bool = False,
+        out: Optional[Dict[str, Buffer]] = None
+    ) -> List[Tuple[str, Sequence[Union[int, float, str, bool]]]]:
+
+        response = await self.client._exec_request(
+            "BiggestSortedLists",
+            BiggestSortedListsRequest,
+            {"collection": self.name,
+             "names_counts": names_counts(SortedListNamesCount, names, remove=remove)}
+        )
+        return array_values_result(response, "Failed reading biggest in sorted lists", numpy, out)
+
+    async def sorted_lists_smallest(
+        self,
+        names: Iterable[Union[str, Tuple[str, int]]],
+        remove: bool,
+        numpy: bool = False,
+        out: Optional[Dict[str, Buffer]] = None
+    ) -> List[Tuple[str, Sequence[Union[int, float, str, bool]]]]:
+
+        response = await self.client._exec_request(
+            "SmallestSortedLists",
+            SmallestSortedListsRequest,
+            {"collection": self.name,
+             "names_counts": names_counts(SortedListNamesCount, names, remove=remove)}
+        )
+        return array_values_result(response, "Failed reading smallest in sorted lists", numpy, out)
+
+
+class AsyncArikedb:
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 6923,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        use_ssl_tls: bool = False,
+        ca_path: Optional[str] = None,
+        cert_path: Optional[str] = None,
+        key_path: Optional[str] = None,
+        max_request_size: Optional[int] = 3_000_000,
+        policy: Optional[CallPolicy] = None
+    ):
+        """Asyncio RTDB Client constructor, built on grpc.aio. Takes the connection arguments of `Arikedb`
+        (host, port, credentials and TLS paths), its `max_request_size` and its `policy`. The channel pool,
+        metadata cache and read replicas of `Arikedb` (pool_size, pool_strategy, metadata_ttl, replicas,
+        hedge_reads, hedge_delay) are not available. All the request methods are coroutines and must be awaited
+        from a running event loop.
+        """
+        self._channel = None
+        self._stub = None
+        self._token = None
+        self._host = host
+        self._port = port
+        self._username = username
+        self._password = password
+        self._use_ssl_tls = use_ssl_tls
+        self._ca_path = ca_path
+        self._cert_path = cert_path
+        self._key_path = key_path
+        self._max_request_size = max_request_size
+        self._policy = policy or CallPolicy()
+        self._auth_lock: Optional[asyncio.Lock] = None
+
+    async def __aenter__(self):
+        return await self.connect()
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.disconnect()
+
+    async def connect(self) -> AsyncArikedb:
+        """ Connect to the ArikeDB server.
+        Returns:
+            AsyncArikedb: AsyncArikedb instance.
+        """
+
+        url = f"{self._host}:{self._port}"
+
+        if self._use_ssl_tls:
+            credentials = channel_credentials(self._ca_path, self._cert_path, self._key_path)
+            self._channel = grpc.aio.secure_channel(url, credentials)
+        else:
+            self._channel = grpc.aio.insecure_channel(url)
+
+        self._stub = ArikedbRPCStub(self._channel)
+        self._auth_lock = asyncio.Lock()
+
+        if self._username and self._password:
+            await self._authenticate()
+
+        return self
+
+    @property
+    def policy(
+        self
+    ) -> CallPolicy:
+        return self._policy
+
+    async def disconnect(
+        self
+    ):
+        await self._channel.close()
+        self._channel = None
+        self._stub = None
+        self._token = None
+
+    async def _authenticate(
+        self
+    ):
+        response = await self._exec_request(
+            "Authenticate",
+            AuthenticateRequest,
+            {"username": self._username,
+             "password": self._password},
+            add_meta=False
+        )
+
+        check_status(response, "Authentication failed")
+
+        self._token = response.token
+
+    async def _reauthenticate(
+        self,
+        token: Optional[str]
+    ):
+        """Authenticate again, unless another request already did since `token` was sent."""
+
+        async with self._auth_lock:
+            if self._token == token:
+                await self._authenticate()
+
+    def _metadata(
+        self,
+        add_meta: bool = True
+    ) -> tuple:
+        return tuple() if (not add_meta or not self._token) else (('authorization', self._token),)
+
+    async def _exec_request(
+        self,
+        method: str,
+        request_class,
+        request_kwargs: Optional[dict] = None,
+        add_meta: bool = True
+    ):
+        request_kwargs = {} if request_kwargs is None else request_kwargs
+        return await self._exec(method, request_class(**request_kwargs), add_meta)
+
+    async def _exec(
+        self,
+        method: str,
+        request,
+        add_meta: bool = True
+    ):
+        """Send a request following the call policy, like `Arikedb._invoke`."""
+
+        policy = self._policy
+        deadline = policy.deadline_for(method)
+        retries = 0
+        reauthenticated = False
+        while True:
+            token = self._token
+            started = time.monotonic()
+            try:
+                response = await self._call(method, request, add_meta, policy.remaining(deadline))
+            except grpc.RpcError as e:
+                policy.record_attempt(method, time.monotonic() - started)
+                delay = policy.backoff_for(retries)
+                if not policy.should_retry(method, request, e, retries, delay, deadline):
+                    raise
+                await asyncio.sleep(delay)
+                retries += 1
+                policy.record_retry(method)
+                continue
+            policy.record_attempt(method, time.monotonic() - started)
+
+            if (not reauthenticated and add_meta and policy.reauthenticate and self._username and self._password
+                    and response.status == Status.SessionExpired.value):
+                await self._reauthenticate(token)
+                reauthenticated = True
+                policy.record_reauthentication(method)
+                continue
+            return response
+
+    async def _call(
+        self,
+        method: str,
+        request,
+        add_meta: bool = True,
+        timeout: Optional[float] = None
+    ):
+        call = getattr(self._stub, method)(request, timeout=timeout, metadata=self._metadata(add_meta))
+        response = await call
+
+        resp_metadata = await call.initial_metadata()
+        if resp_metadata and "refresh_token" in resp_metadata:
+            self._token = resp_metadata["refresh_token"]
+
+        return response
+
+    async def _exec_chunked(
+        self,
+        method: str,
+        request,
+        field: str,
+        max_size: Optional[int] = None,
+        concurrent: bool = True,
+        add_meta: bool = True
+    ) -> List[Tuple]:
+
+        max_size = max_size or self._max_request_size
+        parts = split_request(request, field, max_size) if max_size else [request]
+        if not concurrent:
+            return [(part, await self._exec(method, part, add_meta)) for part in parts]
+
+        responses = await asyncio.gather(*(self._exec(method, part, add_meta) for part in parts))
+        return list(zip(parts, responses))
+
+    async def collections(
+        self,
+        pattern: Optional[str] = None
+    ) -> List[AsyncCollection]:
+
+        response = await self._exec_request(
+            "ListCollections",
+            ListCollectionsRequest,
+            {"pattern": pattern}
+        )
+        check_status(response, "Failed listing collections")
+        return [AsyncCollection(c.name, self) for c in response.collections]
+
+    async def collection(
+        self,
+        name: str
+    ) -> Optional[AsyncCollection]:
+
+        collections = await self.collections(pattern=name)
+        return collections[0] if len(collections) > 0 else None
+
+    async def create_collections(
+        self,
+        names: Iterable[str]
+    ) -> Dict[str, List[str]]:
+
+        response = await self._exec_request(
+            "CreateCollections",
+            CreateCollectionsRequest,
+            {"collections": [CollectionMeta(name=name) for name in names]}
+        )
+
+        check_status(response, "Failed creating collections", (Status.Ok, Status.LicenseLimitsExceeded))
+
+        return {
+            "already_exists": response.already_exists,
+            "license_exceeded": response.license_exceeded,
+        }
+
+    async def delete_collections(
+        self,
+        names: Iterable[str]
+    ) -> Dict[str, List[str]]:
+
+        response = await self._exec_request(
+            "DeleteCollections",
+            DeleteCollectionsRequest,
+            {"names": names}
+        )
+        return not_found_result(response, "Failed deleting collections")
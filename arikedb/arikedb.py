@@ -1,14 +1,24 @@
 from __future__ import annotations
-from threading import Thread
-from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+import time
+from concurrent.futures import Future, InvalidStateError, wait
+from threading import Lock, Thread, Timer
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
 
 import grpc
 
-from .common import ValueType, Status, VarEvent
-from .arike_main_pb2_grpc import ArikedbRPCStub
+from .common import ValueType, Status, Event, VarEvent, CollectionNotFound
+from .cache import ValueCache, MetadataCache
+from .compression import backfill
+from .dispatch import CallbackDispatcher
+from .policy import CallPolicy
+from .pool import ChannelPool
+from .prepared import PreparedGet, PreparedSet
+from .replicas import ReadReplicas, read_only
+from .subscriptions import SubscriptionManager, Subscription, SubscriptionThread
+from .writers import SetCoalescer, BufferedWriter, DeadbandWriter
 from .arike_collection_pb2 import CollectionMeta, ListCollectionsRequest, CreateCollectionsRequest, DeleteCollectionsRequest
 from .arike_ts_variable_pb2 import TsVariableMeta, ListVariablesRequest, CreateVariablesRequest, DeleteVariablesRequest, \
-    SetVariablesRequest, GetVariablesRequest, SubscribeVariablesRequest, TsVarValue, VariableEvent
+    SetVariablesRequest, GetVariablesRequest, SubscribeVariablesRequest
 from .arike_stack_pb2 import StackMeta, ListStacksRequest, CreateStacksRequest, DeleteStacksRequest, \
     PutStacksRequest, PopStacksRequest, StackValue, StackNamesCount
 from .arike_fifo_pb2 import FifoMeta, ListFifosRequest, CreateFifosRequest, DeleteFifosRequest, \
@@ -16,7 +26,9 @@ from .arike_fifo_pb2 import FifoMeta, ListFifosRequest, CreateFifosRequest, Dele
 from .arike_sorted_list_pb2 import SortedListMeta, ListSortedListsRequest, CreateSortedListsRequest, DeleteSortedListsRequest, \
     InsertSortedListsRequest, BiggestSortedListsRequest, SmallestSortedListsRequest, SortedListValue, SortedListNamesCount
 from .arike_auth_pb2 import AuthenticateRequest
-from .arike_utils_pb2 import ValType
+from .codec import Buffer, check_status, set_variables_kwargs, add_ts_columns, variable_events, array_values, \
+    names_counts, ts_values_columns, array_values_result, named_out, already_exists_result, not_found_result, \
+    split_request, already_exists_results, get_results, insert_results, set_results
 
 
 class TsVariable:
@@ -34,7 +46,10 @@ class TsVariable:
         self,
         value: Union[int, float, str, bool],
         timestamp_ns: Optional[int] = None
-    ) -> Dict[str, List[str]]:
+    ) -> Union[Dict[str, List[str]], Future]:
+        coalescer = self.collection._set_coalescer
+        if coalescer is not None:
+            return coalescer.submit(self.name, value, timestamp_ns)
         return self.collection.ts_variables_set([(self.name, value, timestamp_ns)])
 
     def get(
@@ -68,9 +83,11 @@ class Stack(Array):
 
     def pop(
         self,
-        n: Optional[int] = None
-    ) -> Tuple[str, List[Union[int, float, str, bool]]]:
-        return self.collection.stacks_pop([(self.name, n or 1)])[0]
+        n: Optional[int] = None,
+        numpy: bool = False,
+        out: Optional[Buffer] = None
+    ) -> Tuple[str, Sequence[Union[int, float, str, bool]]]:
+        return self.collection.stacks_pop([(self.name, n or 1)], numpy, named_out(self.name, out))[0]
 
 
 class Fifo(Array):
@@ -83,9 +100,11 @@ class Fifo(Array):
 
     def pull(
         self,
-        n: Optional[int] = None
-    ) -> Tuple[str, List[Union[int, float, str, bool]]]:
-        return self.collection.fifos_pull([(self.name, n or 1)])[0]
+        n: Optional[int] = None,
+        numpy: bool = False,
+        out: Optional[Buffer] = None
+    ) -> Tuple[str, Sequence[Union[int, float, str, bool]]]:
+        return self.collection.fifos_pull([(self.name, n or 1)], numpy, named_out(self.name, out))[0]
 
 
 class SortedList(Array):
@@ -99,16 +118,20 @@ class SortedList(Array):
     def biggest(
         self,
         n: Optional[int] = None,
-        remove: bool = False
-    ) -> Tuple[str, List[Union[int, float, str, bool]]]:
-        return self.collection.sorted_lists_biggest([(self.name, n or 1)], remove)[0]
+        remove: bool = False,
+        numpy: bool = False,
+        out: Optional[Buffer] = None
+    ) -> Tuple[str, Sequence[Union[int, float, str, bool]]]:
+        return self.collection.sorted_lists_biggest([(self.name, n or 1)], remove, numpy, named_out(self.name, out))[0]
 
     def smallest(
         self,
         n: Optional[int] = None,
-        remove: bool = False
-    ) -> Tuple[str, List[Union[int, float, str, bool]]]:
-        return self.collection.sorted_lists_smallest([(self.name, n or 1)], remove)[0]
+        remove: bool = False,
+        numpy: bool = False,
+        out: Optional[Buffer] = None
+    ) -> Tuple[str, Sequence[Union[int, float, str, bool]]]:
+        return self.collection.sorted_lists_smallest([(self.name, n or 1)], remove, numpy, named_out(self.name, out))[0]
 
 
 class Collection:
@@ -121,29 +144,135 @@ class Collection:
     ):
         self.name = name
         self.client = client
+        self._set_coalescer: Optional[SetCoalescer] = None
+        self._value_cache: Optional[ValueCache] = None
+        self._subscription_manager: Optional[SubscriptionManager] = None
+        self._handles: Optional[MetadataCache] = MetadataCache(client._metadata_ttl) if client._metadata_ttl else None
         if not kwargs.get("dont_create"):
             client.create_collections([name])
 
+    def prefetch_metadata(
+        self
+    ):
+        """Fill the metadata cache with every variable, stack, fifo and sorted list of the collection,
+        so following handle lookups don't reach the server until the cache expires.
+        """
+        self.ts_variables()
+        self.stacks()
+        self.fifos()
+        self.sorted_lists()
+
+    def _cached_handle(
+        self,
+        kind: str,
+        name: str
+    ) -> Tuple[bool, Optional[Union[TsVariable, Array]]]:
+        if self._handles is None:
+            return False, None
+        return self._handles.get(kind, name)
+
+    def _cache_handles(
+        self,
+        kind: str,
+        handles: list,
+        pattern: Optional[str]
+    ) -> list:
+        if self._handles is not None:
+            self._handles.update(kind, handles, complete=pattern in (None, "*"))
+        return handles
+
+    def _invalidate_handles(
+        self,
+        kind: str,
+        names: Optional[Iterable[str]] = None
+    ):
+        if self._handles is not None:
+            self._handles.invalidate(kind, names or [])
+
+    def enable_set_coalescing(
+        self,
+        window: float = 0.005,
+        max_batch: int = 1000
+    ) -> SetCoalescer:
+        """Merge the `TsVariable.set` calls of this collection made within `window` seconds into a single
+        `ts_variables_set` request. While enabled, `TsVariable.set` returns a future resolved with the
+        `not_found`/`invalid_type` result of its own variable.
+        """
+        self.disable_set_coalescing()
+        self._set_coalescer = SetCoalescer(self, window, max_batch)
+        return self._set_coalescer
+
+    def disable_set_coalescing(
+        self
+    ):
+        coalescer, self._set_coalescer = self._set_coalescer, None
+        if coalescer is not None:
+            coalescer.close()
+
+    def enable_value_cache(
+        self,
+        max_size: int = 10_000,
+        event: Event = Event.OnSet
+    ) -> ValueCache:
+        """Serve `ts_variables_get` from a local cache kept fresh by a subscription to the cached names.
+        See `ValueCache`.
+        """
+        self.disable_value_cache()
+        self._value_cache = ValueCache(self, max_size, event)
+        return self._value_cache
+
+    def disable_value_cache(
+        self
+    ):
+        cache, self._value_cache = self._value_cache, None
+        if cache is not None:
+            cache.close()
+
+    def writer(
+        self,
+        max_queue: int = 100_000,
+        flush_interval: float = 0.1,
+        max_batch: int = 10_000,
+        overflow: str = "block"
+    ) -> BufferedWriter:
+        """Create a write-behind writer which queues values and sends them in batches from a background thread.
+        See `BufferedWriter`.
+        """
+        return BufferedWriter(self, max_queue, flush_interval, max_batch, overflow)
+
+    def deadband_writer(
+        self,
+        absolute: float = 0.0,
+        percent: float = 0.0,
+        max_silence: Optional[float] = None,
+        writer: Optional[BufferedWriter] = None
+    ) -> DeadbandWriter:
+        """Create a report-by-exception writer which only sends values out of a deadband. See `DeadbandWriter`.
+        """
+        return DeadbandWriter(self, absolute, percent, max_silence, writer)
+
     def ts_variables(
         self,
         pattern: Optional[str] = None
     ) -> List[TsVariable]:
 
         response = self.client._exec_request(
-            self.client._stub.ListVariables,
+            "ListVariables",
             ListVariablesRequest,
             {"collection": self.name, "pattern": pattern}
         )
-        status = Status(response.status)
-        if status != Status.Ok:
-            raise status.as_exception("Failed to listing variables")
-        return [TsVariable(v.name, ValueType(v.val_type), self) for v in response.variables]
+        check_status(response, "Failed to listing variables")
+        ts_variables = [TsVariable(v.name, ValueType(v.val_type), self) for v in response.variables]
+        return self._cache_handles("ts_variables", ts_variables, pattern)
 
     def ts_variable(
         self,
         name: str
     ) -> Optional[TsVariable]:
 
+        found, handle = self._cached_handle("ts_variables", name)
+        if found:
+            return handle
         ts_variables = self.ts_variables(name)
         return ts_variables[0] if len(ts_variables) > 0 else None
 
@@ -152,36 +281,27 @@ class Collection:
         variables: Iterable[Tuple[str, ValueType]]
     ) -> Dict[str, List[str]]:
 
-        response = self.client._exec_request(
-            self.client._stub.CreateVariables,
-            CreateVariablesRequest,
-            {"collection": self.name,
-             "variables": [TsVariableMeta(name=name, val_type=vt.value) for name, vt in variables]}
+        request = CreateVariablesRequest(
+            collection=self.name,
+            variables=[TsVariableMeta(name=name, val_type=vt.value) for name, vt in variables]
         )
-
-        status = Status(response.status)
-        if status != Status.Ok:
-            raise status.as_exception("Failed creating variables")
-        return {
-            "already_exists": response.already_exists
-        }
+        responses = self.client._exec_chunked("CreateVariables", request, "variables")
+        self._invalidate_handles("ts_variables")
+        return already_exists_results(responses, "Failed creating variables")
 
     def delete_ts_variables(
         self,
         names: Iterable[str]
     ) -> Dict[str, List[str]]:
 
+        names = list(names)
         response = self.client._exec_request(
-            self.client._stub.DeleteVariables,
+            "DeleteVariables",
             DeleteVariablesRequest,
             {"collection": self.name, "names": names}
         )
-        if response.status != 0:
-            raise Exception(f"Failed to list variables: {response.status}")
-
-        return {
-            "not_found": response.not_found
-        }
+        self._invalidate_handles("ts_variables", names)
+        return not_found_result(response, "Failed deleting variables")
 
     def ts_variables_set(
         self,
@@ -189,69 +309,123 @@ class Collection:
         timestamp_ns: Optional[int] = None
     ) -> Dict[str, List[str]]:
 
-        var_values = []
-        types_map = {
-            int: "int_value",
-            float: "float_value",
-            str: "str_value",
-            bool: "bool_value",
-        }
-        for x in values:
-            kw = {"name": x[0], types_map[type(x[1])]: x[1]}
-            if len(x) == 3:
-                kw["timestamp"] = x[2]
-            var_values.append(TsVarValue(**kw))
+        request = SetVariablesRequest(**set_variables_kwargs(self.name, values, timestamp_ns))
+        responses = self.client._exec_chunked("SetVariables", request, "values")
+        return set_results(responses)
+
+    def ts_variables_set_async(
+        self,
+        values: Iterable[Tuple[str, Union[int, float, str, bool], Optional[int]]],
+        timestamp_ns: Optional[int] = None
+    ) -> Future:
+        """Like `ts_variables_set` but returns a future of its result at once."""
 
-        req_kw = {"collection": self.name, "values": var_values}
+        request = SetVariablesRequest(**set_variables_kwargs(self.name, values, timestamp_ns))
+        return self.client._submit("SetVariables", request, set_results, "values")
 
+    def ts_variables_set_columns(
+        self,
+        names: Sequence[str],
+        values: Sequence[Union[int, float, str, bool]],
+        timestamps: Optional[Sequence[int]] = None,
+        timestamp_ns: Optional[int] = None
+    ) -> Dict[str, List[str]]:
+        """Set variables from columns: `values[i]` (and `timestamps[i]` if given) belongs to `names[i]`. The
+        columns can be NumPy arrays or plain sequences.
+        """
+        request = SetVariablesRequest(collection=self.name)
         if timestamp_ns:
-            req_kw["timestamp"] = timestamp_ns
+            request.timestamp = timestamp_ns
+        add_ts_columns(request.values, names, values, timestamps)
 
-        response = self.client._exec_request(
-            self.client._stub.SetVariables,
-            SetVariablesRequest,
-            req_kw
-        )
+        responses = self.client._exec_chunked("SetVariables", request, "values")
+        return set_results(responses)
 
-        status = Status(response.status)
-        if status not in [Status.Ok, Status.VariableNotFound, Status.TypeError]:
-            raise status.as_exception("Failed setting variables")
+    def ts_variables_set_columns_async(
+        self,
+        names: Sequence[str],
+        values: Sequence[Union[int, float, str, bool]],
+        timestamps: Optional[Sequence[int]] = None,
+        timestamp_ns: Optional[int] = None
+    ) -> Future:
+        """Like `ts_variables_set_columns` but returns a future of its result at once."""
 
-        return {
-            "not_found": response.not_found,
-            "invalid_type": response.invalid_type
-        }
+        request = SetVariablesRequest(collection=self.name)
+        if timestamp_ns:
+            request.timestamp = timestamp_ns
+        add_ts_columns(request.values, names, values, timestamps)
+        return self.client._submit("SetVariables", request, set_results, "values")
+
+    def ts_variables_backfill(
+        self,
+        series: Iterable[Tuple[str, Sequence[int], Sequence[Union[int, float]]]],
+        deviation: float = 0.0,
+        max_batch: int = 10_000
+    ) -> Dict:
+        """Write historical (name, timestamps, values) series, dropping the samples that linear interpolation
+        reproduces within `deviation` (swinging door compression). See `compression.backfill`.
+        """
+        return backfill(self, series, deviation, max_batch)
 
     def ts_variables_get(
         self,
         names: Iterable[str],
-    ) -> List[Tuple[str, int, Union[int, float, str, bool]]]:
+        columnar: bool = False
+    ) -> Union[List[Tuple[str, int, Union[int, float, str, bool]]], Tuple[List[str], Sequence, Sequence]]:
+        """Get the last values as (name, timestamp, value) tuples, or with `columnar` as a (names, timestamps,
+        values) tuple of columns. With NumPy the timestamps are an uint64 array and the values a typed array
+        (object dtype if the value types are mixed).
+        """
+        if self._value_cache is not None:
+            values = self._value_cache.get(names)
+            return ts_values_columns(values) if columnar else values
+        return self._ts_variables_get(names, columnar)
 
-        response = self.client._exec_request(
-            self.client._stub.GetVariables,
-            GetVariablesRequest,
-            {"collection": self.name, "names": names}
-        )
+    def _ts_variables_get(
+        self,
+        names: Iterable[str],
+        columnar: bool = False
+    ) -> Union[List[Tuple[str, int, Union[int, float, str, bool]]], Tuple[List[str], Sequence, Sequence]]:
 
-        status = Status(response.status)
-        if status != Status.Ok:
-            raise status.as_exception("Failed getting variables")
-
-        values = []
-        for v in response.values:
-            if v.val_type == ValueType.Int.value:
-                val_tup = (v.name, v.timestamp, v.int_value)
-            elif v.val_type == ValueType.Float.value:
-                val_tup = (v.name, v.timestamp, v.float_value)
-            elif v.val_type == ValueType.String.value:
-                val_tup = (v.name, v.timestamp, v.str_value)
-            elif v.val_type == ValueType.Bool.value:
-                val_tup = (v.name, v.timestamp, v.bool_value)
-            else:
-                continue
-            values.append(val_tup)
+        # Values take more room in the response than their names in the request
+        request = GetVariablesRequest(collection=self.name, names=names)
+        max_size = self.client._max_request_size and self.client._max_request_size // 4
+        responses = self.client._exec_chunked("GetVariables", request, "names", max_size)
+        return get_results(responses, columnar)
+
+    def ts_variables_get_async(
+        self,
+        names: Iterable[str],
+        columnar: bool = False
+    ) -> Future:
+        """Like `ts_variables_get` but returns a future of its result at once. With the value cache enabled the
+        values are read from it (the names not cached yet are read from the server before returning).
+        """
+        if self._value_cache is not None:
+            future = Future()
+            values = self._value_cache.get(names)
+            future.set_result(ts_values_columns(values) if columnar else values)
+            return future
 
-        return values
+        request = GetVariablesRequest(collection=self.name, names=names)
+        max_size = self.client._max_request_size and self.client._max_request_size // 4
+        return self.client._submit("GetVariables", request, lambda r: get_results(r, columnar), "names", max_size)
+
+    def prepare_get(
+        self,
+        names: Iterable[str]
+    ) -> PreparedGet:
+        """Prepare a `ts_variables_get` of the same names made many times."""
+
+        return PreparedGet(self, names)
+
+    def prepare_set(
+        self,
+        names: Iterable[str]
+    ) -> PreparedSet:
+        """Prepare a `ts_variables_set` of the same names made many times."""
+
+        return PreparedSet(self, names)
 
     def variables_subscribe(
         self,
@@ -261,78 +435,74 @@ class Collection:
         callback_args: Optional[tuple] = None,
         callback_kwargs: Optional[dict] = None,
         thread_kwargs: Optional[dict] = None,
-    ) -> Thread:
+        resilient: bool = False,
+        dispatcher: Optional[CallbackDispatcher] = None,
+    ) -> SubscriptionThread:
 
         callback_args = callback_args or ()
         callback_kwargs = callback_kwargs or {}
 
         thread_kwargs = thread_kwargs or {}
 
-        metadata = tuple() if not self.client._token else (('authorization', self.client._token),)
+        subscription = self.subscribe(names, events, resilient)
 
         def _wrapper():
-            for response in self.client._stub.SubscribeVariables(
-                SubscribeVariablesRequest(
-                    collection=self.name,
-                    names=names,
-                    events=[
-                        VariableEvent(
-                            event=e.event.value,
-                            str_value=e.str_value,
-                            str_low_limit=e.str_low_limit,
-                            str_high_limit=e.str_high_limit,
-                            int_value=e.int_value,
-                            int_low_limit=e.int_low_limit,
-                            int_high_limit=e.int_high_limit,
-                            float_value=e.float_value,
-                            float_low_limit=e.float_low_limit,
-                            float_high_limit=e.float_high_limit,
-                            bool_value=e.bool_value,
-                            bool_low_limit=e.bool_low_limit,
-                            bool_high_limit=e.bool_high_limit
-                        ) for e in events
-                    ]
-                ),
-                metadata=metadata
-            ):
-                if response.val_type == ValType.INT:
-                    value = response.int_value
-                elif response.val_type == ValType.FLOAT:
-                    value = response.float_value
-                elif response.val_type == ValType.STRING:
-                    value = response.str_value
-                elif response.val_type == ValType.BOOL:
-                    value = response.bool_value
+            for value in subscription:
+                if dispatcher is not None:
+                    dispatcher.submit(callback, value, callback_args, callback_kwargs)
+                    continue
                 callback(
-                    (response.name, response.timestamp, value),
+                    value,
                     *callback_args,
                     **callback_kwargs
                 )
 
-        t = Thread(target=_wrapper, **thread_kwargs)
+        t = SubscriptionThread(subscription, target=_wrapper, **thread_kwargs)
         t.start()
         return t
 
+    def subscribe(
+        self,
+        names: Iterable[str],
+        events: Iterable[VarEvent],
+        resilient: bool = False,
+        **kwargs
+    ) -> Subscription:
+        """Open a subscription to iterate. See `Subscription` for the `resilient` options."""
+
+        return Subscription(self, names, events, resilient=resilient, **kwargs)
+
+    @property
+    def subscription_manager(
+        self
+    ) -> SubscriptionManager:
+        """Manager sharing subscription streams among the subscribers of this collection, created on first use."""
+        if self._subscription_manager is None:
+            self._subscription_manager = SubscriptionManager(self)
+        return self._subscription_manager
+
     def stacks(
         self,
         pattern: Optional[str] = None
     ) -> List[Stack]:
 
         response = self.client._exec_request(
-            self.client._stub.ListStacks,
+            "ListStacks",
             ListStacksRequest,
             {"collection": self.name, "pattern": pattern}
         )
-        status = Status(response.status)
-        if status != Status.Ok:
-            raise status.as_exception("Failed listing stacks")
-        return [Stack(s.name, ValueType(s.val_type), s.max_size, self) for s in response.stacks]
+        check_status(response, "Failed listing stacks")
+        stacks = [Stack(s.name, ValueType(s.val_type), s.max_size, self) for s in response.stacks]
+        return self._cache_handles("stacks", stacks, pattern)
 
     def stack(
         self,
         name: str
     ) -> Optional[Stack]:
 
+        found, handle = self._cached_handle("stacks", name)
+        if found:
+            return handle
         stacks = self.stacks(name)
         return stacks[0] if len(stacks) > 0 else None
 
@@ -342,113 +512,83 @@ class Collection:
     ) -> Dict[str, List[str]]:
 
         response = self.client._exec_request(
-            self.client._stub.CreateStacks,
+            "CreateStacks",
             CreateStacksRequest,
             {"collection": self.name,
              "stacks": [StackMeta(name=name, val_type=vtype.value, max_size=max_size) for name, vtype, max_size in stacks]}
         )
-
-        status = Status(response.status)
-        if status != Status.Ok:
-            raise status.as_exception("Failed creating stacks")
-        return {
-            "already_exists": response.already_exists
-        }
+        self._invalidate_handles("stacks")
+        return already_exists_result(response, "Failed creating stacks")
 
     def delete_stacks(
         self,
         names: Iterable[str]
     ) -> Dict[str, List[str]]:
 
+        names = list(names)
         response = self.client._exec_request(
-            self.client._stub.DeleteStacks,
+            "DeleteStacks",
             DeleteStacksRequest,
             {"collection": self.name, "names": names}
         )
-
-        status = Status(response.status)
-        if status != Status.Ok:
-            raise status.as_exception("Failed deleting stacks")
-
-        return {
-            "not_found": response.not_found
-        }
+        self._invalidate_handles("stacks", names)
+        return not_found_result(response, "Failed deleting stacks")
 
     def stacks_put(
         self,
         values: Iterable[Tuple[str, Iterable[Union[int, float, str, bool]]]]
     ) -> Dict:
 
-        stk_values = []
-        types_map = {
-            int: "int_value",
-            float: "float_value",
-            str: "str_value",
-            bool: "bool_value",
-        }
-        names = []
-        for name, vals in values:
-            if not vals:
-                continue
-            kw = {"name": name, types_map[type(vals[0])]: vals}
-            stk_values.append(StackValue(**kw))
-            names.append(name)
-
-        req_kw = {"collection": self.name, "values": stk_values}
-        response = self.client._exec_request(
-            self.client._stub.PutStacks,
-            PutStacksRequest,
-            req_kw
-        )
+        stk_values, _ = array_values(StackValue, values, self.client._max_request_size)
+        request = PutStacksRequest(collection=self.name, values=stk_values)
+        # Parts are sent in order to keep the order of the values
+        responses = self.client._exec_chunked("PutStacks", request, "values", concurrent=False)
+        return insert_results(responses, "Failed putting stacks")
 
-        status = Status(response.status)
-        if status != Status.Ok:
-            raise status.as_exception("Failed putting stacks")
+    def stacks_put_async(
+        self,
+        values: Iterable[Tuple[str, Iterable[Union[int, float, str, bool]]]]
+    ) -> Future:
+        """Like `stacks_put` but returns a future of its result at once."""
 
-        return {
-            "not_found": response.not_found,
-            "invalid_type": response.invalid_type,
-            "non_inserted": {name: ni for name, ni in zip(names, response.non_inserted)}
-        }
+        stk_values, _ = array_values(StackValue, values, self.client._max_request_size)
+        request = PutStacksRequest(collection=self.name, values=stk_values)
+        return self.client._submit(
+            "PutStacks", request, lambda r: insert_results(r, "Failed putting stacks"), "values", concurrent=False
+        )
 
     def stacks_pop(
         self,
-        names: Iterable[Union[str, Tuple[str, int]]]
-    ) -> List[Tuple[str, List[Union[int, float, str, bool]]]]:
-
-        names_counts = []
-        for x in names:
-            if isinstance(x, str):
-                names_counts.append(StackNamesCount(name=x, n=1))
-            else:
-                names_counts.append(StackNamesCount(name=x[0], n=x[1]))
+        names: Iterable[Union[str, Tuple[str, int]]],
+        numpy: bool = False,
+        out: Optional[Dict[str, Buffer]] = None
+    ) -> List[Tuple[str, Sequence[Union[int, float, str, bool]]]]:
 
         response = self.client._exec_request(
-            self.client._stub.PopStacks,
+            "PopStacks",
             PopStacksRequest,
             {"collection": self.name,
-             "names_counts": names_counts}
-        )
-
-        status = Status(response.status)
-        if status != Status.Ok:
-            raise status.as_exception("Failed popping stacks")
-
-        values = []
-        for v in response.values:
-            if v.val_type == ValueType.Int.value:
-                val_tup = (v.name, v.int_value)
-            elif v.val_type == ValueType.Float.value:
-                val_tup = (v.name, v.float_value)
-            elif v.val_type == ValueType.String.value:
-                val_tup = (v.name, v.str_value)
-            elif v.val_type == ValueType.Bool.value:
-                val_tup = (v.name, v.bool_value)
-            else:
-                continue
-            values.append(val_tup)
+             "names_counts": names_counts(StackNamesCount, names)}
+        )
+        return array_values_result(response, "Failed popping stacks", numpy, out)
 
-        return values
+    def stacks_pop_async(
+        self,
+        names: Iterable[Union[str, Tuple[str, int]]],
+        numpy: bool = False,
+        out: Optional[Dict[str, Buffer]] = None
+    ) -> Future:
+        """Like `stacks_pop` but returns a future of its result at once."""
+
+        request = PopStacksRequest(
+            collection=self.name,
+            names_counts=names_counts(StackNamesCount, names)
+        )
+        return self.client._submit(
+            "PopStacks",
+            request,
+            lambda r: array_values_result(r[0][1], "Failed popping stacks", numpy, out)
+        )
 
     def fifos(
         self,
@@ -456,20 +596,22 @@ class Collection:
     ) -> List[Fifo]:
 
         response = self.client._exec_request(
-            self.client._stub.ListFifos,
+            "ListFifos",
             ListFifosRequest,
             {"collection": self.name, "pattern": pattern}
         )
-        status = Status(response.status)
-        if status != Status.Ok:
-            raise status.as_exception("Failed listing fifos")
-        return [Fifo(s.name, ValueType(s.val_type), s.max_size, self) for s in response.fifos]
+        check_status(response, "Failed listing fifos")
+        fifos = [Fifo(s.name, ValueType(s.val_type), s.max_size, self) for s in response.fifos]
+        return self._cache_handles("fifos", fifos, pattern)
 
     def fifo(
         self,
         name: str
     ) -> Optional[Fifo]:
 
+        found, handle = self._cached_handle("fifos", name)
+        if found:
+            return handle
         fifos = self.fifos(name)
         return fifos[0] if len(fifos) > 0 else None
 
@@ -479,113 +621,83 @@ class Collection:
     ) -> Dict[str, List[str]]:
 
         response = self.client._exec_request(
-            self.client._stub.CreateFifos,
+            "CreateFifos",
             CreateFifosRequest,
             {"collection": self.name,
              "fifos": [FifoMeta(name=name, val_type=vtype.value, max_size=max_size) for name, vtype, max_size in fifos]}
         )
-
-        status = Status(response.status)
-        if status != Status.Ok:
-            raise status.as_exception("Failed creating fifos")
-        return {
-            "already_exists": response.already_exists
-        }
+        self._invalidate_handles("fifos")
+        return already_exists_result(response, "Failed creating fifos")
 
     def delete_fifos(
         self,
         names: Iterable[str]
     ) -> Dict[str, List[str]]:
 
+        names = list(names)
         response = self.client._exec_request(
-            self.client._stub.DeleteFifos,
+            "DeleteFifos",
             DeleteFifosRequest,
             {"collection": self.name, "names": names}
         )
-
-        status = Status(response.status)
-        if status != Status.Ok:
-            raise status.as_exception("Failed deleting fifos")
-
-        return {
-            "not_found": response.not_found
-        }
+        self._invalidate_handles("fifos", names)
+        return not_found_result(response, "Failed deleting fifos")
 
     def fifos_push(
         self,
         values: Iterable[Tuple[str, Iterable[Union[int, float, str, bool]]]]
     ) -> Dict:
 
-        fifo_values = []
-        types_map = {
-            int: "int_value",
-            float: "float_value",
-            str: "str_value",
-            bool: "bool_value",
-        }
-        names = []
-        for name, vals in values:
-            if not vals:
-                continue
-            kw = {"name": name, types_map[type(vals[0])]: vals}
-            fifo_values.append(FifoValue(**kw))
-            names.append(name)
+        fifo_values, _ = array_values(FifoValue, values, self.client._max_request_size)
+        request = PushFifosRequest(collection=self.name, values=fifo_values)
+        # Parts are sent in order to keep the order of the values
+        responses = self.client._exec_chunked("PushFifos", request, "values", concurrent=False)
+        return insert_results(responses, "Failed pushing fifos")
 
-        req_kw = {"collection": self.name, "values": fifo_values}
-        response = self.client._exec_request(
-            self.client._stub.PushFifos,
-            PushFifosRequest,
-            req_kw
-        )
-
-        status = Status(response.status)
-        if status != Status.Ok:
-            raise status.as_exception("Failed pushing fifos")
+    def fifos_push_async(
+        self,
+        values: Iterable[Tuple[str, Iterable[Union[int, float, str, bool]]]]
+    ) -> Future:
+        """Like `fifos_push` but returns a future of its result at once."""
 
-        return {
-            "not_found": response.not_found,
-            "invalid_type": response.invalid_type,
-            "non_inserted": {name: ni for name, ni in zip(names, response.non_inserted)}
-        }
+        fifo_values, _ = array_values(FifoValue, values, self.client._max_request_size)
+        request = PushFifosRequest(collection=self.name, values=fifo_values)
+        return self.client._submit(
+            "PushFifos", request, lambda r: insert_results(r, "Failed pushing fifos"), "values", concurrent=False
+        )
 
     def fifos_pull(
         self,
         names: Iterable[Union[str, Tuple[str, int]]],
-    ) -> List[Tuple[str, List[Union[int, float, str, bool]]]]:
-
-        names_counts = []
-        for x in names:
-            if isinstance(x, str):
-                names_counts.append(FifoNamesCount(name=x, n=1))
-            else:
-                names_counts.append(FifoNamesCount(name=x[0], n=x[1]))
+        numpy: bool = False,
+        out: Optional[Dict[str, Buffer]] = None
+    ) -> List[Tuple[str, Sequence[Union[int, float, str, bool]]]]:
 
         response = self.client._exec_request(
-            self.client._stub.PullFifos,
+            "PullFifos",
             PullFifosRequest,
             {"collection": self.name,
-             "names_counts": names_counts}
-        )
-
-        status = Status(response.status)
-        if status != Status.Ok:
-            raise status.as_exception("Failed pulling fifos")
-
-        values = []
-        for v in response.values:
-            if v.val_type == ValueType.Int.value:
-                val_tup = (v.name, v.int_value)
-            elif v.val_type == ValueType.Float.value:
-                val_tup = (v.name, v.float_value)
-            elif v.val_type == ValueType.String.value:
-                val_tup = (v.name, v.str_value)
-            elif v.val_type == ValueType.Bool.value:
-                val_tup = (v.name, v.bool_value)
-            else:
-                continue
-            values.append(val_tup)
+             "names_counts": names_counts(FifoNamesCount, names)}
+        )
+        return array_values_result(response, "Failed pulling fifos", numpy, out)
 
-        return values
+    def fifos_pull_async(
+        self,
+        names: Iterable[Union[str, Tuple[str, int]]],
+        numpy: bool = False,
+        out: Optional[Dict[str, Buffer]] = None
+    ) -> Future:
+        """Like `fifos_pull` but returns a future of its result at once."""
+
+        request = PullFifosRequest(
+            collection=self.name,
+            names_counts=names_counts(FifoNamesCount, names)
+        )
+        return self.client._submit(
+            "PullFifos",
+            request,
+            lambda r: array_values_result(r[0][1], "Failed pulling fifos", numpy, out)
+        )
 
     def sorted_lists(
         self,
@@ -593,20 +705,22 @@ class Collection:
     ) -> List[SortedList]:
 
         response = self.client._exec_request(
-            self.client._stub.ListSortedLists,
+            "ListSortedLists",
             ListSortedListsRequest,
             {"collection": self.name, "pattern": pattern}
         )
-        status = Status(response.status)
-        if status != Status.Ok:
-            raise status.as_exception("Failed listing sorted lists")
-        return [SortedList(s.name, ValueType(s.val_type), s.max_size, self) for s in response.sorted_lists]
+        check_status(response, "Failed listing sorted lists")
+        sorted_lists = [SortedList(s.name, ValueType(s.val_type), s.max_size, self) for s in response.sorted_lists]
+        return self._cache_handles("sorted_lists", sorted_lists, pattern)
 
     def sorted_list(
         self,
         name: str
     ) -> Optional[SortedList]:
 
+        found, handle = self._cached_handle("sorted_lists", name)
+        if found:
+            return handle
         sorted_lists = self.sorted_lists(name)
         return sorted_lists[0] if len(sorted_lists) > 0 else None
 
@@ -616,155 +730,145 @@ class Collection:
     ) -> Dict[str, List[str]]:
 
         response = self.client._exec_request(
-            self.client._stub.CreateSortedLists,
+            "CreateSortedLists",
             CreateSortedListsRequest,
             {"collection": self.name,
              "sorted_lists": [SortedListMeta(name=name, val_type=vtype.value, max_size=max_size)
                               for name, vtype, max_size in sorted_lists]}
         )
-
-        status = Status(response.status)
-        if status != Status.Ok:
-            raise status.as_exception("Failed creating sorted lists")
-        return {
-            "already_exists": response.already_exists
-        }
+        self._invalidate_handles("sorted_lists")
+        return already_exists_result(response, "Failed creating sorted lists")
 
     def delete_sorted_lists(
         self,
         names: Iterable[str]
     ) -> Dict[str, List[str]]:
 
+        names = list(names)
         response = self.client._exec_request(
-            self.client._stub.DeleteSortedLists,
+            "DeleteSortedLists",
             DeleteSortedListsRequest,
             {"collection": self.name, "names": names}
         )
-
-        status = Status(response.status)
-        if status != Status.Ok:
-            raise status.as_exception("Failed deleting sorted lists")
-
-        return {
-            "not_found": response.not_found
-        }
+        self._invalidate_handles("sorted_lists", names)
+        return not_found_result(response, "Failed deleting sorted lists")
 
     def sorted_lists_insert(
         self,
         values: Iterable[Tuple[str, Iterable[Union[int, float, str, bool]]]]
     ) -> Dict:
 
-        sorted_list_values = []
-        types_map = {
-            int: "int_value",
-            float: "float_value",
-            str: "str_value",
-            bool: "bool_value",
-        }
-        names = []
-        for name, vals in values:
-            if not vals:
-                continue
-            kw = {"name": name, types_map[type(vals[0])]: vals}
-            sorted_list_values.append(SortedListValue(**kw))
-            names.append(name)
-
-        req_kw = {"collection": self.name, "values": sorted_list_values}
-        response = self.client._exec_request(
-            self.client._stub.InsertSortedLists,
-            InsertSortedListsRequest,
-            req_kw
-        )
+        sorted_list_values, _ = array_values(SortedListValue, values, self.client._max_request_size)
+        request = InsertSortedListsRequest(collection=self.name, values=sorted_list_values)
+        responses = self.client._exec_chunked("InsertSortedLists", request, "values")
+        return insert_results(responses, "Failed pushing sorted lists")
 
-        status = Status(response.status)
-        if status != Status.Ok:
-            raise status.as_exception("Failed pushing sorted lists")
+    def sorted_lists_insert_async(
+        self,
+        values: Iterable[Tuple[str, Iterable[Union[int, float, str, bool]]]]
+    ) -> Future:
+        """Like `sorted_lists_insert` but returns a future of its result at once."""
 
-        return {
-            "not_found": response.not_found,
-            "invalid_type": response.invalid_type,
-            "non_inserted": {name: ni for name, ni in zip(names, response.non_inserted)}
-        }
+        sorted_list_values, _ = array_values(SortedListValue, values, self.client._max_request_size)
+        request = InsertSortedListsRequest(collection=self.name, values=sorted_list_values)
+        return self.client._submit(
+            "InsertSortedLists", request, lambda r: insert_results(r, "Failed pushing sorted lists"), "values"
+        )
 
     def sorted_lists_biggest(
         self,
         names: Iterable[Union[str, Tuple[str, int]]],
-        remove: bool
-    ) -> List[Tuple[str, List[Union[int, float, str, bool]]]]:
-
-        names_counts = []
-        for x in names:
-            if isinstance(x, str):
-                names_counts.append(SortedListNamesCount(name=x, n=1, remove=remove))
-            else:
-                names_counts.append(SortedListNamesCount(name=x[0], n=x[1], remove=remove))
+        remove: bool,
+        numpy: bool = False,
+        out: Optional[Dict[str, Buffer]] = None
+    ) -> List[Tuple[str, Sequence[Union[int, float, str, bool]]]]:
 
         response = self.client._exec_request(
-            self.client._stub.BiggestSortedLists,
+            "BiggestSortedLists",
             BiggestSortedListsRequest,
             {"collection": self.name,
-             "names_counts": names_counts}
-        )
-
-        status = Status(response.status)
-        if status != Status.Ok:
-            raise status.as_exception("Failed reading biggest in sorted lists")
-
-        values = []
-        for v in response.values:
-            if v.val_type == ValueType.Int.value:
-                val_tup = (v.name, v.int_value)
-            elif v.val_type == ValueType.Float.value:
-                val_tup = (v.name, v.float_value)
-            elif v.val_type == ValueType.String.value:
-                val_tup = (v.name, v.str_value)
-            elif v.val_type == ValueType.Bool.value:
-                val_tup = (v.name, v.bool_value)
-            else:
-                continue
-            values.append(val_tup)
+             "names_counts": names_counts(SortedListNamesCount, names, remove=remove)}
+        )
+        return array_values_result(response, "Failed reading biggest in sorted lists", numpy, out)
 
-        return values
+    def sorted_lists_biggest_async(
+        self,
+        names: Iterable[Union[str, Tuple[str, int]]],
+        remove: bool,
+        numpy: bool = False,
+        out: Optional[Dict[str, Buffer]] = None
+    ) -> Future:
+        """Like `sorted_lists_biggest` but returns a future of its result at once."""
+
+        request = BiggestSortedListsRequest(
+            collection=self.name,
+            names_counts=names_counts(SortedListNamesCount, names, remove=remove)
+        )
+        return self.client._submit(
+            "BiggestSortedLists",
+            request,
+            lambda r: array_values_result(r[0][1], "Failed reading biggest in sorted lists", numpy, out)
+        )
 
     def sorted_lists_smallest(
         self,
         names: Iterable[Union[str, Tuple[str, int]]],
-        remove: bool
-    ) -> List[Tuple[str, List[Union[int, float, str, bool]]]]:
-
-        names_counts = []
-        for x in names:
-            if isinstance(x, str):
-                names_counts.append(SortedListNamesCount(name=x, n=1, remove=remove))
-            else:
-                names_counts.append(SortedListNamesCount(name=x[0], n=x[1], remove=remove))
+        remove: bool,
+        numpy: bool = False,
+        out: Optional[Dict[str, Buffer]] = None
+    ) -> List[Tuple[str, Sequence[Union[int, float, str, bool]]]]:
 
         response = self.client._exec_request(
-            self.client._stub.SmallestSortedLists,
+            "SmallestSortedLists",
             SmallestSortedListsRequest,
             {"collection": self.name,
-             "names_counts": names_counts}
-        )
-
-        status = Status(response.status)
-        if status != Status.Ok:
-            raise status.as_exception("Failed reading smallest in sorted lists")
-
-        values = []
-        for v in response.values:
-            if v.val_type == ValueType.Int.value:
-                val_tup = (v.name, v.int_value)
-            elif v.val_type == ValueType.Float.value:
-                val_tup = (v.name, v.float_value)
-            elif v.val_type == ValueType.String.value:
-                val_tup = (v.name, v.str_value)
-            elif v.val_type == ValueType.Bool.value:
-                val_tup = (v.name, v.bool_value)
-            else:
-                continue
-            values.append(val_tup)
+             "names_counts": names_counts(SortedListNamesCount, names, remove=remove)}
+        )
+        return array_values_result(response, "Failed reading smallest in sorted lists", numpy, out)
+
+    def sorted_lists_smallest_async(
+        self,
+        names: Iterable[Union[str, Tuple[str, int]]],
+        remove: bool,
+        numpy: bool = False,
+        out: Optional[Dict[str, Buffer]] = None
+    ) -> Future:
+        """Like `sorted_lists_smallest` but returns a future of its result at once."""
+
+        request = SmallestSortedListsRequest(
+            collection=self.name,
+            names_counts=names_counts(SortedListNamesCount, names, remove=remove)
+        )
+        return self.client._submit(
+            "SmallestSortedLists",
+            request,
+            lambda r: array_values_result(r[0][1], "Failed reading smallest in sorted lists", numpy, out)
+        )
+
+
+def channel_credentials(
+    ca_path: Optional[str] = None,
+    cert_path: Optional[str] = None,
+    key_path: Optional[str] = None
+) -> grpc.ChannelCredentials:
 
-        return values
+    _root_certificates: Optional[bytes] = None
+    _private_key: Optional[bytes] = None
+    _certificate_chain: Optional[bytes] = None
+
+    if ca_path:
+        with open(ca_path, 'rb') as f:
+            _root_certificates = f.read()
+        if cert_path:
+            with open(cert_path, 'rb') as f:
+                _certificate_chain = f.read()
+        if key_path:
+            with open(key_path, 'rb') as f:
+                _private_key = f.read()
+        return grpc.ssl_channel_credentials(root_certificates=_root_certificates,
+                                            private_key=_private_key,
+                                            certificate_chain=_certificate_chain)
+    return grpc.ssl_channel_credentials()
 
 
 class Arikedb:
@@ -778,7 +882,15 @@ class Arikedb:
         use_ssl_tls: bool = False,
         ca_path: Optional[str] = None,
         cert_path: Optional[str] = None,
-        key_path: Optional[str] = None
+        key_path: Optional[str] = None,
+        pool_size: int = 1,
+        pool_strategy: str = "round_robin",
+        metadata_ttl: Optional[float] = None,
+        max_request_size: Optional[int] = 3_000_000,
+        replicas: Optional[Iterable[Union[str, Tuple[str, int]]]] = None,
+        hedge_reads: bool = False,
+        hedge_delay: Optional[float] = None,
+        policy: Optional[CallPolicy] = None
     ):
         """RTDB Client constructor
         Args:
@@ -793,9 +905,37 @@ class Arikedb:
             key_path (Optional[str], optional): The file path to the client private key.
                                                 Required if use_ssl_tls is True and the server requires it.
                                                 Defaults to None.
+            pool_size (int, optional): Number of channels (HTTP/2 connections) opened to the server. Requests are
+                                       spread among them. Defaults to 1.
+            pool_strategy (str, optional): How requests pick a channel of the pool, "round_robin" or
+                                           "least_outstanding". Defaults to "round_robin".
+            metadata_ttl (Optional[float], optional): Seconds during which collection, variable, stack, fifo and
+                                                      sorted list handles are cached, saving the listing request
+                                                      of handle lookups. Defaults to None (no cache).
+            max_request_size (Optional[int], optional): Encoded size in bytes above which the variable sets, gets
+                                                        and creations and the array inserts are split in several
+                                                        requests, sent concurrently. Keep it below the server
+                                                        message size limit (4 MB by default). Defaults to
+                                                        3_000_000, None disables the splitting.
+            replicas (Optional[Iterable[Union[str, Tuple[str, int]]]], optional): Read replicas of the server, as
+                                                        "host:port" or (host, port). Read-only requests (variable
+                                                        gets, listings and sorted list reads without remove) are
+                                                        spread among them following `pool_strategy`, the others
+                                                        go to the server. Defaults to None.
+            hedge_reads (bool, optional): With several replicas, send a read not answered within `hedge_delay`
+                                          to a second replica too, keep the first response and cancel the other
+                                          call. Defaults to False.
+            hedge_delay (Optional[float], optional): Seconds before hedging a read. Defaults to None, the p95
+                                                     latency observed for reads.
+            policy (Optional[CallPolicy], optional): Deadlines, retries and re-authentication of the requests,
+                                                     with their statistics. Defaults to None, a `CallPolicy()`
+                                                     without deadlines.
         """
+        if pool_strategy not in ChannelPool.strategies:
+            raise ValueError(f"Unknown pool strategy: {pool_strategy}")
         self._channel = None
         self._stub = None
+        self._pool = None
         self._token = None
         self._host = host
         self._port = port
@@ -805,6 +945,17 @@ class Arikedb:
         self._ca_path = ca_path
         self._cert_path = cert_path
         self._key_path = key_path
+        self._pool_size = max(1, pool_size)
+        self._pool_strategy = pool_strategy
+        self._metadata_ttl = metadata_ttl
+        self._max_request_size = max_request_size
+        self._handles: Optional[MetadataCache] = MetadataCache(metadata_ttl) if metadata_ttl else None
+        self._replica_addresses = [r if isinstance(r, tuple) else tuple(r.rsplit(":", 1)) for r in replicas or ()]
+        self._hedge_reads = hedge_reads
+        self._hedge_delay = hedge_delay
+        self._replicas: Optional[ReadReplicas] = None
+        self._policy = policy or CallPolicy()
+        self._auth_lock = Lock()
 
     def __enter__(self):
         return self.connect()
@@ -820,110 +971,613 @@ class Arikedb:
 
         url = f"{self._host}:{self._port}"
 
-        _root_certificates: Optional[bytes] = None
-        _private_key: Optional[bytes] = None
-        _certificate_chain: Optional[bytes] = None
-
-        if self._use_ssl_tls:
-            if self._ca_path:
-                with open(self._ca_path, 'rb') as f:
-                    _root_certificates = f.read()
-                if self._cert_path:
-                    with open(self._cert_path, 'rb') as f:
-                        _certificate_chain = f.read()
-                if self._key_path:
-                    with open(self._key_path, 'rb') as f:
-                        _private_key = f.read()
-                credentials = grpc.ssl_channel_credentials(root_certificates=_root_certificates,
-                                                           private_key=_private_key,
-                                                           certificate_chain=_certificate_chain)
+        # Channels created with the same arguments share their subchannels (and so their TCP connection)
+        # by default, each pooled channel gets its own to actually spread the load.
+        options = [("grpc.use_local_subchannel_pool", 1)] if self._pool_size > 1 else None
+
+        channels = []
+        for _ in range(self._pool_size):
+            if self._use_ssl_tls:
+                credentials = channel_credentials(self._ca_path, self._cert_path, self._key_path)
+                channels.append(grpc.secure_channel(url, credentials, options=options))
             else:
-                credentials = grpc.ssl_channel_credentials()
-            self._channel = grpc.secure_channel(url, credentials)
-        else:
-            self._channel = grpc.insecure_channel(url)
+                channels.append(grpc.insecure_channel(url, options=options))
 
-        self._stub = ArikedbRPCStub(self._channel)
+        self._pool = ChannelPool(channels, self._pool_strategy)
+        self._channel = self._pool.channels[0]
+        self._stub = self._pool.stubs[0]
 
         if self._username and self._password:
-            response = self._exec_request(
-                self._stub.Authenticate,
-                AuthenticateRequest,
-                {"username": self._username,
-                 "password": self._password}
+            self._authenticate()
+
+        if self._replica_addresses:
+            self._replicas = ReadReplicas(
+                [Arikedb(host, int(port), self._username, self._password, self._use_ssl_tls, self._ca_path,
+                         self._cert_path, self._key_path, self._pool_size, self._pool_strategy,
+                         max_request_size=self._max_request_size, policy=self._policy) for host, port in self._replica_addresses],
+                self._pool_strategy,
+                self._hedge_reads,
+                self._hedge_delay
             )
+            self._replicas.connect()
 
-            status = Status(response.status)
-            if status != Status.Ok:
-                raise status.as_exception("Authentication failed")
+        return self
 
-            self._token = response.token
+    @property
+    def replicas(
+        self
+    ) -> Optional[ReadReplicas]:
+        """Read replicas of the connected client, with their read and hedging counters."""
 
-        return self
+        return self._replicas
+
+    @property
+    def policy(
+        self
+    ) -> CallPolicy:
+        return self._policy
 
     def disconnect(
         self
     ):
-        self._channel.close()
+        if self._replicas is not None:
+            self._replicas.disconnect()
+            self._replicas = None
+        self._pool.close()
+        self._pool = None
         self._channel = None
         self._stub = None
         self._token = None
 
+    def _authenticate(
+        self
+    ):
+        response = self._exec_request(
+            "Authenticate",
+            AuthenticateRequest,
+            {"username": self._username,
+             "password": self._password},
+            add_meta=False
+        )
+
+        check_status(response, "Authentication failed")
+
+        self._token = response.token
+
+    def _metadata(
+        self,
+        add_meta: bool = True
+    ) -> tuple:
+        return tuple() if (not add_meta or not self._token) else (('authorization', self._token),)
+
+    def _subscribe(
+        self,
+        collection: str,
+        names: Iterable[str],
+        events: Iterable[VarEvent]
+    ):
+        """Open a SubscribeVariables stream on a channel of the pool. The channel counts the stream
+        as outstanding until it terminates.
+        """
+        index = self._pool.acquire()
+        call = self._pool.stubs[index].SubscribeVariables(
+            SubscribeVariablesRequest(
+                collection=collection,
+                names=names,
+                events=variable_events(events)
+            ),
+            metadata=self._metadata()
+        )
+        if not call.add_callback(lambda: self._pool.release(index)):
+            self._pool.release(index)
+        return call
+
     def _exec_request(
         self,
-        method: Callable,
+        method: str,
         request_class,
         request_kwargs: Optional[dict] = None,
         add_meta: bool = True
     ):
         request_kwargs = {} if request_kwargs is None else request_kwargs
-        request = request_class(**request_kwargs)
-        metadata = tuple() if (not add_meta or not self._token) else (('authorization', self._token),)
-        response, call = method.with_call(request, metadata=metadata)
+        return self._exec(method, request_class(**request_kwargs), add_meta)
 
-        resp_metadata = dict(call.initial_metadata())
-        if "refresh_token" in resp_metadata:
-            self._token = resp_metadata["refresh_token"]
+    def _exec(
+        self,
+        method: str,
+        request,
+        add_meta: bool = True
+    ):
+        return self._invoke(method, lambda pool, index: getattr(pool.stubs[index], method), request, add_meta,
+                            read_only(method, request))
+
+    def _exec_raw(
+        self,
+        method: str,
+        response_class,
+        payload: bytes,
+        add_meta: bool = True
+    ):
+        """Send an already serialized request."""
 
+        return self._invoke(method, lambda pool, index: pool.raw_method(index, method, response_class), payload,
+                            add_meta, read_only(method, payload))
+
+    def _invoke(
+        self,
+        method: str,
+        get_method: Callable[[ChannelPool, int], grpc.UnaryUnaryMultiCallable],
+        request,
+        add_meta: bool = True,
+        read: bool = False
+    ):
+        """Send a request following the call policy: attempts failing with a retryable error are sent again
+        after a backoff, and a SessionExpired response makes the client authenticate and send it once more.
+        """
+        if read and self._replicas is not None:
+            return self._replicas.invoke(method, get_method, request, add_meta)
+
+        policy = self._policy
+        deadline = policy.deadline_for(method)
+        retries = 0
+        reauthenticated = False
+        while True:
+            token = self._token
+            started = time.monotonic()
+            try:
+                response = self._call(get_method, request, add_meta, policy.remaining(deadline))
+            except grpc.RpcError as e:
+                policy.record_attempt(method, time.monotonic() - started)
+                delay = policy.backoff_for(retries)
+                if not policy.should_retry(method, request, e, retries, delay, deadline):
+                    raise
+                time.sleep(delay)
+                retries += 1
+                policy.record_retry(method)
+                continue
+            policy.record_attempt(method, time.monotonic() - started)
+
+            if not reauthenticated and self._session_expired(response, add_meta):
+                self._reauthenticate(token)
+                reauthenticated = True
+                policy.record_reauthentication(method)
+                continue
+            return response
+
+    def _call(
+        self,
+        get_method: Callable[[ChannelPool, int], grpc.UnaryUnaryMultiCallable],
+        request,
+        add_meta: bool = True,
+        timeout: Optional[float] = None
+    ):
+        metadata = self._metadata(add_meta)
+
+        index = self._pool.acquire()
+        try:
+            response, call = get_method(self._pool, index).with_call(request, timeout=timeout, metadata=metadata)
+        finally:
+            self._pool.release(index)
+
+        self._refresh_token(call)
         return response
 
+    def _exec_future(
+        self,
+        method: str,
+        request,
+        add_meta: bool = True
+    ) -> Future:
+        """Start a request without waiting for it, following the call policy like `_invoke`. Cancelling the
+        returned future cancels the call in flight.
+        """
+        return self._invoke_future(method, lambda pool, index: getattr(pool.stubs[index], method), request,
+                                   add_meta, read_only(method, request))
+
+    def _invoke_future(
+        self,
+        method: str,
+        get_method: Callable[[ChannelPool, int], grpc.UnaryUnaryMultiCallable],
+        request,
+        add_meta: bool = True,
+        read: bool = False
+    ) -> Future:
+
+        if read and self._replicas is not None:
+            return self._replicas.future(method, get_method, request, add_meta)
+
+        policy = self._policy
+        deadline = policy.deadline_for(method)
+        future = Future()
+        calls = []
+        retries = [0]
+        reauthenticated = [False]
+
+        def _start():
+            if future.done():
+                return
+            token = self._token
+            started = time.monotonic()
+            try:
+                call = self._call_future(get_method, request, add_meta, policy.remaining(deadline))
+            except Exception as e:
+                _resolve(error=e)
+                return
+            calls.append(call)
+            call.add_done_callback(lambda c: _done(c, token, started))
+
+        def _done(call, token: Optional[str], started: float):
+            if call.cancelled():
+                return
+            policy.record_attempt(method, time.monotonic() - started)
+            error = call.exception()
+            if error is not None:
+                delay = policy.backoff_for(retries[0])
+                if not policy.should_retry(method, request, error, retries[0], delay, deadline):
+                    _resolve(error=error)
+                    return
+                retry = Timer(delay, _start)
+                retries[0] += 1
+                policy.record_retry(method)
+            elif not reauthenticated[0] and self._session_expired(call.result(), add_meta):
+                # Authenticating blocks, so it can't run in the callback of the call
+                retry = Thread(target=_reauthenticate, args=(token,))
+                reauthenticated[0] = True
+                policy.record_reauthentication(method)
+            else:
+                _resolve(call.result())
+                return
+            retry.daemon = True
+            retry.start()
+
+        def _reauthenticate(token: Optional[str]):
+            try:
+                self._reauthenticate(token)
+            except Exception as e:
+                _resolve(error=e)
+                return
+            _start()
+
+        def _resolve(response=None, error: Optional[Exception] = None):
+            try:
+                if error is None:
+                    future.set_result(response)
+                else:
+                    future.set_exception(error)
+            except InvalidStateError:
+                # Cancelled meanwhile
+                pass
+
+        def _cancel(f: Future):
+            if f.cancelled() and calls:
+                calls[-1].cancel()
+
+        future.add_done_callback(_cancel)
+        _start()
+        return future
+
+    def _call_future(
+        self,
+        get_method: Callable[[ChannelPool, int], grpc.UnaryUnaryMultiCallable],
+        request,
+        add_meta: bool = True,
+        timeout: Optional[float] = None
+    ) -> grpc.Future:
+        """Start a single attempt. The channel is released and the token refreshed when it completes."""
+
+        metadata = self._metadata(add_meta)
+
+        index = self._pool.acquire()
+        try:
+            future = get_method(self._pool, index).future(request, timeout=timeout, metadata=metadata)
+        except Exception:
+            self._pool.release(index)
+            raise
+
+        def _done(call):
+            self._pool.release(index)
+            if not call.cancelled() and call.exception() is None:
+                self._refresh_token(call)
+
+        future.add_done_callback(_done)
+        return future
+
+    def _session_expired(
+        self,
+        response,
+        add_meta: bool = True
+    ) -> bool:
+        return (
+            add_meta
+            and self._policy.reauthenticate
+            and bool(self._username and self._password)
+            and response.status == Status.SessionExpired.value
+        )
+
+    def _reauthenticate(
+        self,
+        token: Optional[str]
+    ):
+        """Authenticate again, unless another request already did since `token` was sent."""
+
+        with self._auth_lock:
+            if self._token == token:
+                self._authenticate()
+
+    def _exec_chunked(
+        self,
+        method: str,
+        request,
+        field: str,
+        max_size: Optional[int] = None,
+        concurrent: bool = True,
+        add_meta: bool = True
+    ) -> List[Tuple]:
+        """Send `request` split along its repeated `field` in parts of up to `max_size` (by default
+        `max_request_size`) encoded bytes, sent concurrently or else one after the other. Returns the
+        (request, response) of every part.
+        """
+        max_size = max_size or self._max_request_size
+        if not max_size:
+            return [(request, self._exec(method, request, add_meta))]
+
+        parts = split_request(request, field, max_size)
+        if len(parts) == 1:
+            return [(request, self._exec(method, request, add_meta))]
+
+        if not concurrent:
+            return [(part, self._exec(method, part, add_meta)) for part in parts]
+
+        futures = [self._exec_future(method, part, add_meta) for part in parts]
+        return [(part, future.result()) for part, future in zip(parts, futures)]
+
+    def _submit(
+        self,
+        method: str,
+        request,
+        decode: Callable[[List[Tuple]], object],
+        field: Optional[str] = None,
+        max_size: Optional[int] = None,
+        concurrent: bool = True,
+        add_meta: bool = True
+    ) -> Future:
+        """Start `request` (split along `field` like in `_exec_chunked`) without waiting for it. Returns a future
+        resolved with `decode` applied to the (request, response) of every part. Cancelling it cancels the calls.
+        """
+        max_size = max_size or self._max_request_size
+        parts = split_request(request, field, max_size) if field and max_size else [request]
+        responses = [None] * len(parts)
+        calls = []
+        pending = [len(parts)]
+        lock = Lock()
+        future = Future()
+
+        def _resolve(error: Optional[Exception] = None):
+            with lock:
+                if future.done():
+                    return
+                if error is None:
+                    try:
+                        future.set_result(decode(list(zip(parts, responses))))
+                        return
+                    except Exception as e:
+                        error = e
+                future.set_exception(error)
+
+        def _start(i: int):
+            call = self._exec_future(method, parts[i], add_meta)
+            calls.append(call)
+            call.add_done_callback(lambda c: _done(i, c))
+
+        def _done(i: int, call):
+            try:
+                responses[i] = call.result()
+            except Exception as e:
+                _resolve(e)
+                return
+            if not concurrent and i + 1 < len(parts):
+                _start(i + 1)
+                return
+            with lock:
+                pending[0] -= 1
+                last = pending[0] == 0 or not concurrent
+            if last:
+                _resolve()
+
+        def _cancel(f: Future):
+            if f.cancelled():
+                for call in list(calls):
+                    call.cancel()
+
+        future.add_done_callback(_cancel)
+        for i in range(len(parts) if concurrent else 1):
+            _start(i)
+        return future
+
+    def _refresh_token(
+        self,
+        call
+    ):
+        resp_metadata = dict(call.initial_metadata() or ())
+        if "refresh_token" in resp_metadata:
+            self._token = resp_metadata["refresh_token"]
+
     def collections(
         self,
         pattern: Optional[str] = None
     ) -> List[Collection]:
 
         response = self._exec_request(
-            self._stub.ListCollections,
+            "ListCollections",
             ListCollectionsRequest,
             {"pattern": pattern}
         )
-        status = Status(response.status)
-        if status != Status.Ok:
-            raise status.as_exception("Failed listing collections")
-        return [Collection(c.name, self, dont_create=True) for c in response.collections]
+        check_status(response, "Failed listing collections")
+        collections = [self._listed_collection(c.name) for c in response.collections]
+        if self._handles is not None:
+            self._handles.update("collections", collections, complete=pattern in (None, "*"))
+        return collections
+
+    def _listed_collection(
+        self,
+        name: str
+    ) -> Collection:
+        """Handle of a listed collection. The cached one is kept, with its own metadata cache."""
+
+        if self._handles is not None:
+            handle = self._handles.peek("collections", name)
+            if handle is not None:
+                return handle
+        return Collection(name, self, dont_create=True)
 
     def collection(
         self,
         name: str
     ) -> Optional[Collection]:
 
+        if self._handles is not None:
+            found, handle = self._handles.get("collections", name)
+            if found:
+                return handle
         collections = self.collections(pattern=name)
         return collections[0] if len(collections) > 0 else None
 
+    def collection_handle(
+        self,
+        name: str
+    ) -> Collection:
+        """Return a collection handle without any request to the server. If the collection does not exist,
+        `CollectionNotFound` is raised by the first request made through the handle.
+        """
+        return Collection(name, self, dont_create=True)
+
+    def collection_handles(
+        self,
+        names: Iterable[str],
+        create: bool = False,
+        verify: bool = False
+    ) -> List[Collection]:
+        """Return handles for many collections at once. With `create` the missing collections are created in a
+        single request, with `verify` a single listing checks that all of them exist.
+        """
+        names = list(names)
+        if create:
+            self.create_collections(names)
+        handles = [self.collection_handle(name) for name in names]
+        if verify:
+            missing = self.verify_collections(handles)
+            if missing:
+                raise CollectionNotFound(f"Collections not found: {', '.join(missing)}")
+        return handles
+
+    def multi_get(
+        self,
+        names: Dict[Union[str, Collection], Iterable[str]],
+        columnar: bool = False,
+        timeout: Optional[float] = None
+    ) -> Dict[str, Dict]:
+        """Read variables of many collections concurrently. Returns the `ts_variables_get` result of each
+        collection under "results" and the exception of each failed one under "errors". The requests still
+        pending after `timeout` seconds are cancelled and fail with `TimeoutError`. Each collection can be given
+        once, by name or by handle, or ValueError is raised.
+        """
+        return self._fan_out(
+            [(self._collection_of(c), n) for c, n in names.items()],
+            lambda collection, n: collection.ts_variables_get_async(n, columnar),
+            timeout
+        )
+
+    def multi_set(
+        self,
+        values: Dict[Union[str, Collection], Iterable[Tuple[str, Union[int, float, str, bool], Optional[int]]]],
+        timestamp_ns: Optional[int] = None,
+        timeout: Optional[float] = None
+    ) -> Dict[str, Dict]:
+        """Set variables of many collections concurrently. Results and errors are returned like in `multi_get`."""
+
+        return self._fan_out(
+            [(self._collection_of(c), v) for c, v in values.items()],
+            lambda collection, v: collection.ts_variables_set_async(v, timestamp_ns),
+            timeout
+        )
+
+    def _collection_of(
+        self,
+        collection: Union[str, Collection]
+    ) -> Collection:
+
+        return self.collection_handle(collection) if isinstance(collection, str) else collection
+
+    @staticmethod
+    def _fan_out(
+        requests: List[Tuple[Collection, object]],
+        submit: Callable[[Collection, object], Future],
+        timeout: Optional[float] = None
+    ) -> Dict[str, Dict]:
+
+        # Results are keyed by name, so a collection given both by name and by handle would lose a request
+        names = [collection.name for collection, _ in requests]
+        duplicates = sorted({name for name in names if names.count(name) > 1})
+        if duplicates:
+            raise ValueError(f"Collections given more than once: {', '.join(duplicates)}")
+
+        futures = {}
+        errors = {}
+        for collection, args in requests:
+            try:
+                futures[collection.name] = submit(collection, args)
+            except Exception as e:
+                errors[collection.name] = e
+
+        _, not_done = wait(futures.values(), timeout)
+        for future in not_done:
+            future.cancel()
+
+        results = {}
+        for name, future in futures.items():
+            if future.cancelled():
+                errors[name] = TimeoutError(f"No response from collection {name} within {timeout} s")
+            elif future.exception() is not None:
+                errors[name] = future.exception()
+            else:
+                results[name] = future.result()
+        return {"results": results, "errors": errors}
+
+    def verify_collections(
+        self,
+        collections: Iterable[Union[str, Collection]]
+    ) -> List[str]:
+        """Check with a single request which of the given collections exist. Returns the missing names."""
+
+        existing = {c.name for c in self.collections()}
+        names = [c if isinstance(c, str) else c.name for c in collections]
+        return [name for name in names if name not in existing]
+
+    def prefetch_metadata(
+        self,
+        collections: bool = True
+    ):
+        """Fill the metadata cache with every collection of the server and, unless `collections` is False,
+        with the contents of each of them.
+        """
+        for collection in self.collections():
+            if collections:
+                collection.prefetch_metadata()
+
     def create_collections(
         self,
         names: Iterable[str]
     ) -> Dict[str, List[str]]:
 
         response = self._exec_request(
-            self._stub.CreateCollections,
+            "CreateCollections",
             CreateCollectionsRequest,
             {"collections": [CollectionMeta(name=name) for name in names]}
         )
+        if self._handles is not None:
+            self._handles.invalidate("collections", [])
 
-        status = Status(response.status)
-        if status not in [Status.Ok, Status.LicenseLimitsExceeded]:
-            raise status.as_exception("Failed creating collections")
+        check_status(response, "Failed creating collections", (Status.Ok, Status.LicenseLimitsExceeded))
 
         return {
             "already_exists": response.already_exists,
@@ -935,16 +1589,12 @@ class Arikedb:
         names: Iterable[str]
     ) -> Dict[str, List[str]]:
 
+        names = list(names)
         response = self._exec_request(
-            self._stub.DeleteCollections,
+            "DeleteCollections",
             DeleteCollectionsRequest,
             {"names": names}
         )
-
-        status = Status(response.status)
-        if status != Status.Ok:
-            raise status.as_exception(f"Failed to list collections: {response.status}")
-
-        return {
-            "not_found": response.not_found,
-        }
+        if self._handles is not None:
+            self._handles.invalidate("collections", names)
+        return not_found_result(response, "Failed deleting collections")
@@ -0,0 +1,295 @@
+from __future__ import annotations
+import random
+import time
+from collections import OrderedDict
+from threading import Condition, Lock, Thread
+from typing import TYPE_CHECKING, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple, Union
+
+import grpc
+
+from .common import Event, VarEvent
+from .codec import ts_value
+from .subscriptions import stream_error
+
+if TYPE_CHECKING:
+    from .arikedb import Collection
+
+
+class ValueCache:
+
+    def __init__(
+        self,
+        collection: Collection,
+        max_size: int = 10_000,
+        event: Event = Event.OnSet,
+        resubscribe_delay: float = 0.05,
+        max_backoff: float = 5.0
+    ):
+        """Read-through cache of time series values. Names read through `get` are kept fresh by a single
+        SubscribeVariables stream on `event` (OnSet or OnChange), so following reads of those names are served
+        locally. The least recently read names are evicted past `max_size`, and the whole cache is invalidated
+        if the stream drops. While the stream can't be opened, resubscriptions wait a jittered exponential backoff
+        (`resubscribe_delay` doubled on each failure up to `max_backoff`).
+        """
+        self.collection = collection
+        self.max_size = max_size
+        self.event = event
+        self.resubscribe_delay = resubscribe_delay
+        self.max_backoff = max_backoff
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.resubscriptions = 0
+        self.failures = 0
+        self.last_error: Optional[grpc.RpcError] = None
+
+        self._values: OrderedDict = OrderedDict()
+        self._names: Set[str] = set()
+        self._stream_names: FrozenSet[str] = frozenset()
+        self._call = None
+        self._failed_attempts = 0
+        self._closed = False
+        self._cond = Condition()
+        self._thread = Thread(target=self._run, name=f"arikedb-cache-{collection.name}", daemon=True)
+        self._thread.start()
+
+    def __len__(self):
+        return len(self._values)
+
+    @property
+    def hit_ratio(
+        self
+    ) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def get(
+        self,
+        names: Iterable[str]
+    ) -> List[Tuple[str, int, Union[int, float, str, bool]]]:
+
+        names = list(names)
+        misses = []
+        with self._cond:
+            for name in names:
+                if name in self._values:
+                    self._values.move_to_end(name)
+                    self.hits += 1
+                else:
+                    misses.append(name)
+            self.misses += len(misses)
+
+        fetched = {}
+        if misses:
+            fetched = {v[0]: v for v in self.collection._ts_variables_get(misses)}
+            with self._cond:
+                for value in fetched.values():
+                    self._store(value, insert=True)
+                self._cond.notify_all()
+
+        with self._cond:
+            values = []
+            for name in names:
+                value = self._values.get(name) or fetched.get(name)
+                if value is not None:
+                    values.append(value)
+            return values
+
+    def invalidate(
+        self
+    ):
+        with self._cond:
+            self._values.clear()
+            self._names.clear()
+            self.invalidations += 1
+            self._cond.notify_all()
+
+    def close(
+        self
+    ):
+        with self._cond:
+            self._closed = True
+            call, self._call = self._call, None
+            self._cond.notify_all()
+        if call is not None:
+            call.cancel()
+        self._thread.join()
+
+    def _store(
+        self,
+        value: Tuple[str, int, Union[int, float, str, bool]],
+        insert: bool = False
+    ):
+        name = value[0]
+        current = self._values.get(name)
+        if current is None:
+            if not insert:
+                return
+            self._names.add(name)
+        elif current[1] > value[1]:
+            return
+        self._values[name] = value
+        if insert:
+            self._values.move_to_end(name)
+        while len(self._values) > self.max_size:
+            evicted, _ = self._values.popitem(last=False)
+            self._names.discard(evicted)
+            self.evictions += 1
+
+    def _run(
+        self
+    ):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._closed or self._names != self._stream_names)
+                if self._closed:
+                    return
+
+            # Let close misses accumulate so they are added with a single resubscription
+            if self._failed_attempts:
+                delay = random.uniform(0, min(self.max_backoff, self.resubscribe_delay * 2 ** self._failed_attempts))
+                with self._cond:
+                    if self._cond.wait_for(lambda: self._closed, delay):
+                        return
+            else:
+                time.sleep(self.resubscribe_delay)
+
+            with self._cond:
+                names = frozenset(self._names)
+                added = names - self._stream_names
+
+            call = None
+            if names:
+                call = self.collection.client._subscribe(self.collection.name, names, [VarEvent(self.event)])
+                error = stream_error(call)
+                if error is not None:
+                    self.failures += 1
+                    self.last_error = error
+                    self._failed_attempts += 1
+                    self.invalidate()
+                    continue
+                self._failed_attempts = 0
+
+            with self._cond:
+                old_call, self._call = self._call, call
+                self._stream_names = names
+                self.resubscriptions += 1
+            if old_call is not None:
+                old_call.cancel()
+            if call is not None:
+                Thread(target=self._read, args=(call,), daemon=True).start()
+
+            # Values set between the first read of the added names and the stream start were not notified
+            if added:
+                try:
+                    refreshed = self.collection._ts_variables_get(list(added))
+                except Exception:
+                    self.invalidate()
+                    continue
+                with self._cond:
+                    for value in refreshed:
+                        self._store(value)
+
+    def _read(
+        self,
+        call
+    ):
+        try:
+            for response in call:
+                value = ts_value(response)
+                if value is not None:
+                    with self._cond:
+                        self._store(value)
+        except grpc.RpcError:
+            pass
+
+        with self._cond:
+            if call is not self._call:
+                return
+            self._call = None
+            self._stream_names = frozenset()
+        self.invalidate()
+
+
+class MetadataCache:
+
+    def __init__(
+        self,
+        ttl: float
+    ):
+        """Handles (variables, stacks, fifos, sorted lists or collections) by kind and name, valid for `ttl`
+        seconds. A listing without pattern marks the kind as complete, so names missing from it are known not
+        to exist until it expires.
+        """
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: Dict[str, Dict[str, Tuple[object, float]]] = {}
+        self._complete: Dict[str, float] = {}
+        self._lock = Lock()
+
+    def get(
+        self,
+        kind: str,
+        name: str
+    ) -> Tuple[bool, Optional[object]]:
+        """Return (found, handle). `found` is False when the server has to be asked."""
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(kind, {}).get(name)
+            if entry is not None and entry[1] > now:
+                self.hits += 1
+                return True, entry[0]
+            if self._complete.get(kind, 0.0) > now:
+                self.hits += 1
+                return True, None
+            self.misses += 1
+            return False, None
+
+    def peek(
+        self,
+        kind: str,
+        name: str
+    ) -> Optional[object]:
+        """Return the handle of `name`, even expired, so a new listing can reuse it. Not counted as a hit or miss."""
+
+        with self._lock:
+            entry = self._entries.get(kind, {}).get(name)
+        return None if entry is None else entry[0]
+
+    def update(
+        self,
+        kind: str,
+        handles: Iterable,
+        complete: bool = False
+    ):
+        expires = time.monotonic() + self.ttl
+        entries = {h.name: (h, expires) for h in handles}
+        with self._lock:
+            if complete:
+                self._entries[kind] = entries
+                self._complete[kind] = expires
+            else:
+                self._entries.setdefault(kind, {}).update(entries)
+
+    def invalidate(
+        self,
+        kind: Optional[str] = None,
+        names: Optional[Iterable[str]] = None
+    ):
+        """Forget the given names of a kind, the whole kind, or everything. The kind stops being complete."""
+
+        with self._lock:
+            kinds = [kind] if kind is not None else list(self._entries)
+            for k in kinds:
+                self._complete.pop(k, None)
+                if names is None:
+                    self._entries.pop(k, None)
+                else:
+                    for name in names:
+                        self._entries.get(k, {}).pop(name, None)
+            if kind is None:
+                self._complete.clear()
@@ -0,0 +1,550 @@
+from __future__ import annotations
+import math
+from array import array
+from itertools import repeat
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from .common import ValueType, Status, VarEvent
+from .arike_ts_variable_pb2 import TsVarValue, VariableEvent
+
+
+Buffer = Union[memoryview, bytearray, array, "np.ndarray"]
+
+TYPES_MAP = {
+    int: "int_value",
+    float: "float_value",
+    str: "str_value",
+    bool: "bool_value",
+}
+
+DTYPE_KINDS = {
+    "b": "bool_value",
+    "i": "int_value",
+    "u": "int_value",
+    "f": "float_value",
+    "U": "str_value",
+}
+
+VALUE_FIELDS = {
+    ValueType.Int.value: "int_value",
+    ValueType.Float.value: "float_value",
+    ValueType.String.value: "str_value",
+    ValueType.Bool.value: "bool_value",
+}
+
+BUFFER_FORMATS = {
+    **{code: "int_value" for code in "bBhHiIlLqQnN"},
+    "f": "float_value",
+    "d": "float_value",
+    "?": "bool_value",
+    "u": "str_value",
+}
+
+FIELD_DTYPES = {
+    "int_value": "int64",
+    "float_value": "float64",
+    "str_value": "str",
+    "bool_value": "bool",
+}
+
+
+def split_request(
+    request,
+    field: str,
+    max_size: int
+) -> list:
+    """Split `request` along its repeated `field` in requests of at most `max_size` encoded bytes (a single
+    entry bigger than that is sent alone). The other fields, which must be scalars, are copied to every part.
+    """
+    size = request.ByteSize()
+    items = getattr(request, field)
+    if size <= max_size or len(items) < 2:
+        return [request]
+
+    scalars = [(d.name, value) for d, value in request.ListFields() if d.name != field]
+    n = min(len(items), math.ceil(size * 1.1 / max_size))
+    step = math.ceil(len(items) / n)
+
+    parts = []
+    for start in range(0, len(items), step):
+        part = type(request)()
+        for name, value in scalars:
+            setattr(part, name, value)
+        getattr(part, field).extend(items[start:start + step])
+        parts.extend(split_request(part, field, max_size))
+    return parts
+
+
+def merge_results(
+    results: List[Dict]
+) -> Dict:
+    """Merge the result dicts of the parts of a split request."""
+
+    if len(results) == 1:
+        return results[0]
+
+    merged = {}
+    for result in results:
+        for key, value in result.items():
+            if isinstance(value, dict):
+                counts = merged.setdefault(key, {})
+                for name, count in value.items():
+                    counts[name] = counts.get(name, 0) + count
+            else:
+                merged.setdefault(key, []).extend(value)
+    return {key: value if isinstance(value, dict) else list(dict.fromkeys(value)) for key, value in merged.items()}
+
+
+def merge_columns(
+    parts: List[Tuple[List[str], Sequence[int], Sequence[Union[int, float, str, bool]]]]
+) -> Tuple[List[str], Sequence[int], Sequence[Union[int, float, str, bool]]]:
+    """Concatenate the columns decoded from the parts of a split request."""
+
+    if len(parts) == 1:
+        return parts[0]
+
+    names = [name for part in parts for name in part[0]]
+    if np is None:
+        return names, [t for part in parts for t in part[1]], [v for part in parts for v in part[2]]
+
+    values = [part[2] for part in parts if len(part[2])]
+    if len({v.dtype for v in values}) > 1:
+        values = [v.astype(object) for v in values]
+    return (
+        names,
+        np.concatenate([part[1] for part in parts]),
+        np.concatenate(values) if values else np.array([], dtype=object)
+    )
+
+
+def set_results(
+    responses: List[Tuple]
+) -> Dict[str, List[str]]:
+
+    return merge_results([set_result(response) for _, response in responses])
+
+
+def get_results(
+    responses: List[Tuple],
+    columnar: bool = False
+) -> Union[List[Tuple[str, int, Union[int, float, str, bool]]], Tuple[List[str], Sequence, Sequence]]:
+
+    if columnar:
+        return merge_columns([ts_columns_result(response) for _, response in responses])
+    return [value for _, response in responses for value in ts_values_result(response)]
+
+
+def insert_results(
+    responses: List[Tuple],
+    message: str
+) -> Dict:
+
+    return merge_results([
+        insert_result(response, [v.name for v in part.values], message) for part, response in responses
+    ])
+
+
+def already_exists_results(
+    responses: List[Tuple],
+    message: str
+) -> Dict[str, List[str]]:
+
+    return merge_results([already_exists_result(response, message) for _, response in responses])
+
+
+def check_status(
+    response,
+    message: str,
+    accepted: Iterable[Status] = (Status.Ok,)
+):
+    status = Status(response.status)
+    if status not in accepted:
+        raise status.as_exception(message)
+
+
+def take(
+    values: Sequence,
+    indices: List[int]
+) -> Sequence:
+    """The values at `indices`, as a NumPy array if `values` is one."""
+
+    if np is not None and isinstance(values, np.ndarray):
+        return values[indices]
+    return [values[i] for i in indices]
+
+
+def value_field(
+    value
+) -> Tuple[str, Union[int, float, str, bool]]:
+    """Return the value field holding `value`, and `value` as a Python scalar (NumPy scalars are converted)."""
+
+    field = TYPES_MAP.get(type(value))
+    if field is not None:
+        return field, value
+    if np is not None and isinstance(value, np.generic) and value.dtype.kind in DTYPE_KINDS:
+        return DTYPE_KINDS[value.dtype.kind], value.item()
+    for type_, field in TYPES_MAP.items():
+        if isinstance(value, type_):
+            return field, value
+    raise TypeError(f"Unsupported value type: {type(value).__name__}")
+
+
+def as_list(
+    values: Sequence
+) -> list:
+
+    if np is not None and isinstance(values, np.ndarray):
+        return values.tolist()
+    return list(values)
+
+
+def ts_values(
+    values: Iterable[Tuple[str, Union[int, float, str, bool], Optional[int]]]
+) -> List[TsVarValue]:
+
+    var_values = []
+    for x in values:
+        field, value = value_field(x[1])
+        kw = {"name": x[0], field: value}
+        if len(x) == 3:
+            kw["timestamp"] = x[2]
+        var_values.append(TsVarValue(**kw))
+    return var_values
+
+
+def set_variables_kwargs(
+    collection: str,
+    values: Iterable[Tuple[str, Union[int, float, str, bool], Optional[int]]],
+    timestamp_ns: Optional[int] = None
+) -> dict:
+
+    req_kw = {"collection": collection, "values": ts_values(values)}
+    if timestamp_ns:
+        req_kw["timestamp"] = timestamp_ns
+    return req_kw
+
+
+def add_ts_columns(
+    var_values,
+    names: Sequence[str],
+    values: Sequence[Union[int, float, str, bool]],
+    timestamps: Optional[Sequence[int]] = None
+):
+    """Append one TsVarValue per name to the repeated field `var_values`. The value field is taken once from
+    the dtype when `values` is a NumPy array, and from each value otherwise.
+    """
+    field = None
+    if np is not None and isinstance(values, np.ndarray):
+        field = DTYPE_KINDS.get(values.dtype.kind)
+
+    names = as_list(names)
+    values = as_list(values)
+    if field is not None:
+        fields = repeat(field)
+    else:
+        fields = []
+        for i, value in enumerate(values):
+            field, values[i] = value_field(value)
+            fields.append(field)
+
+    if len(values) != len(names):
+        raise ValueError("names and values must have the same length")
+
+    add = var_values.add
+    if timestamps is None:
+        for name, field, value in zip(names, fields, values):
+            add(**{"name": name, field: value})
+    else:
+        timestamps = as_list(timestamps)
+        if len(timestamps) != len(names):
+            raise ValueError("names and timestamps must have the same length")
+        for name, field, value, timestamp in zip(names, fields, values, timestamps):
+            add(**{"name": name, field: value, "timestamp": timestamp})
+
+
+def variable_events(
+    events: Iterable[VarEvent]
+) -> List[VariableEvent]:
+
+    return [
+        VariableEvent(
+            event=e.event.value,
+            str_value=e.str_value,
+            str_low_limit=e.str_low_limit,
+            str_high_limit=e.str_high_limit,
+            int_value=e.int_value,
+            int_low_limit=e.int_low_limit,
+            int_high_limit=e.int_high_limit,
+            float_value=e.float_value,
+            float_low_limit=e.float_low_limit,
+            float_high_limit=e.float_high_limit,
+            bool_value=e.bool_value,
+            bool_low_limit=e.bool_low_limit,
+            bool_high_limit=e.bool_high_limit
+        ) for e in events
+    ]
+
+
+def packed_values(
+    vals: Sequence[Union[int, float, str, bool]]
+) -> Tuple[str, Sequence[Union[int, float, str, bool]]]:
+    """Return the repeated field for `vals` and its values. NumPy arrays, `array.array` and memoryviews are
+    typed by their dtype or format and converted to a list in one call; other sequences by their first value.
+    """
+    field = None
+    if np is not None and isinstance(vals, np.ndarray):
+        field = DTYPE_KINDS.get(vals.dtype.kind)
+    elif isinstance(vals, array):
+        field = BUFFER_FORMATS.get(vals.typecode)
+    elif isinstance(vals, memoryview):
+        field = BUFFER_FORMATS.get(vals.format.lstrip("@=<>!"))
+
+    if field is not None:
+        return field, vals.tolist()
+    if isinstance(vals, (array, memoryview)):
+        raise TypeError(f"Unsupported buffer format: {getattr(vals, 'typecode', None) or vals.format}")
+    if np is not None and isinstance(vals, np.ndarray):
+        vals = vals.tolist()
+    return value_field(vals[0])[0], vals
+
+
+def array_values(
+    value_class,
+    values: Iterable[Tuple[str, Iterable[Union[int, float, str, bool]]]],
+    max_size: Optional[int] = None
+) -> Tuple[list, List[str]]:
+    """Build the array value messages. With `max_size`, the values of an array whose message would be bigger than
+    that many encoded bytes are spread over several consecutive messages.
+    """
+    arr_values = []
+    names = []
+    for name, vals in values:
+        if len(vals) == 0:
+            continue
+        field, vals = packed_values(vals)
+        arr_value = value_class(name=name)
+        getattr(arr_value, field).extend(vals)
+
+        # Strings can be of any size, other values take up to 10 bytes
+        n = 1
+        if max_size and (field == "str_value" or len(vals) * 10 > max_size):
+            n = min(len(vals), math.ceil(arr_value.ByteSize() * 1.1 / max_size))
+        if n == 1:
+            arr_values.append(arr_value)
+            names.append(name)
+            continue
+
+        step = math.ceil(len(vals) / n)
+        for start in range(0, len(vals), step):
+            part = value_class(name=name)
+            getattr(part, field).extend(vals[start:start + step])
+            arr_values.append(part)
+            names.append(name)
+    return arr_values, names
+
+
+def names_counts(
+    count_class,
+    names: Iterable[Union[str, Tuple[str, int]]],
+    **kwargs
+) -> list:
+
+    counts = []
+    for x in names:
+        if isinstance(x, str):
+            counts.append(count_class(name=x, n=1, **kwargs))
+        else:
+            counts.append(count_class(name=x[0], n=x[1], **kwargs))
+    return counts
+
+
+def ts_value(
+    v: TsVarValue
+) -> Optional[Tuple[str, int, Union[int, float, str, bool]]]:
+
+    field = VALUE_FIELDS.get(v.val_type)
+    if field is None:
+        return None
+    return v.name, v.timestamp, getattr(v, field)
+
+
+def ts_values_result(
+    response
+) -> List[Tuple[str, int, Union[int, float, str, bool]]]:
+
+    check_status(response, "Failed getting variables")
+
+    values = []
+    for v in response.values:
+        val_tup = ts_value(v)
+        if val_tup is not None:
+            values.append(val_tup)
+    return values
+
+
+def ts_columns(
+    names: List[str],
+    timestamps: List[int],
+    values: List[Union[int, float, str, bool]],
+    fields: set
+) -> Tuple[List[str], Sequence[int], Sequence[Union[int, float, str, bool]]]:
+    """Return the columns as (names, uint64 timestamps array, values array). The values array has the dtype of
+    the value type when all values share it, and object dtype otherwise. Without NumPy the columns are lists.
+    """
+    if np is None:
+        return names, timestamps, values
+
+    dtype = FIELD_DTYPES[next(iter(fields))] if len(fields) == 1 else object
+    return names, np.array(timestamps, dtype=np.uint64), np.array(values, dtype=dtype)
+
+
+def ts_columns_result(
+    response
+) -> Tuple[List[str], Sequence[int], Sequence[Union[int, float, str, bool]]]:
+
+    check_status(response, "Failed getting variables")
+
+    names, timestamps, values = [], [], []
+    fields = set()
+    for v in response.values:
+        field = VALUE_FIELDS.get(v.val_type)
+        if field is None:
+            continue
+        names.append(v.name)
+        timestamps.append(v.timestamp)
+        values.append(getattr(v, field))
+        fields.add(field)
+    return ts_columns(names, timestamps, values, fields)
+
+
+def ts_values_columns(
+    values: List[Tuple[str, int, Union[int, float, str, bool]]]
+) -> Tuple[List[str], Sequence[int], Sequence[Union[int, float, str, bool]]]:
+
+    return ts_columns(
+        [v[0] for v in values],
+        [v[1] for v in values],
+        [v[2] for v in values],
+        {TYPES_MAP[type(v[2])] for v in values}
+    )
+
+
+def set_result(
+    response
+) -> Dict[str, List[str]]:
+
+    check_status(response, "Failed setting variables", (Status.Ok, Status.VariableNotFound, Status.TypeError))
+
+    return {
+        "not_found": response.not_found,
+        "invalid_type": response.invalid_type
+    }
+
+
+def array_values_result(
+    response,
+    message: str,
+    numpy: bool = False,
+    out: Optional[Dict[str, Buffer]] = None
+) -> List[Tuple[str, Sequence[Union[int, float, str, bool]]]]:
+    """Decode array values. With `numpy` they are returned as NumPy arrays, and the values of the names in
+    `out` are written into those buffers and returned as a view of the written part (a new array is returned
+    if the buffer is too small, or if its dtype can't hold the values without loss).
+
+    The protobuf runtime exposes no buffer over repeated fields, so NumPy still reads them element by element
+    through the sequence protocol. This saves building a Python list, not the per-element conversion.
+    """
+    if (numpy or out) and np is None:
+        raise ImportError("NumPy is required to decode into arrays")
+
+    check_status(response, message)
+
+    values = []
+    for v in response.values:
+        field = VALUE_FIELDS.get(v.val_type)
+        if field is None:
+            continue
+        vals = getattr(v, field)
+        if out and v.name in out:
+            values.append((v.name, fill_buffer(out[v.name], vals, FIELD_DTYPES[field])))
+        elif numpy:
+            values.append((v.name, np.array(vals, dtype=FIELD_DTYPES[field])))
+        else:
+            values.append((v.name, vals))
+    return values
+
+
+def fill_buffer(
+    buffer: Buffer,
+    vals: Sequence[Union[int, float, str, bool]],
+    dtype: str
+) -> "np.ndarray":
+
+    # The values are already removed from the server, so they are only written where they fit unchanged
+    source = np.dtype(dtype)
+    if source.kind == "U":
+        # The width of strings is only known once decoded
+        vals = np.array(vals, dtype=dtype)
+        source = vals.dtype
+    target = np.asarray(buffer)
+    if (target.ndim != 1 or len(target) < len(vals) or not target.flags.writeable
+            or not np.can_cast(source, target.dtype, "safe")):
+        return np.array(vals, dtype=dtype)
+    target[:len(vals)] = vals
+    return target[:len(vals)]
+
+
+def named_out(
+    name: str,
+    out: Optional[Buffer]
+) -> Optional[Dict[str, Buffer]]:
+
+    return None if out is None else {name: out}
+
+
+def insert_result(
+    response,
+    names: List[str],
+    message: str
+) -> Dict:
+
+    check_status(response, message)
+
+    non_inserted = {}
+    for name, ni in zip(names, response.non_inserted):
+        non_inserted[name] = non_inserted.get(name, 0) + ni
+
+    return {
+        "not_found": response.not_found,
+        "invalid_type": response.invalid_type,
+        "non_inserted": non_inserted
+    }
+
+
+def already_exists_result(
+    response,
+    message: str
+) -> Dict[str, List[str]]:
+
+    check_status(response, message)
+
+    return {
+        "already_exists": response.already_exists
+    }
+
+
+def not_found_result(
+    response,
+    message: str
+) -> Dict[str, List[str]]:
+
+    check_status(response, message)
+
+    return {
+        "not_found": response.not_found
+    }
@@ -0,0 +1,110 @@
+from __future__ import annotations
+import math
+from typing import TYPE_CHECKING, Dict, Iterable, List, Sequence, Tuple, Union
+
+from .codec import as_list, take
+
+if TYPE_CHECKING:
+    from .arikedb import Collection
+
+
+def swinging_door(
+    timestamps: Sequence[int],
+    values: Sequence[Union[int, float]],
+    deviation: float
+) -> List[int]:
+    """Swinging door trending. Return the indices of the samples to keep so that linear interpolation between
+    them stays within `deviation` of every sample dropped. The first and last samples are always kept.
+    Non-finite samples (NaN, infinities) can't be interpolated: they are kept, with the samples around them.
+    Timestamps must be strictly increasing.
+    """
+    timestamps = as_list(timestamps)
+    values = as_list(values)
+    if len(timestamps) != len(values):
+        raise ValueError("timestamps and values must have the same length")
+    if len(values) <= 2:
+        return list(range(len(values)))
+
+    kept = []
+    # Whether the last kept sample is finite and starts the current segment
+    anchored = False
+    t0, v0 = timestamps[0], values[0]
+    # Slopes from the last kept sample keeping every sample since then within the deviation (the doors)
+    lower, upper = float("-inf"), float("inf")
+    i = 0
+    while i < len(values):
+        t, v = timestamps[i], values[i]
+        if i and t <= timestamps[i - 1]:
+            raise ValueError("timestamps must be strictly increasing")
+        if not math.isfinite(v):
+            # A gap: the segment ends on the previous sample and the next one starts a new segment
+            if anchored and kept[-1] != i - 1:
+                kept.append(i - 1)
+            kept.append(i)
+            anchored = False
+            i += 1
+            continue
+        if not anchored:
+            kept.append(i)
+            t0, v0 = t, v
+            lower, upper = float("-inf"), float("inf")
+            anchored = True
+            i += 1
+            continue
+        dt = t - t0
+        if not lower <= (v - v0) / dt <= upper:
+            # The sample is out of the doors: the previous one ends the segment and starts the next
+            kept.append(i - 1)
+            t0, v0 = timestamps[i - 1], values[i - 1]
+            lower, upper = float("-inf"), float("inf")
+            continue
+        lower = max(lower, (v - v0 - deviation) / dt)
+        upper = min(upper, (v - v0 + deviation) / dt)
+        i += 1
+    if kept[-1] != len(values) - 1:
+        kept.append(len(values) - 1)
+    return kept
+
+
+def compress(
+    timestamps: Sequence[int],
+    values: Sequence[Union[int, float]],
+    deviation: float
+) -> Tuple[Sequence[int], Sequence[Union[int, float]]]:
+    """Return the timestamps and values kept by `swinging_door`, as NumPy arrays if they were given so."""
+
+    kept = swinging_door(timestamps, values, deviation)
+    return take(timestamps, kept), take(values, kept)
+
+
+def backfill(
+    collection: Collection,
+    series: Iterable[Tuple[str, Sequence[int], Sequence[Union[int, float]]]],
+    deviation: float = 0.0,
+    max_batch: int = 10_000
+) -> Dict:
+    """Compress each (name, timestamps, values) series with `swinging_door` and write the samples kept with
+    `ts_variables_set_columns`, in requests of up to `max_batch` values. Returns the merged not_found and
+    invalid_type names, with the number of samples given ("points"), sent ("sent") and their ratio ("ratio").
+    """
+    names, timestamps, values = [], [], []
+    points = 0
+    for name, ts, vals in series:
+        ts, vals = as_list(ts), as_list(vals)
+        kept = swinging_door(ts, vals, deviation)
+        points += len(ts)
+        names.extend([name] * len(kept))
+        timestamps.extend(take(ts, kept))
+        values.extend(take(vals, kept))
+
+    result = {"not_found": [], "invalid_type": []}
+    for start in range(0, len(names), max_batch):
+        end = start + max_batch
+        response = collection.ts_variables_set_columns(names[start:end], values[start:end], timestamps[start:end])
+        for key in result:
+            result[key].extend(n for n in response[key] if n not in result[key])
+
+    result["points"] = points
+    result["sent"] = len(names)
+    result["ratio"] = points / len(names) if names else 1.0
+    return result
@@ -0,0 +1,177 @@
+from __future__ import annotations
+import time
+from collections import OrderedDict
+from itertools import count
+from threading import Condition, Thread
+from typing import Callable, Optional, Tuple, Union
+
+
+class _Lane:
+
+    def __init__(
+        self
+    ):
+        self.items: OrderedDict = OrderedDict()
+        self.cond = Condition()
+        # Counters of the lane, only changed holding `cond`
+        self.dispatched = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.errors = 0
+
+
+class CallbackDispatcher:
+
+    policies = ("block", "drop_oldest", "drop_newest", "coalesce")
+
+    def __init__(
+        self,
+        workers: int = 1,
+        max_queue: int = 10_000,
+        policy: str = "block",
+        ordered: bool = False
+    ):
+        """Runs subscription callbacks on a pool of `workers` threads, so slow callbacks don't stall the stream.
+
+        Values wait in a queue of up to `max_queue` items. When it is full, "block" makes the stream reader wait,
+        "drop_oldest" discards the oldest queued value and "drop_newest" the incoming one. "coalesce" keeps only the
+        latest queued value of each variable and callback, dropping the oldest value if the queue is still full.
+
+        With `ordered`, the values of a variable are always run by the same worker, in the order they arrived
+        (each worker gets its own queue of `max_queue` items).
+        """
+        if policy not in self.policies:
+            raise ValueError(f"Unknown dispatch policy: {policy}")
+
+        self.workers = max(1, workers)
+        self.max_queue = max_queue
+        self.policy = policy
+        self.ordered = ordered
+
+        self.last_error: Optional[Exception] = None
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+
+        self._seq = count()
+        self._closed = False
+        self._lanes = [_Lane() for _ in range(self.workers if ordered else 1)]
+        self._threads = [
+            Thread(target=self._run, args=(self._lanes[i % len(self._lanes)],), name=f"arikedb-dispatch-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for t in self._threads:
+            t.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def queue_depth(
+        self
+    ) -> int:
+        return sum(len(lane.items) for lane in self._lanes)
+
+    @property
+    def dispatched(
+        self
+    ) -> int:
+        return sum(lane.dispatched for lane in self._lanes)
+
+    @property
+    def dropped(
+        self
+    ) -> int:
+        return sum(lane.dropped for lane in self._lanes)
+
+    @property
+    def coalesced(
+        self
+    ) -> int:
+        return sum(lane.coalesced for lane in self._lanes)
+
+    @property
+    def errors(
+        self
+    ) -> int:
+        return sum(lane.errors for lane in self._lanes)
+
+    def submit(
+        self,
+        callback: Callable,
+        value: Tuple[str, int, Union[int, float, str, bool]],
+        callback_args: tuple = (),
+        callback_kwargs: Optional[dict] = None
+    ) -> bool:
+        """Queue a callback run. Returns False if the value was dropped."""
+
+        lane = self._lanes[hash(value[0]) % len(self._lanes)]
+        item = (callback, value, callback_args, callback_kwargs or {}, time.monotonic())
+        key = (id(callback), value[0]) if self.policy == "coalesce" else next(self._seq)
+
+        with lane.cond:
+            if self._closed:
+                raise RuntimeError("Dispatcher is closed")
+            if key in lane.items:
+                lane.items[key] = item
+                lane.coalesced += 1
+                return True
+            if len(lane.items) >= self.max_queue:
+                if self.policy == "drop_newest":
+                    lane.dropped += 1
+                    return False
+                elif self.policy == "block":
+                    lane.cond.wait_for(lambda: len(lane.items) < self.max_queue or self._closed)
+                    if self._closed:
+                        # The workers may already be gone
+                        lane.dropped += 1
+                        return False
+                else:
+                    lane.items.popitem(last=False)
+                    lane.dropped += 1
+            lane.items[key] = item
+            lane.cond.notify_all()
+        return True
+
+    def close(
+        self,
+        timeout: Optional[float] = None
+    ):
+        """Stop accepting values and wait until the queued ones are run. Submits blocked on a full queue return
+        False.
+        """
+        for lane in self._lanes:
+            with lane.cond:
+                self._closed = True
+                lane.cond.notify_all()
+        for t in self._threads:
+            t.join(timeout)
+
+    def _run(
+        self,
+        lane: _Lane
+    ):
+        while True:
+            with lane.cond:
+                lane.cond.wait_for(lambda: lane.items or self._closed)
+                if not lane.items:
+                    return
+                _, item = lane.items.popitem(last=False)
+                lane.cond.notify_all()
+
+            callback, value, callback_args, callback_kwargs, queued_at = item
+            lag = time.monotonic() - queued_at
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            failed = False
+            try:
+                callback(value, *callback_args, **callback_kwargs)
+            except Exception as e:
+                failed = True
+                self.last_error = e
+            with lane.cond:
+                lane.dispatched += 1
+                if failed:
+                    lane.errors += 1
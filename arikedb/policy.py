@@ -0,0 +1,150 @@
+from __future__ import annotations
+import random
+import time
+from threading import Lock
+from typing import Dict, Iterable, Optional
+
+import grpc
+
+from .replicas import READ_METHODS, LatencyWindow, read_only
+
+# Requests which can be sent again without changing their effect, besides the read-only ones
+IDEMPOTENT_METHODS = frozenset(("Authenticate",))
+
+
+class CallStats:
+
+    def __init__(
+        self
+    ):
+        """Attempts, retries and re-authentications of the requests of a method, with the latencies of their
+        last attempts.
+        """
+        self.attempts = 0
+        self.retries = 0
+        self.reauthentications = 0
+        self.latencies = LatencyWindow()
+
+
+class CallPolicy:
+
+    def __init__(
+        self,
+        timeout: Optional[float] = None,
+        timeouts: Optional[Dict[str, float]] = None,
+        max_retries: int = 3,
+        backoff: float = 0.05,
+        max_backoff: float = 2.0,
+        retry_codes: Iterable[grpc.StatusCode] = (grpc.StatusCode.UNAVAILABLE,),
+        idempotent_methods: Iterable[str] = IDEMPOTENT_METHODS,
+        reauthenticate: bool = True
+    ):
+        """How the client sends each request.
+
+        Every request gets a deadline of `timeout` seconds, or of `timeouts[method]` for the RPC methods given
+        (e.g. {"GetVariables": 0.5}), None for no deadline. The deadline covers all the attempts of the request.
+        Attempts failing with one of `retry_codes` are retried up to `max_retries` times, after a random delay up
+        to `backoff` seconds doubled on each retry (capped to `max_backoff`), but only for read-only requests and
+        `idempotent_methods`, and only if the retry can start before the deadline. With `reauthenticate`, a response
+        with the SessionExpired status makes the client authenticate again and send the request once more.
+
+        `calls` keeps the `CallStats` of each method.
+        """
+        self.timeout = timeout
+        self.timeouts = dict(timeouts or {})
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.retry_codes = frozenset(retry_codes)
+        self.idempotent_methods = frozenset(idempotent_methods) | READ_METHODS
+        self.reauthenticate = reauthenticate
+        self.calls: Dict[str, CallStats] = {}
+        self._lock = Lock()
+
+    def timeout_for(
+        self,
+        method: str
+    ) -> Optional[float]:
+        return self.timeouts.get(method, self.timeout)
+
+    def deadline_for(
+        self,
+        method: str
+    ) -> Optional[float]:
+        """Monotonic time by which a request of `method` sent now must be answered, None for no deadline."""
+
+        timeout = self.timeout_for(method)
+        return None if timeout is None else time.monotonic() + timeout
+
+    @staticmethod
+    def remaining(
+        deadline: Optional[float]
+    ) -> Optional[float]:
+        """Timeout of an attempt started now, for a request with `deadline`."""
+
+        return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+    def should_retry(
+        self,
+        method: str,
+        request,
+        error: Exception,
+        retries: int,
+        delay: float = 0.0,
+        deadline: Optional[float] = None
+    ) -> bool:
+        """Whether the request failing with `error` after `retries` retries can be sent again after `delay`
+        seconds, before its `deadline`.
+        """
+        return (
+            retries < self.max_retries
+            and (deadline is None or time.monotonic() + delay < deadline)
+            and isinstance(error, grpc.RpcError)
+            and error.code() in self.retry_codes
+            and (method in self.idempotent_methods or read_only(method, request))
+        )
+
+    def backoff_for(
+        self,
+        retries: int
+    ) -> float:
+        """Seconds to wait before the retry following `retries` retries ("full jitter" exponential backoff)."""
+
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** retries))
+
+    def stats(
+        self,
+        method: str
+    ) -> CallStats:
+
+        stats = self.calls.get(method)
+        if stats is None:
+            with self._lock:
+                stats = self.calls.setdefault(method, CallStats())
+        return stats
+
+    def record_attempt(
+        self,
+        method: str,
+        seconds: float
+    ):
+        stats = self.stats(method)
+        with self._lock:
+            stats.attempts += 1
+        stats.latencies.add(seconds)
+
+    def record_retry(
+        self,
+        method: str
+    ):
+        stats = self.stats(method)
+        with self._lock:
+            stats.retries += 1
+
+    def record_reauthentication(
+        self,
+        method: str
+    ):
+        stats = self.stats(method)
+        with self._lock:
+            stats.reauthentications += 1
@@ -0,0 +1,80 @@
+from __future__ import annotations
+from itertools import count
+from threading import Lock
+from typing import Dict, List, Tuple
+
+import grpc
+
+from .arike_main_pb2_grpc import ArikedbRPCStub
+
+
+class ChannelPool:
+
+    strategies = ("round_robin", "least_outstanding")
+
+    def __init__(
+        self,
+        channels: List[grpc.Channel],
+        strategy: str = "round_robin"
+    ):
+        """Pool of channels with one stub each. `acquire` picks the stub for the next call,
+        either in turn ("round_robin") or the one with fewer calls in flight ("least_outstanding").
+        """
+        if strategy not in self.strategies:
+            raise ValueError(f"Unknown pool strategy: {strategy}")
+        if not channels:
+            raise ValueError("A channel pool needs at least one channel")
+
+        self.channels = channels
+        self.stubs = [ArikedbRPCStub(channel) for channel in channels]
+        self.strategy = strategy
+        self.outstanding = [0] * len(channels)
+        self._raw_methods: Dict[Tuple[int, str], grpc.UnaryUnaryMultiCallable] = {}
+        self._counter = count()
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self.channels)
+
+    def acquire(
+        self
+    ) -> int:
+
+        with self._lock:
+            if self.strategy == "least_outstanding":
+                index = min(range(len(self.outstanding)), key=self.outstanding.__getitem__)
+            else:
+                index = next(self._counter) % len(self.channels)
+            self.outstanding[index] += 1
+        return index
+
+    def raw_method(
+        self,
+        index: int,
+        method: str,
+        response_class
+    ) -> grpc.UnaryUnaryMultiCallable:
+        """Unary method of the channel at `index` sending already serialized requests."""
+
+        callable_ = self._raw_methods.get((index, method))
+        if callable_ is None:
+            callable_ = self.channels[index].unary_unary(
+                f"/arike_pb.ArikedbRPC/{method}",
+                request_serializer=None,
+                response_deserializer=response_class.FromString
+            )
+            self._raw_methods[(index, method)] = callable_
+        return callable_
+
+    def release(
+        self,
+        index: int
+    ):
+        with self._lock:
+            self.outstanding[index] -= 1
+
+    def close(
+        self
+    ):
+        for channel in self.channels:
+            channel.close()
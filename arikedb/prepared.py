@@ -0,0 +1,108 @@
+from __future__ import annotations
+from threading import Lock
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from .codec import np, DTYPE_KINDS, as_list, value_field, ts_values_result, ts_columns_result, set_result
+from .arike_ts_variable_pb2 import GetVariablesRequest, GetVariablesResponse, SetVariablesRequest
+
+if TYPE_CHECKING:
+    from .arikedb import Collection
+
+
+class PreparedGet:
+
+    def __init__(
+        self,
+        collection: Collection,
+        names: Iterable[str]
+    ):
+        """GetVariables request for a fixed set of names, serialized once and sent as is by every `execute`.
+        Reads don't go through the value cache of the collection.
+        """
+        self.collection = collection
+        self.names = list(names)
+        self._payload = GetVariablesRequest(collection=collection.name, names=self.names).SerializeToString()
+
+    def execute(
+        self,
+        columnar: bool = False
+    ) -> Union[List[Tuple[str, int, Union[int, float, str, bool]]], Tuple[List[str], Sequence, Sequence]]:
+
+        response = self.collection.client._exec_raw("GetVariables", GetVariablesResponse, self._payload)
+        return ts_columns_result(response) if columnar else ts_values_result(response)
+
+
+class PreparedSet:
+
+    def __init__(
+        self,
+        collection: Collection,
+        names: Iterable[str]
+    ):
+        """SetVariables request for a fixed set of names. The request is built once and each `execute` only
+        replaces its values (and timestamps), given in the order of `names`.
+        """
+        self.collection = collection
+        self.names = list(names)
+        self._request = SetVariablesRequest(collection=collection.name)
+        for name in self.names:
+            self._request.values.add(name=name)
+        # Value field set on each entry. The value fields aren't a oneof, so the previous one must be cleared
+        self._fields: List[Optional[str]] = [None] * len(self.names)
+        self._stamped = False
+        self._lock = Lock()
+
+    def execute(
+        self,
+        values: Sequence[Union[int, float, str, bool]],
+        timestamps: Optional[Sequence[int]] = None,
+        timestamp_ns: Optional[int] = None
+    ) -> Dict[str, List[str]]:
+
+        field = None
+        if np is not None and isinstance(values, np.ndarray):
+            field = DTYPE_KINDS.get(values.dtype.kind)
+        values = as_list(values)
+        if len(values) != len(self.names):
+            raise ValueError("values must have one value per prepared name")
+        if timestamps is not None:
+            timestamps = as_list(timestamps)
+            if len(timestamps) != len(self.names):
+                raise ValueError("timestamps must have one timestamp per prepared name")
+
+        with self._lock:
+            var_values = self._request.values
+            fields = self._fields
+            if field is not None:
+                if any(f != field for f in fields):
+                    for i, var_value in enumerate(var_values):
+                        if fields[i] is not None and fields[i] != field:
+                            var_value.ClearField(fields[i])
+                        fields[i] = field
+                for var_value, value in zip(var_values, values):
+                    setattr(var_value, field, value)
+            else:
+                for i, (var_value, value) in enumerate(zip(var_values, values)):
+                    var_field, value = value_field(value)
+                    if fields[i] != var_field:
+                        if fields[i] is not None:
+                            var_value.ClearField(fields[i])
+                        fields[i] = var_field
+                    setattr(var_value, var_field, value)
+
+            if timestamps is not None:
+                for var_value, timestamp in zip(var_values, timestamps):
+                    var_value.timestamp = timestamp
+                self._stamped = True
+            elif self._stamped:
+                for var_value in var_values:
+                    var_value.ClearField("timestamp")
+                self._stamped = False
+
+            if timestamp_ns:
+                self._request.timestamp = timestamp_ns
+            else:
+                self._request.ClearField("timestamp")
+
+            response = self.collection.client._exec("SetVariables", self._request)
+        return set_result(response)
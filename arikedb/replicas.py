@@ -0,0 +1,313 @@
+from __future__ import annotations
+import heapq
+import time
+from collections import deque
+from concurrent.futures import Future
+from itertools import count
+from threading import Condition, Lock, Thread
+from typing import TYPE_CHECKING, Callable, List, Optional
+
+import grpc
+
+if TYPE_CHECKING:
+    from .arikedb import Arikedb
+    from .pool import ChannelPool
+
+# Requests which never modify the database
+READ_METHODS = frozenset((
+    "ListCollections",
+    "ListVariables",
+    "GetVariables",
+    "ListStacks",
+    "ListFifos",
+    "ListSortedLists",
+))
+
+# Requests reading without modifying when none of their names_counts has remove set
+PEEK_METHODS = frozenset((
+    "BiggestSortedLists",
+    "SmallestSortedLists",
+))
+
+
+def read_only(
+    method: str,
+    request
+) -> bool:
+    """Whether `request` (a message or its serialized bytes) only reads from the database."""
+
+    if method in READ_METHODS:
+        return True
+    if method in PEEK_METHODS and not isinstance(request, bytes):
+        return not any(names_count.remove for names_count in request.names_counts)
+    return False
+
+
+class LatencyWindow:
+
+    def __init__(
+        self,
+        size: int = 1000,
+        min_samples: int = 20
+    ):
+        """Latencies of the last `size` calls. Percentiles are None until `min_samples` are recorded."""
+
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=size)
+        self._p95: Optional[float] = None
+        self._added = 0
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._samples)
+
+    def add(
+        self,
+        seconds: float
+    ):
+        with self._lock:
+            self._samples.append(seconds)
+            self._added += 1
+            # Sorting the window on every call would cost more than the calls themselves
+            if self._p95 is None or self._added % 32 == 0:
+                self._p95 = self._percentile(0.95)
+
+    def percentile(
+        self,
+        q: float
+    ) -> Optional[float]:
+        with self._lock:
+            return self._percentile(q)
+
+    @property
+    def p95(
+        self
+    ) -> Optional[float]:
+        return self._p95 if len(self._samples) >= self.min_samples else None
+
+    def _percentile(
+        self,
+        q: float
+    ) -> Optional[float]:
+
+        if len(self._samples) < self.min_samples:
+            return None
+        samples = sorted(self._samples)
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+class HedgeTimers:
+
+    def __init__(
+        self
+    ):
+        """Runs the callbacks scheduled by `schedule` from a single thread, started on first use."""
+
+        self._heap: List[list] = []
+        self._ids = count()
+        self._cond = Condition()
+        self._closed = False
+        self._thread: Optional[Thread] = None
+
+    def schedule(
+        self,
+        delay: float,
+        callback: Callable[[], None]
+    ) -> list:
+        """Call `callback` in `delay` seconds. Returns the entry to pass to `cancel`."""
+
+        entry = [time.monotonic() + delay, next(self._ids), callback]
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Read replicas are disconnected")
+            if self._thread is None:
+                self._thread = Thread(target=self._run, name="arikedb-hedges", daemon=True)
+                self._thread.start()
+            heapq.heappush(self._heap, entry)
+            if self._heap[0] is entry:
+                self._cond.notify()
+        return entry
+
+    @staticmethod
+    def cancel(
+        entry: list
+    ):
+        # Cancelled entries are dropped when they reach the top of the heap
+        entry[2] = None
+
+    def close(
+        self
+    ):
+        with self._cond:
+            self._closed = True
+            self._heap.clear()
+            self._cond.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join()
+
+    def _run(
+        self
+    ):
+        while True:
+            with self._cond:
+                while True:
+                    if self._closed:
+                        return
+                    while self._heap and self._heap[0][2] is None:
+                        heapq.heappop(self._heap)
+                    now = time.monotonic()
+                    if self._heap and self._heap[0][0] <= now:
+                        callback = heapq.heappop(self._heap)[2]
+                        break
+                    self._cond.wait(self._heap[0][0] - now if self._heap else None)
+            try:
+                callback()
+            except Exception:
+                pass
+
+
+class ReadReplicas:
+
+    def __init__(
+        self,
+        replicas: List[Arikedb],
+        strategy: str = "round_robin",
+        hedge: bool = False,
+        hedge_delay: Optional[float] = None
+    ):
+        """Spreads read-only requests over the clients of the replicas, either in turn ("round_robin") or picking
+        the replica with fewer requests in flight ("least_outstanding").
+
+        With `hedge` and more than one replica, a read not answered within `hedge_delay` seconds (by default the
+        p95 latency observed for reads) is sent to a second replica too. The first response wins and the other
+        call is cancelled. `reads`, `hedged` and `hedge_wins` count the reads, those hedged and those won by the
+        second replica.
+        """
+        if not replicas:
+            raise ValueError("Read replicas need at least one replica")
+
+        self.replicas = replicas
+        self.strategy = strategy
+        self.hedge = hedge and len(replicas) > 1
+        self.hedge_delay = hedge_delay
+        self.latencies = LatencyWindow()
+
+        self.reads = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+
+        self._counter = count()
+        self._timers = HedgeTimers()
+
+    def connect(
+        self
+    ):
+        for replica in self.replicas:
+            replica.connect()
+
+    def disconnect(
+        self
+    ):
+        self._timers.close()
+        for replica in self.replicas:
+            replica.disconnect()
+
+    def invoke(
+        self,
+        method: str,
+        get_method: Callable[[ChannelPool, int], grpc.UnaryUnaryMultiCallable],
+        request,
+        add_meta: bool = True
+    ):
+        if self.hedge:
+            return self.future(method, get_method, request, add_meta).result()
+
+        self.reads += 1
+        return self._pick()._invoke(method, get_method, request, add_meta)
+
+    def future(
+        self,
+        method: str,
+        get_method: Callable[[ChannelPool, int], grpc.UnaryUnaryMultiCallable],
+        request,
+        add_meta: bool = True
+    ) -> Future:
+        """Start a read on a replica (hedged on a second one if enabled). Cancelling the returned future cancels
+        the calls in flight.
+        """
+        self.reads += 1
+        first = self._pick()
+        if not self.hedge:
+            return first._invoke_future(method, get_method, request, add_meta)
+
+        result = Future()
+        attempts = []
+        lock = Lock()
+
+        def _done(call):
+            if call.cancelled():
+                return
+            error = call.exception()
+            with lock:
+                if result.done():
+                    return
+                if error is not None and any(not attempt.done() for attempt in attempts):
+                    # The other replica may still answer
+                    return
+                if hedge is not None:
+                    self._timers.cancel(hedge)
+                losers = [attempt for attempt in attempts if attempt is not call]
+                if error is None:
+                    if call is not attempts[0]:
+                        self.hedge_wins += 1
+                    result.set_result(call.result())
+                else:
+                    result.set_exception(error)
+            if error is None:
+                # Measured from the start of the read, the hedge only shortens it
+                self.latencies.add(time.monotonic() - started)
+            for loser in losers:
+                loser.cancel()
+
+        def _start(replica: Arikedb) -> bool:
+            with lock:
+                if result.done():
+                    return False
+                call = replica._invoke_future(method, get_method, request, add_meta)
+                attempts.append(call)
+            call.add_done_callback(_done)
+            return True
+
+        def _hedge():
+            if _start(self._pick(exclude=first)):
+                self.hedged += 1
+
+        def _cancel(f: Future):
+            if hedge is not None:
+                self._timers.cancel(hedge)
+            if f.cancelled():
+                for attempt in list(attempts):
+                    attempt.cancel()
+
+        delay = self.hedge_delay if self.hedge_delay is not None else self.latencies.p95
+        hedge = None
+        result.add_done_callback(_cancel)
+        started = time.monotonic()
+        _start(first)
+        if delay is not None and not result.done():
+            hedge = self._timers.schedule(delay, _hedge)
+        return result
+
+    def _pick(
+        self,
+        exclude: Optional[Arikedb] = None
+    ) -> Arikedb:
+
+        if self.strategy == "least_outstanding":
+            candidates = [replica for replica in self.replicas if replica is not exclude]
+            return min(candidates, key=lambda replica: sum(replica._pool.outstanding))
+        if exclude is not None:
+            # Hedges go to the replica after the first one, leaving the turn of the next reads untouched
+            return self.replicas[(self.replicas.index(exclude) + 1) % len(self.replicas)]
+        return self.replicas[next(self._counter) % len(self.replicas)]
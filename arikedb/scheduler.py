@@ -0,0 +1,175 @@
+from __future__ import annotations
+import math
+import time
+from itertools import count
+from threading import Condition, Thread
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from .arikedb import Collection
+
+
+class _Job:
+
+    def __init__(
+        self,
+        collection: Collection,
+        names: List[str],
+        period: float,
+        callback: Callable,
+        callback_args: tuple,
+        callback_kwargs: dict,
+        due: float
+    ):
+        self.collection = collection
+        self.names = names
+        self.period = period
+        self.callback = callback
+        self.callback_args = callback_args
+        self.callback_kwargs = callback_kwargs
+        self.due = due
+
+
+class SamplingScheduler:
+
+    def __init__(
+        self,
+        align: bool = True
+    ):
+        """Runs periodic reads of time series variables from a single thread. Each job reads `names` of a
+        collection every `period` seconds and calls `callback(values, *callback_args, **callback_kwargs)` with
+        the (name, timestamp, value) tuples read.
+
+        With `align`, periods start at multiples of the period in wall clock time, so jobs with multiple periods
+        fire together. Jobs firing together are merged into a single `ts_variables_get` per collection. Jobs are
+        scheduled on absolute times, so callback and read durations don't make them drift; when a cycle runs
+        late past a job's next period, the periods skipped are counted in `missed`.
+        """
+        self.align = align
+
+        self.cycles = 0
+        self.reads = 0
+        self.missed = 0
+        self.errors = 0
+        self.last_error: Optional[Exception] = None
+        self.last_lateness = 0.0
+        self.max_lateness = 0.0
+
+        self._jobs: Dict[int, _Job] = {}
+        self._ids = count()
+        self._closed = False
+        self._cond = Condition()
+        self._thread = Thread(target=self._run, name="arikedb-scheduler", daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def add(
+        self,
+        collection: Collection,
+        names: Iterable[str],
+        period: float,
+        callback: Callable,
+        callback_args: tuple = (),
+        callback_kwargs: Optional[dict] = None
+    ) -> int:
+        """Register a job and return its id."""
+
+        if period <= 0:
+            raise ValueError("The period must be positive")
+
+        job = _Job(collection, list(names), period, callback, callback_args, callback_kwargs or {},
+                   self._first_due(period))
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Scheduler is closed")
+            job_id = next(self._ids)
+            self._jobs[job_id] = job
+            self._cond.notify_all()
+        return job_id
+
+    def remove(
+        self,
+        job_id: int
+    ):
+        with self._cond:
+            self._jobs.pop(job_id, None)
+            self._cond.notify_all()
+
+    def close(
+        self,
+        timeout: Optional[float] = None
+    ):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+    def _first_due(
+        self,
+        period: float
+    ) -> float:
+
+        now = time.monotonic()
+        if not self.align:
+            return now + period
+        wall = time.time()
+        return now + (math.floor(wall / period) + 1) * period - wall
+
+    def _run(
+        self
+    ):
+        while True:
+            with self._cond:
+                while True:
+                    if self._closed:
+                        return
+                    now = time.monotonic()
+                    due = [job for job in self._jobs.values() if job.due <= now]
+                    if due:
+                        break
+                    next_due = min((job.due for job in self._jobs.values()), default=None)
+                    self._cond.wait(None if next_due is None else next_due - now)
+
+                for job in due:
+                    lateness = now - job.due
+                    skipped = int(lateness // job.period)
+                    job.due += (skipped + 1) * job.period
+                    self.missed += skipped
+                    self.last_lateness = lateness
+                    self.max_lateness = max(self.max_lateness, lateness)
+
+            self._sample(due)
+
+    def _sample(
+        self,
+        jobs: List[_Job]
+    ):
+        groups: Dict[Tuple[int, str], List[_Job]] = {}
+        for job in jobs:
+            groups.setdefault((id(job.collection.client), job.collection.name), []).append(job)
+
+        for group in groups.values():
+            names = list(dict.fromkeys(name for job in group for name in job.names))
+            try:
+                values = group[0].collection.ts_variables_get(names)
+            except Exception as e:
+                self.errors += 1
+                self.last_error = e
+                continue
+            self.reads += 1
+
+            by_name = {v[0]: v for v in values}
+            for job in group:
+                try:
+                    job.callback([by_name[name] for name in job.names if name in by_name],
+                                 *job.callback_args, **job.callback_kwargs)
+                except Exception as e:
+                    self.errors += 1
+                    self.last_error = e
+
+        self.cycles += 1
@@ -0,0 +1,1083 @@
+from __future__ import annotations
+import hashlib
+from bisect import bisect, insort
+from collections import deque
+from concurrent.futures import CancelledError, Future, InvalidStateError, ThreadPoolExecutor
+from itertools import count
+from threading import Lock
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from .arikedb import Arikedb, Collection, TsVariable, Stack, Fifo, SortedList
+from .common import ValueType, VarEvent
+from .cache import ValueCache
+from .codec import Buffer, as_list, merge_results, take, ts_values_columns
+from .common import Event
+from .dispatch import CallbackDispatcher
+from .policy import CallPolicy
+from .prepared import PreparedGet, PreparedSet
+from .subscriptions import Subscription, SubscriptionManager, SubscriptionThread
+from .writers import BufferedWriter, DeadbandWriter, SetCoalescer
+
+
+class HashRing:
+
+    def __init__(
+        self,
+        nodes: Iterable[str] = (),
+        vnodes: int = 100
+    ):
+        """Consistent hash ring. Each node is placed at `vnodes` points of the ring and a key belongs to the
+        node of the first point after its hash, so adding or removing a node only moves the keys of its points.
+        """
+        self.vnodes = vnodes
+        self._points: List[Tuple[int, str]] = []
+        self._nodes: List[str] = []
+        for node in nodes:
+            self.add(node)
+
+    def __len__(self):
+        return len(self._nodes)
+
+    @property
+    def nodes(
+        self
+    ) -> List[str]:
+        return list(self._nodes)
+
+    @staticmethod
+    def _hash(
+        key: str
+    ) -> int:
+        return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+    def add(
+        self,
+        node: str
+    ):
+        if node in self._nodes:
+            return
+        self._nodes.append(node)
+        for i in range(self.vnodes):
+            insort(self._points, (self._hash(f"{node}#{i}"), node))
+
+    def remove(
+        self,
+        node: str
+    ):
+        if node not in self._nodes:
+            return
+        self._nodes.remove(node)
+        self._points = [point for point in self._points if point[1] != node]
+
+    def node_for(
+        self,
+        key: str
+    ) -> str:
+
+        if not self._points:
+            raise ValueError("The hash ring has no nodes")
+        index = bisect(self._points, (self._hash(key), "")) % len(self._points)
+        return self._points[index][1]
+
+
+class ShardedArikedb:
+
+    shard_modes = ("collection", "variable")
+
+    def __init__(
+        self,
+        nodes: Iterable[Union[str, Tuple[str, int]]],
+        vnodes: int = 100,
+        shard_by: str = "collection",
+        max_workers: Optional[int] = None,
+        **client_kwargs
+    ):
+        """Client of several ArikeDB nodes ("host:port" or (host, port)), placed on a consistent hash ring.
+
+        With `shard_by="collection"` each collection lives on a single node. With `shard_by="variable"` the
+        collections exist on every node and each variable, stack, fifo or sorted list lives on the node of its
+        "collection/name" key. Batch operations are split per node and the pieces run in parallel.
+
+        Adding or removing nodes moves a minimal share of keys to other nodes, but no data is migrated.
+        Other arguments are passed to the `Arikedb` client of each node. The clients share a single `policy`, so
+        its stats cover every node.
+        """
+        if shard_by not in self.shard_modes:
+            raise ValueError(f"Unknown shard mode: {shard_by}")
+
+        self.shard_by = shard_by
+        self._policy = client_kwargs.setdefault("policy", CallPolicy())
+        self._client_kwargs = client_kwargs
+        self._clients: Dict[str, Arikedb] = {}
+        self._ring = HashRing(vnodes=vnodes)
+        self._max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._connected = False
+        for node in nodes:
+            self._add_client(node)
+
+    def __enter__(self):
+        return self.connect()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.disconnect()
+
+    @property
+    def nodes(
+        self
+    ) -> List[str]:
+        return self._ring.nodes
+
+    @property
+    def policy(
+        self
+    ) -> CallPolicy:
+        return self._policy
+
+    def connect(
+        self
+    ) -> ShardedArikedb:
+
+        self._executor = ThreadPoolExecutor(self._max_workers or max(4, 2 * len(self._clients)),
+                                            thread_name_prefix="arikedb-shards")
+        for client in self._clients.values():
+            client.connect()
+        self._connected = True
+        return self
+
+    def disconnect(
+        self
+    ):
+        self._connected = False
+        for client in self._clients.values():
+            client.disconnect()
+        self._executor.shutdown()
+        self._executor = None
+
+    def add_node(
+        self,
+        node: Union[str, Tuple[str, int]]
+    ):
+        """Add a node to the ring (connected if the client is). Keys now owned by it are not migrated."""
+
+        address = self._add_client(node)
+        if self._connected:
+            self._clients[address].connect()
+
+    def remove_node(
+        self,
+        node: Union[str, Tuple[str, int]]
+    ):
+        """Remove a node from the ring and disconnect from it. Its keys move to the remaining nodes."""
+
+        address = node if isinstance(node, str) else f"{node[0]}:{node[1]}"
+        self._ring.remove(address)
+        client = self._clients.pop(address, None)
+        if client is not None and self._connected:
+            client.disconnect()
+
+    def client(
+        self,
+        key: str
+    ) -> Arikedb:
+        """Client of the node owning `key`."""
+
+        return self._clients[self._ring.node_for(key)]
+
+    def collection_handle(
+        self,
+        name: str
+    ) -> ShardedCollection:
+        return ShardedCollection(name, self)
+
+    def collection(
+        self,
+        name: str
+    ) -> Optional[ShardedCollection]:
+
+        if all(client.collection(name) is not None for client in self._owners(name)):
+            return ShardedCollection(name, self)
+        return None
+
+    def collections(
+        self,
+        pattern: Optional[str] = None
+    ) -> List[ShardedCollection]:
+
+        names = self._gather([(c, lambda c=c: [x.name for x in c.collections(pattern)]) for c in self._clients.values()])
+        return [ShardedCollection(name, self) for name in sorted(set(n for part in names for n in part))]
+
+    def multi_get(
+        self,
+        names: Dict[Union[str, ShardedCollection], Iterable[str]],
+        columnar: bool = False,
+        timeout: Optional[float] = None
+    ) -> Dict[str, Dict]:
+        """Read variables of many collections concurrently. See `Arikedb.multi_get`."""
+
+        return Arikedb._fan_out(
+            [(self._collection_of(c), n) for c, n in names.items()],
+            lambda collection, n: collection.ts_variables_get_async(n, columnar),
+            timeout
+        )
+
+    def multi_set(
+        self,
+        values: Dict[Union[str, ShardedCollection], Iterable[Tuple[str, Union[int, float, str, bool], Optional[int]]]],
+        timestamp_ns: Optional[int] = None,
+        timeout: Optional[float] = None
+    ) -> Dict[str, Dict]:
+        """Set variables of many collections concurrently. See `Arikedb.multi_set`."""
+
+        return Arikedb._fan_out(
+            [(self._collection_of(c), v) for c, v in values.items()],
+            lambda collection, v: collection.ts_variables_set_async(v, timestamp_ns),
+            timeout
+        )
+
+    def _collection_of(
+        self,
+        collection: Union[str, ShardedCollection]
+    ) -> ShardedCollection:
+
+        return self.collection_handle(collection) if isinstance(collection, str) else collection
+
+    def verify_collections(
+        self,
+        collections: Iterable[Union[str, ShardedCollection]]
+    ) -> List[str]:
+        """Check with a single listing per node which of the given collections exist. Returns the missing names."""
+
+        existing = {c.name for c in self.collections()}
+        names = [c if isinstance(c, str) else c.name for c in collections]
+        return [name for name in names if name not in existing]
+
+    def prefetch_metadata(
+        self,
+        collections: bool = True
+    ):
+        """Fill the metadata cache of the client of every node. See `Arikedb.prefetch_metadata`."""
+
+        self._gather([(c, lambda c=c: c.prefetch_metadata(collections)) for c in self._clients.values()])
+
+    def create_collections(
+        self,
+        names: Iterable[str]
+    ) -> Dict[str, List[str]]:
+
+        pieces = self._split(names, lambda name: name, collection_keys=True)
+        return merge_results(self._gather([
+            (client, lambda c=client, p=piece: c.create_collections(p)) for client, piece in pieces.items()
+        ]))
+
+    def delete_collections(
+        self,
+        names: Iterable[str]
+    ) -> Dict[str, List[str]]:
+
+        pieces = self._split(names, lambda name: name, collection_keys=True)
+        return merge_results(self._gather([
+            (client, lambda c=client, p=piece: c.delete_collections(p)) for client, piece in pieces.items()
+        ]))
+
+    def _add_client(
+        self,
+        node: Union[str, Tuple[str, int]]
+    ) -> str:
+
+        if isinstance(node, str):
+            host, port = node.rsplit(":", 1)
+        else:
+            host, port = node
+        address = f"{host}:{port}"
+        if address not in self._clients:
+            self._clients[address] = Arikedb(host=host, port=int(port), **self._client_kwargs)
+            self._ring.add(address)
+        return address
+
+    def _owners(
+        self,
+        collection: str
+    ) -> List[Arikedb]:
+        """Clients of the nodes holding (a part of) a collection."""
+
+        if self.shard_by == "collection":
+            return [self.client(collection)]
+        return list(self._clients.values())
+
+    def _split(
+        self,
+        items: Iterable,
+        key_of: Callable[[object], str],
+        collection_keys: bool = False,
+        default_key: str = ""
+    ) -> Dict[Arikedb, list]:
+        """Group items by the client owning their key. Collection keys go to every node in variable mode. No
+        items are an empty piece for the node of `default_key`, so results keep their shape.
+        """
+        pieces: Dict[Arikedb, list] = {}
+        for item in items:
+            if collection_keys and self.shard_by == "variable":
+                for client in self._clients.values():
+                    pieces.setdefault(client, []).append(item)
+            else:
+                pieces.setdefault(self.client(key_of(item)), []).append(item)
+        return pieces or {self.client(default_key): []}
+
+    def _gather(
+        self,
+        calls: List[Tuple[Arikedb, Callable]]
+    ) -> list:
+        """Run the calls in parallel and return their results in order."""
+
+        if len(calls) == 1:
+            return [calls[0][1]()]
+        futures = [self._executor.submit(call) for _, call in calls]
+        return [future.result() for future in futures]
+
+
+def _name(
+    x: Union[str, tuple]
+) -> str:
+    return x if isinstance(x, str) else x[0]
+
+
+def _combine(
+    futures: List[Future],
+    merge: Callable[[list], object]
+) -> Future:
+    """Future of `merge` applied to the results of `futures`, failing with the first of their errors. Cancelling
+    it cancels them.
+    """
+    result = Future()
+    pending = [len(futures)]
+    lock = Lock()
+
+    def _resolve(value=None, error: Optional[BaseException] = None):
+        try:
+            if error is None:
+                result.set_result(value)
+            else:
+                result.set_exception(error)
+        except InvalidStateError:
+            pass
+
+    def _done(future: Future):
+        if future.cancelled():
+            _resolve(error=CancelledError())
+            return
+        if future.exception() is not None:
+            _resolve(error=future.exception())
+            return
+        with lock:
+            pending[0] -= 1
+            last = pending[0] == 0
+        if last:
+            try:
+                _resolve(merge([f.result() for f in futures]))
+            except Exception as e:
+                _resolve(error=e)
+
+    def _cancel(f: Future):
+        if f.cancelled():
+            for future in futures:
+                future.cancel()
+
+    result.add_done_callback(_cancel)
+    for future in futures:
+        future.add_done_callback(_done)
+    return result
+
+
+class ShardedCollection:
+
+    def __init__(
+        self,
+        name: str,
+        client: ShardedArikedb
+    ):
+        """Collection of a `ShardedArikedb`, with the API of `Collection`. Batch calls are split per node and the
+        pieces run in parallel, and their `*_async` variants return a single future of the merged results.
+        Handles (`ts_variable`, `stack`, ...) are collections of the owning node.
+
+        The value cache and set coalescing are enabled on the collection of each node. In variable mode a
+        subscription can only cover names living on a single node (see `node_collection`), while the
+        `subscription_manager` registers interests with the manager of each node.
+        """
+        self.name = name
+        self.client = client
+        self._node_handles: Dict[Arikedb, Collection] = {}
+        self._subscription_manager: Optional[ShardedSubscriptionManager] = None
+
+    def _node(
+        self,
+        client: Arikedb
+    ) -> Collection:
+        """Handle of the collection on the node of `client`, kept so its caches and coalescer are reused."""
+
+        handle = self._node_handles.get(client)
+        if handle is None:
+            handle = self._node_handles.setdefault(client, client.collection_handle(self.name))
+        return handle
+
+    def node_collection(
+        self,
+        name: Optional[str] = None
+    ) -> Collection:
+        """Collection handle on the node owning the variable, stack, fifo or sorted list `name` (the node of the
+        whole collection in collection mode).
+        """
+        return self._node(self.client.client(self._key(name)))
+
+    def _key(
+        self,
+        name: Optional[str]
+    ) -> str:
+        if self.client.shard_by == "collection" or name is None:
+            return self.name
+        return f"{self.name}/{name}"
+
+    def _pieces(
+        self,
+        items: Iterable
+    ) -> Dict[Arikedb, list]:
+        return self.client._split(items, lambda x: self._key(_name(x)), default_key=self.name)
+
+    @staticmethod
+    def _piece_kwargs(
+        piece: list,
+        kwargs: dict
+    ) -> dict:
+        """Keyword arguments for a piece, with only its own buffers in `out`."""
+
+        out = kwargs.get("out")
+        if not out:
+            return kwargs
+        names = set(_name(x) for x in piece)
+        return dict(kwargs, out={name: buffer for name, buffer in out.items() if name in names})
+
+    def _map(
+        self,
+        items: Iterable,
+        method: str,
+        *args,
+        **kwargs
+    ) -> list:
+        """Call `method` of the node collections with the items each of them owns, in parallel."""
+
+        return self.client._gather([
+            (client, lambda c=client, p=piece: getattr(self._node(c), method)(
+                p, *args, **self._piece_kwargs(p, kwargs)))
+            for client, piece in self._pieces(items).items()
+        ])
+
+    def _map_async(
+        self,
+        items: Iterable,
+        method: str,
+        merge: Callable[[list], object],
+        *args,
+        **kwargs
+    ) -> Future:
+        """Start the `*_async` variant of `method` on the node collections, and return a future of the results
+        merged with `merge`.
+        """
+        return _combine([
+            getattr(self._node(client), method)(piece, *args, **self._piece_kwargs(piece, kwargs))
+            for client, piece in self._pieces(items).items()
+        ], merge)
+
+    def _map_all(
+        self,
+        method: str,
+        *args
+    ) -> list:
+        """Call `method` of the collection on every node holding a part of it, in parallel."""
+
+        return self.client._gather([
+            (client, lambda c=client: getattr(self._node(c), method)(*args))
+            for client in self.client._owners(self.name)
+        ])
+
+    def _column_pieces(
+        self,
+        names: Sequence[str]
+    ) -> Dict[Arikedb, Optional[List[int]]]:
+        """Indices of the entries of columns owned by each node (None for all of them)."""
+
+        if self.client.shard_by == "collection":
+            return {self.client.client(self.name): None}
+        indices: Dict[Arikedb, List[int]] = {}
+        for i, name in enumerate(as_list(names)):
+            indices.setdefault(self.client.client(self._key(name)), []).append(i)
+        return indices or {self.client.client(self.name): []}
+
+    @staticmethod
+    def _ordered(
+        results: list,
+        names: List[str]
+    ) -> list:
+        """Rows of the pieces in the order of `names`, one per name given. A repeated name gets the rows returned
+        for it in turn (or its last row again).
+        """
+        rows: Dict[str, deque] = {}
+        for part in results:
+            for x in part:
+                rows.setdefault(_name(x), deque()).append(x)
+        ordered = []
+        for name in names:
+            queue = rows.get(name)
+            if queue:
+                ordered.append(queue.popleft() if len(queue) > 1 else queue[0])
+        return ordered
+
+    def prefetch_metadata(
+        self
+    ):
+        self._map_all("prefetch_metadata")
+
+    def enable_set_coalescing(
+        self,
+        window: float = 0.005,
+        max_batch: int = 1000
+    ) -> List[SetCoalescer]:
+        """Enable set coalescing on every node holding a part of the collection. See `Collection.enable_set_coalescing`."""
+
+        return [self._node(client).enable_set_coalescing(window, max_batch) for client in self.client._owners(self.name)]
+
+    def disable_set_coalescing(
+        self
+    ):
+        for handle in list(self._node_handles.values()):
+            handle.disable_set_coalescing()
+
+    def enable_value_cache(
+        self,
+        max_size: int = 10_000,
+        event: Event = Event.OnSet
+    ) -> List[ValueCache]:
+        """Enable the value cache on every node holding a part of the collection, each keeping up to `max_size`
+        names. See `Collection.enable_value_cache`.
+        """
+        return [self._node(client).enable_value_cache(max_size, event) for client in self.client._owners(self.name)]
+
+    def disable_value_cache(
+        self
+    ):
+        for handle in list(self._node_handles.values()):
+            handle.disable_value_cache()
+
+    def writer(
+        self,
+        max_queue: int = 100_000,
+        flush_interval: float = 0.1,
+        max_batch: int = 10_000,
+        overflow: str = "block"
+    ) -> BufferedWriter:
+        """Create a write-behind writer whose batches are split per node. See `BufferedWriter`."""
+
+        return BufferedWriter(self, max_queue, flush_interval, max_batch, overflow)
+
+    def deadband_writer(
+        self,
+        absolute: float = 0.0,
+        percent: float = 0.0,
+        max_silence: Optional[float] = None,
+        writer: Optional[BufferedWriter] = None
+    ) -> DeadbandWriter:
+        """Create a report-by-exception writer. See `DeadbandWriter`."""
+
+        return DeadbandWriter(self, absolute, percent, max_silence, writer)
+
+    def ts_variables(
+        self,
+        pattern: Optional[str] = None
+    ) -> List[TsVariable]:
+        return [v for part in self._map_all("ts_variables", pattern) for v in part]
+
+    def ts_variable(
+        self,
+        name: str
+    ) -> Optional[TsVariable]:
+        return self.node_collection(name).ts_variable(name)
+
+    def create_ts_variables(
+        self,
+        variables: Iterable[Tuple[str, ValueType]]
+    ) -> Dict[str, List[str]]:
+        return merge_results(self._map(variables, "create_ts_variables"))
+
+    def delete_ts_variables(
+        self,
+        names: Iterable[str]
+    ) -> Dict[str, List[str]]:
+        return merge_results(self._map(names, "delete_ts_variables"))
+
+    def ts_variables_set(
+        self,
+        values: Iterable[Tuple[str, Union[int, float, str, bool], Optional[int]]],
+        timestamp_ns: Optional[int] = None
+    ) -> Dict[str, List[str]]:
+        return merge_results(self._map(values, "ts_variables_set", timestamp_ns))
+
+    def ts_variables_set_async(
+        self,
+        values: Iterable[Tuple[str, Union[int, float, str, bool], Optional[int]]],
+        timestamp_ns: Optional[int] = None
+    ) -> Future:
+        return self._map_async(values, "ts_variables_set_async", merge_results, timestamp_ns)
+
+    def ts_variables_set_columns(
+        self,
+        names: Sequence[str],
+        values: Sequence[Union[int, float, str, bool]],
+        timestamps: Optional[Sequence[int]] = None,
+        timestamp_ns: Optional[int] = None
+    ) -> Dict[str, List[str]]:
+
+        pieces = self._column_pieces(names)
+        return merge_results(self.client._gather([
+            (client, lambda c=client, i=indices: self._node(c).ts_variables_set_columns(
+                *self._columns(i, names, values, timestamps), timestamp_ns))
+            for client, indices in pieces.items()
+        ]))
+
+    def ts_variables_set_columns_async(
+        self,
+        names: Sequence[str],
+        values: Sequence[Union[int, float, str, bool]],
+        timestamps: Optional[Sequence[int]] = None,
+        timestamp_ns: Optional[int] = None
+    ) -> Future:
+
+        return _combine([
+            self._node(client).ts_variables_set_columns_async(
+                *self._columns(indices, names, values, timestamps), timestamp_ns)
+            for client, indices in self._column_pieces(names).items()
+        ], merge_results)
+
+    @staticmethod
+    def _columns(
+        indices: Optional[List[int]],
+        names: Sequence[str],
+        values: Sequence[Union[int, float, str, bool]],
+        timestamps: Optional[Sequence[int]]
+    ) -> tuple:
+        if indices is None:
+            return names, values, timestamps
+        return take(names, indices), take(values, indices), None if timestamps is None else take(timestamps, indices)
+
+    def ts_variables_backfill(
+        self,
+        series: Iterable[Tuple[str, Sequence[int], Sequence[Union[int, float]]]],
+        deviation: float = 0.0,
+        max_batch: int = 10_000
+    ) -> Dict:
+        """Backfill the series of each node in parallel. See `Collection.ts_variables_backfill`."""
+
+        results = self._map(series, "ts_variables_backfill", deviation, max_batch)
+        merged = merge_results([{key: r[key] for key in ("not_found", "invalid_type")} for r in results])
+        merged["points"] = sum(r["points"] for r in results)
+        merged["sent"] = sum(r["sent"] for r in results)
+        merged["ratio"] = merged["points"] / merged["sent"] if merged["sent"] else 1.0
+        return merged
+
+    def ts_variables_get(
+        self,
+        names: Iterable[str],
+        columnar: bool = False
+    ) -> Union[List[Tuple[str, int, Union[int, float, str, bool]]], Tuple[List[str], Sequence, Sequence]]:
+
+        names = list(names)
+        values = self._ordered(self._map(names, "ts_variables_get"), names)
+        return ts_values_columns(values) if columnar else values
+
+    def ts_variables_get_async(
+        self,
+        names: Iterable[str],
+        columnar: bool = False
+    ) -> Future:
+
+        names = list(names)
+
+        def _merge(results: list):
+            values = self._ordered(results, names)
+            return ts_values_columns(values) if columnar else values
+
+        return self._map_async(names, "ts_variables_get_async", _merge)
+
+    def prepare_get(
+        self,
+        names: Iterable[str]
+    ) -> ShardedPreparedGet:
+        return ShardedPreparedGet(self, names)
+
+    def prepare_set(
+        self,
+        names: Iterable[str]
+    ) -> ShardedPreparedSet:
+        return ShardedPreparedSet(self, names)
+
+    def _subscription_node(
+        self,
+        names: List[str]
+    ) -> Collection:
+
+        nodes = {self.client.client(self._key(name)) for name in names}
+        if len(nodes) > 1:
+            raise ValueError("The names subscribed live on several nodes, subscribe on each node_collection(name)")
+        return self.node_collection(names[0] if names else None)
+
+    def variables_subscribe(
+        self,
+        names: Iterable[str],
+        events: Iterable[VarEvent],
+        callback: Callable,
+        callback_args: Optional[tuple] = None,
+        callback_kwargs: Optional[dict] = None,
+        thread_kwargs: Optional[dict] = None,
+        resilient: bool = False,
+        dispatcher: Optional[CallbackDispatcher] = None,
+    ) -> SubscriptionThread:
+
+        names = list(names)
+        return self._subscription_node(names).variables_subscribe(
+            names, events, callback, callback_args, callback_kwargs, thread_kwargs, resilient, dispatcher)
+
+    def subscribe(
+        self,
+        names: Iterable[str],
+        events: Iterable[VarEvent],
+        resilient: bool = False,
+        **kwargs
+    ) -> Subscription:
+
+        names = list(names)
+        return self._subscription_node(names).subscribe(names, events, resilient, **kwargs)
+
+    @property
+    def subscription_manager(
+        self
+    ) -> ShardedSubscriptionManager:
+        if self._subscription_manager is None:
+            self._subscription_manager = ShardedSubscriptionManager(self)
+        return self._subscription_manager
+
+    def stacks(
+        self,
+        pattern: Optional[str] = None
+    ) -> List[Stack]:
+        return [x for part in self._map_all("stacks", pattern) for x in part]
+
+    def stack(
+        self,
+        name: str
+    ) -> Optional[Stack]:
+        return self.node_collection(name).stack(name)
+
+    def create_stacks(
+        self,
+        stacks: Iterable[Tuple[str, ValueType, Optional[int]]]
+    ) -> Dict[str, List[str]]:
+        return merge_results(self._map(stacks, "create_stacks"))
+
+    def delete_stacks(
+        self,
+        names: Iterable[str]
+    ) -> Dict[str, List[str]]:
+        return merge_results(self._map(names, "delete_stacks"))
+
+    def stacks_put(
+        self,
+        values: Iterable[Tuple[str, Iterable[Union[int, float, str, bool]]]]
+    ) -> Dict:
+        return merge_results(self._map(values, "stacks_put"))
+
+    def stacks_put_async(
+        self,
+        values: Iterable[Tuple[str, Iterable[Union[int, float, str, bool]]]]
+    ) -> Future:
+        return self._map_async(values, "stacks_put_async", merge_results)
+
+    def stacks_pop(
+        self,
+        names: Iterable[Union[str, Tuple[str, int]]],
+        numpy: bool = False,
+        out: Optional[Dict[str, Buffer]] = None
+    ) -> List[Tuple[str, Sequence[Union[int, float, str, bool]]]]:
+
+        names = list(names)
+        return self._ordered(self._map(names, "stacks_pop", numpy, out=out), [_name(x) for x in names])
+
+    def stacks_pop_async(
+        self,
+        names: Iterable[Union[str, Tuple[str, int]]],
+        numpy: bool = False,
+        out: Optional[Dict[str, Buffer]] = None
+    ) -> Future:
+
+        names = list(names)
+        order = [_name(x) for x in names]
+        return self._map_async(names, "stacks_pop_async", lambda results: self._ordered(results, order), numpy, out=out)
+
+    def fifos(
+        self,
+        pattern: Optional[str] = None
+    ) -> List[Fifo]:
+        return [x for part in self._map_all("fifos", pattern) for x in part]
+
+    def fifo(
+        self,
+        name: str
+    ) -> Optional[Fifo]:
+        return self.node_collection(name).fifo(name)
+
+    def create_fifos(
+        self,
+        fifos: Iterable[Tuple[str, ValueType, Optional[int]]]
+    ) -> Dict[str, List[str]]:
+        return merge_results(self._map(fifos, "create_fifos"))
+
+    def delete_fifos(
+        self,
+        names: Iterable[str]
+    ) -> Dict[str, List[str]]:
+        return merge_results(self._map(names, "delete_fifos"))
+
+    def fifos_push(
+        self,
+        values: Iterable[Tuple[str, Iterable[Union[int, float, str, bool]]]]
+    ) -> Dict:
+        return merge_results(self._map(values, "fifos_push"))
+
+    def fifos_push_async(
+        self,
+        values: Iterable[Tuple[str, Iterable[Union[int, float, str, bool]]]]
+    ) -> Future:
+        return self._map_async(values, "fifos_push_async", merge_results)
+
+    def fifos_pull(
+        self,
+        names: Iterable[Union[str, Tuple[str, int]]],
+        numpy: bool = False,
+        out: Optional[Dict[str, Buffer]] = None
+    ) -> List[Tuple[str, Sequence[Union[int, float, str, bool]]]]:
+
+        names = list(names)
+        return self._ordered(self._map(names, "fifos_pull", numpy, out=out), [_name(x) for x in names])
+
+    def fifos_pull_async(
+        self,
+        names: Iterable[Union[str, Tuple[str, int]]],
+        numpy: bool = False,
+        out: Optional[Dict[str, Buffer]] = None
+    ) -> Future:
+
+        names = list(names)
+        order = [_name(x) for x in names]
+        return self._map_async(names, "fifos_pull_async", lambda results: self._ordered(results, order), numpy, out=out)
+
+    def sorted_lists(
+        self,
+        pattern: Optional[str] = None
+    ) -> List[SortedList]:
+        return [x for part in self._map_all("sorted_lists", pattern) for x in part]
+
+    def sorted_list(
+        self,
+        name: str
+    ) -> Optional[SortedList]:
+        return self.node_collection(name).sorted_list(name)
+
+    def create_sorted_lists(
+        self,
+        sorted_lists: Iterable[Tuple[str, ValueType, Optional[int]]]
+    ) -> Dict[str, List[str]]:
+        return merge_results(self._map(sorted_lists, "create_sorted_lists"))
+
+    def delete_sorted_lists(
+        self,
+        names: Iterable[str]
+    ) -> Dict[str, List[str]]:
+        return merge_results(self._map(names, "delete_sorted_lists"))
+
+    def sorted_lists_insert(
+        self,
+        values: Iterable[Tuple[str, Iterable[Union[int, float, str, bool]]]]
+    ) -> Dict:
+        return merge_results(self._map(values, "sorted_lists_insert"))
+
+    def sorted_lists_insert_async(
+        self,
+        values: Iterable[Tuple[str, Iterable[Union[int, float, str, bool]]]]
+    ) -> Future:
+        return self._map_async(values, "sorted_lists_insert_async", merge_results)
+
+    def sorted_lists_biggest(
+        self,
+        names: Iterable[Union[str, Tuple[str, int]]],
+        remove: bool,
+        numpy: bool = False,
+        out: Optional[Dict[str, Buffer]] = None
+    ) -> List[Tuple[str, Sequence[Union[int, float, str, bool]]]]:
+
+        names = list(names)
+        return self._ordered(self._map(names, "sorted_lists_biggest", remove, numpy, out=out), [_name(x) for x in names])
+
+    def sorted_lists_biggest_async(
+        self,
+        names: Iterable[Union[str, Tuple[str, int]]],
+        remove: bool,
+        numpy: bool = False,
+        out: Optional[Dict[str, Buffer]] = None
+    ) -> Future:
+
+        names = list(names)
+        order = [_name(x) for x in names]
+        return self._map_async(names, "sorted_lists_biggest_async", lambda results: self._ordered(results, order),
+                               remove, numpy, out=out)
+
+    def sorted_lists_smallest(
+        self,
+        names: Iterable[Union[str, Tuple[str, int]]],
+        remove: bool,
+        numpy: bool = False,
+        out: Optional[Dict[str, Buffer]] = None
+    ) -> List[Tuple[str, Sequence[Union[int, float, str, bool]]]]:
+
+        names = list(names)
+        return self._ordered(self._map(names, "sorted_lists_smallest", remove, numpy, out=out), [_name(x) for x in names])
+
+    def sorted_lists_smallest_async(
+        self,
+        names: Iterable[Union[str, Tuple[str, int]]],
+        remove: bool,
+        numpy: bool = False,
+        out: Optional[Dict[str, Buffer]] = None
+    ) -> Future:
+
+        names = list(names)
+        order = [_name(x) for x in names]
+        return self._map_async(names, "sorted_lists_smallest_async", lambda results: self._ordered(results, order),
+                               remove, numpy, out=out)
+
+
+class ShardedPreparedGet:
+
+    def __init__(
+        self,
+        collection: ShardedCollection,
+        names: Iterable[str]
+    ):
+        """`PreparedGet` of the names owned by each node, executed in parallel."""
+
+        self.collection = collection
+        self.names = list(names)
+        self._prepared: List[PreparedGet] = [
+            collection._node(client).prepare_get(piece) for client, piece in collection._pieces(self.names).items()
+        ]
+
+    def execute(
+        self,
+        columnar: bool = False
+    ) -> Union[List[Tuple[str, int, Union[int, float, str, bool]]], Tuple[List[str], Sequence, Sequence]]:
+
+        if len(self._prepared) == 1:
+            return self._prepared[0].execute(columnar)
+        results = self.collection.client._gather([(p.collection.client, p.execute) for p in self._prepared])
+        values = ShardedCollection._ordered(results, self.names)
+        return ts_values_columns(values) if columnar else values
+
+
+class ShardedPreparedSet:
+
+    def __init__(
+        self,
+        collection: ShardedCollection,
+        names: Iterable[str]
+    ):
+        """`PreparedSet` of the names owned by each node. `execute` takes the values in the order of `names` and
+        sends the pieces in parallel.
+        """
+        self.collection = collection
+        self.names = list(names)
+        self._prepared: List[Tuple[PreparedSet, Optional[List[int]]]] = [
+            (collection._node(client).prepare_set(self.names if indices is None else take(self.names, indices)), indices)
+            for client, indices in collection._column_pieces(self.names).items()
+        ]
+
+    def execute(
+        self,
+        values: Sequence[Union[int, float, str, bool]],
+        timestamps: Optional[Sequence[int]] = None,
+        timestamp_ns: Optional[int] = None
+    ) -> Dict[str, List[str]]:
+
+        if len(values) != len(self.names):
+            raise ValueError("values must have one value per prepared name")
+        if timestamps is not None and len(timestamps) != len(self.names):
+            raise ValueError("timestamps must have one timestamp per prepared name")
+
+        return merge_results(self.collection.client._gather([
+            (p.collection.client,
+             lambda p=p, i=indices: p.execute(*ShardedCollection._columns(i, self.names, values, timestamps)[1:], timestamp_ns))
+            for p, indices in self._prepared
+        ]))
+
+
+class ShardedSubscriptionManager:
+
+    def __init__(
+        self,
+        collection: ShardedCollection
+    ):
+        """Registers each interest with the `SubscriptionManager` of the nodes owning its names."""
+
+        self.collection = collection
+        self._ids = count()
+        self._interests: Dict[int, List[Tuple[SubscriptionManager, int]]] = {}
+        self._lock = Lock()
+
+    @property
+    def streams(
+        self
+    ) -> int:
+        return sum(h._subscription_manager.streams for h in list(self.collection._node_handles.values())
+                   if h._subscription_manager is not None)
+
+    def add(
+        self,
+        names: Iterable[str],
+        events: Iterable[VarEvent],
+        callback: Callable,
+        callback_args: Optional[tuple] = None,
+        callback_kwargs: Optional[dict] = None,
+        dispatcher: Optional[CallbackDispatcher] = None
+    ) -> int:
+        """Register an interest and return its id, to be used with `remove`. See `SubscriptionManager.add`."""
+
+        events = list(events)
+        parts = []
+        for client, piece in self.collection._pieces(names).items():
+            manager = self.collection._node(client).subscription_manager
+            parts.append((manager, manager.add(piece, events, callback, callback_args, callback_kwargs, dispatcher)))
+        with self._lock:
+            interest_id = next(self._ids)
+            self._interests[interest_id] = parts
+        return interest_id
+
+    def remove(
+        self,
+        interest_id: int
+    ):
+        with self._lock:
+            parts = self._interests.pop(interest_id)
+        for manager, part_id in parts:
+            manager.remove(part_id)
+
+    def close(
+        self
+    ):
+        for handle in list(self.collection._node_handles.values()):
+            if handle._subscription_manager is not None:
+                handle._subscription_manager.close()
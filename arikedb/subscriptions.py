@@ -0,0 +1,543 @@
+from __future__ import annotations
+import random
+import time
+from itertools import count
+from queue import Empty, Queue
+from threading import Condition, Event as ThreadingEvent, Thread
+from typing import TYPE_CHECKING, Callable, Dict, FrozenSet, Iterable, Iterator, List, Optional, Tuple, Union
+
+import grpc
+
+from .common import VarEvent
+from .codec import ts_value
+from .dispatch import CallbackDispatcher
+
+if TYPE_CHECKING:
+    from .arikedb import Collection
+
+
+def stream_error(
+    call
+) -> Optional[grpc.RpcError]:
+    """Wait until a SubscribeVariables stream started and return its error if it failed instead.
+    `initial_metadata` doesn't raise on a failed call, it returns empty metadata.
+    """
+    call.initial_metadata()
+    if call.done() and call.code() != grpc.StatusCode.OK:
+        return call
+    return None
+
+
+def events_key(
+    events: Iterable[VarEvent]
+) -> FrozenSet[tuple]:
+    return frozenset(
+        (e.event.value,
+         e.str_value, e.str_low_limit, e.str_high_limit,
+         e.int_value, e.int_low_limit, e.int_high_limit,
+         e.float_value, e.float_low_limit, e.float_high_limit,
+         e.bool_value, e.bool_low_limit, e.bool_high_limit)
+        for e in events
+    )
+
+
+class _Interest:
+
+    def __init__(
+        self,
+        names: FrozenSet[str],
+        events: List[VarEvent],
+        callback: Callable,
+        callback_args: tuple,
+        callback_kwargs: dict,
+        dispatcher: Optional[CallbackDispatcher]
+    ):
+        self.names = names
+        self.events = events
+        self.callback = callback
+        self.callback_args = callback_args
+        self.callback_kwargs = callback_kwargs
+        self.dispatcher = dispatcher
+
+
+class _Stream:
+
+    def __init__(
+        self,
+        events: List[VarEvent]
+    ):
+        self.events = events
+        self.names: FrozenSet[str] = frozenset()
+        self.call = None
+        self.generation = 0
+        self.old_calls: list = []
+        self.seen: Dict[Tuple[str, int], int] = {}
+        self.index: Dict[str, List[_Interest]] = {}
+
+
+class SubscriptionManager:
+
+    def __init__(
+        self,
+        collection: Collection,
+        reshape_delay: float = 0.05,
+        max_backoff: float = 5.0
+    ):
+        """Shares SubscribeVariables streams among many subscribers of a collection. The interests registered with
+        the same events are merged into a single stream over the union of their names, and each received value is
+        dispatched to the callbacks interested in its name.
+
+        When interests are added or removed the stream is replaced: the new one is opened before the old one is
+        cancelled, and the values received from both during the switch are delivered once. While a stream can't be
+        opened, attempts wait a jittered exponential backoff (`reshape_delay` doubled on each failure up to
+        `max_backoff`).
+        """
+        self.collection = collection
+        self.reshape_delay = reshape_delay
+        self.max_backoff = max_backoff
+        self.reshapes = 0
+        self.errors = 0
+        self.last_error: Optional[grpc.RpcError] = None
+        self._failed_attempts = 0
+        self._ids = count()
+        self._interests: Dict[int, Tuple[FrozenSet[tuple], _Interest]] = {}
+        self._streams: Dict[FrozenSet[tuple], _Stream] = {}
+        self._closed = False
+        self._cond = Condition()
+        self._thread = Thread(target=self._run, name=f"arikedb-subscriptions-{collection.name}", daemon=True)
+        self._thread.start()
+
+    @property
+    def streams(
+        self
+    ) -> int:
+        return sum(1 for s in self._streams.values() if s.call is not None)
+
+    def add(
+        self,
+        names: Iterable[str],
+        events: Iterable[VarEvent],
+        callback: Callable,
+        callback_args: Optional[tuple] = None,
+        callback_kwargs: Optional[dict] = None,
+        dispatcher: Optional[CallbackDispatcher] = None
+    ) -> int:
+        """Register an interest and return its id, to be used with `remove`. With a `dispatcher` the callback
+        runs on its workers instead of the stream reading thread.
+        """
+
+        events = list(events)
+        interest = _Interest(frozenset(names), events, callback, callback_args or (), callback_kwargs or {}, dispatcher)
+        key = events_key(events)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Subscription manager is closed")
+            interest_id = next(self._ids)
+            self._interests[interest_id] = (key, interest)
+            stream = self._streams.setdefault(key, _Stream(events))
+            for name in interest.names:
+                stream.index.setdefault(name, []).append(interest)
+            self._cond.notify_all()
+        return interest_id
+
+    def remove(
+        self,
+        interest_id: int
+    ):
+        with self._cond:
+            key, interest = self._interests.pop(interest_id)
+            stream = self._streams[key]
+            for name in interest.names:
+                callbacks = stream.index[name]
+                callbacks.remove(interest)
+                if not callbacks:
+                    del stream.index[name]
+            if not stream.index and stream.call is None:
+                del self._streams[key]
+            self._cond.notify_all()
+
+    def close(
+        self
+    ):
+        with self._cond:
+            self._closed = True
+            calls = []
+            for stream in self._streams.values():
+                calls.extend(stream.old_calls)
+                if stream.call is not None:
+                    calls.append(stream.call)
+                stream.call = None
+                stream.old_calls = []
+            self._cond.notify_all()
+        for call in calls:
+            call.cancel()
+        self._thread.join()
+
+    def _pending(
+        self
+    ) -> List[FrozenSet[tuple]]:
+        return [key for key, stream in self._streams.items() if frozenset(stream.index) != stream.names]
+
+    def _run(
+        self
+    ):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._closed or self._pending())
+                if self._closed:
+                    return
+
+            # Let close changes accumulate so they are applied with a single reshape
+            if self._failed_attempts:
+                delay = random.uniform(0, min(self.max_backoff, self.reshape_delay * 2 ** self._failed_attempts))
+                with self._cond:
+                    if self._cond.wait_for(lambda: self._closed, delay):
+                        return
+            else:
+                time.sleep(self.reshape_delay)
+
+            with self._cond:
+                reshapes = [(key, self._streams[key], frozenset(self._streams[key].index)) for key in self._pending()]
+
+            for key, stream, names in reshapes:
+                self._reshape(key, stream, names)
+
+    def _reshape(
+        self,
+        key: FrozenSet[tuple],
+        stream: _Stream,
+        names: FrozenSet[str]
+    ):
+        call = None
+        if names:
+            call = self.collection.client._subscribe(self.collection.name, names, stream.events)
+            error = stream_error(call)
+            if error is not None:
+                self.errors += 1
+                self.last_error = error
+                self._failed_attempts += 1
+                return
+            self._failed_attempts = 0
+
+        with self._cond:
+            if self._closed:
+                if call is not None:
+                    call.cancel()
+                return
+            old_call = stream.call
+            stream.call = call
+            stream.names = names
+            stream.generation += 1
+            if old_call is not None:
+                stream.old_calls.append(old_call)
+            if call is None and not stream.index:
+                self._streams.pop(key, None)
+            self.reshapes += 1
+            generation = stream.generation
+
+        if call is not None:
+            Thread(target=self._read, args=(stream, call, generation), daemon=True).start()
+
+        # Both streams stay open for a while, so values the old one had already received are not lost
+        if old_call is not None:
+            time.sleep(self.reshape_delay)
+            old_call.cancel()
+            with self._cond:
+                if old_call in stream.old_calls:
+                    stream.old_calls.remove(old_call)
+                if not stream.old_calls:
+                    stream.seen.clear()
+
+    def _read(
+        self,
+        stream: _Stream,
+        call,
+        generation: int
+    ):
+        try:
+            for response in call:
+                value = ts_value(response)
+                if value is None:
+                    continue
+                with self._cond:
+                    if stream.old_calls or stream.seen:
+                        seen_key = (value[0], value[1])
+                        seen_generation = stream.seen.get(seen_key)
+                        if seen_generation is not None and seen_generation != generation:
+                            continue
+                        stream.seen[seen_key] = generation
+                    interests = list(stream.index.get(value[0], ()))
+                for interest in interests:
+                    if interest.dispatcher is not None:
+                        interest.dispatcher.submit(interest.callback, value, interest.callback_args, interest.callback_kwargs)
+                    else:
+                        interest.callback(value, *interest.callback_args, **interest.callback_kwargs)
+        except grpc.RpcError:
+            pass
+
+        with self._cond:
+            if call is stream.call:
+                # The stream dropped, make the manager open it again
+                self.errors += 1
+                stream.call = None
+                stream.names = frozenset()
+                self._cond.notify_all()
+
+
+class Subscription:
+
+    _end = object()
+
+    def __init__(
+        self,
+        collection: Collection,
+        names: Iterable[str],
+        events: Iterable[VarEvent],
+        resilient: bool = False,
+        backoff: float = 0.1,
+        max_backoff: float = 10.0,
+        max_retries: Optional[int] = None,
+        on_gap: Optional[Callable[[int, int], None]] = None,
+        stable_after: float = 1.0
+    ):
+        """SubscribeVariables stream over `names`. Iterate it to get the `(name, timestamp, value)` tuples, or use
+        `iter_batches` to get them in lists. `cancel` (or leaving the `with` block) cancels the gRPC call and ends
+        the iteration.
+
+        A `resilient` subscription reconnects when the stream fails, waiting a jittered exponential backoff between
+        attempts (`backoff` doubled on each failure up to `max_backoff`, forever unless `max_retries` is given), and
+        authenticates again if the session expired. Once reconnected it reads the subscribed variables and delivers
+        the values set during the outage. The outage only ends when the new stream delivers a value or stays up for
+        `stable_after` seconds: then it counts in `reconnects` and `downtime`, `on_gap(start_ns, end_ns)` reports it
+        and the backoff starts over. Values not newer than the last one delivered for their variable are suppressed.
+        """
+        self.collection = collection
+        self.names = list(names)
+        self.events = list(events)
+        self.resilient = resilient
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_retries = max_retries
+        self.on_gap = on_gap
+        self.stable_after = stable_after
+
+        self.received = 0
+        self.duplicates = 0
+        self.reconnects = 0
+        self.downtime = 0.0
+        self.last_error: Optional[Exception] = None
+
+        self._last_timestamps: Dict[str, int] = {}
+        self._gap_start = 0
+        self._gap_end = 0
+        self._attempt = 0
+        self._down_since: Optional[float] = None
+        self._up_since = 0.0
+        self._recovering = False
+        self._cancelled = ThreadingEvent()
+        self._queue: Optional[Queue] = None
+        self._error: Optional[Exception] = None
+        # Token the stream was opened with, so streams expiring together authenticate only once
+        self._token = collection.client._token
+        self._call = collection.client._subscribe(collection.name, self.names, self.events)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.cancel()
+
+    def __iter__(
+        self
+    ) -> Iterator[Tuple[str, int, Union[int, float, str, bool]]]:
+
+        if self._queue is not None:
+            raise RuntimeError("Subscription is already consumed in batches")
+        return self._values()
+
+    @property
+    def cancelled(
+        self
+    ) -> bool:
+        return self._cancelled.is_set()
+
+    def cancel(
+        self
+    ):
+        self._cancelled.set()
+        self._call.cancel()
+
+    def iter_batches(
+        self,
+        max_items: int = 1000,
+        max_wait: float = 0.1
+    ) -> Iterator[List[Tuple[str, int, Union[int, float, str, bool]]]]:
+        """Yield lists of up to `max_items` values. A list is yielded as soon as it is full, or `max_wait` seconds
+        after its first value arrived.
+        """
+        if self._queue is None:
+            self._queue = Queue()
+            Thread(target=self._read, name=f"arikedb-subscription-{self.collection.name}", daemon=True).start()
+
+        queue = self._queue
+        while True:
+            item = queue.get()
+            if item is self._end:
+                break
+            batch = [item]
+            deadline = time.monotonic() + max_wait
+            while len(batch) < max_items:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = queue.get(timeout=remaining) if remaining > 0 else queue.get_nowait()
+                except Empty:
+                    break
+                if item is self._end:
+                    queue.put(item)
+                    break
+                batch.append(item)
+            yield batch
+
+        queue.put(self._end)
+        if self._error is not None:
+            raise self._error
+
+    def _read(
+        self
+    ):
+        try:
+            for value in self._values():
+                self._queue.put(value)
+        except Exception as e:
+            self._error = e
+        self._queue.put(self._end)
+
+    def _values(
+        self
+    ) -> Iterator[Tuple[str, int, Union[int, float, str, bool]]]:
+
+        while True:
+            error = None
+            try:
+                for response in self._call:
+                    if self._recovering:
+                        self._recovered()
+                    value = ts_value(response)
+                    if value is not None and self._is_new(value):
+                        yield value
+            except grpc.RpcError as e:
+                error = e
+
+            if self.cancelled:
+                return
+            if not self.resilient:
+                if error is not None:
+                    raise error
+                return
+            if self._recovering and time.monotonic() - self._up_since >= self.stable_after:
+                self._recovered()
+            if not self._reconnect(error):
+                return
+            yield from self._catch_up()
+
+    def _is_new(
+        self,
+        value: Tuple[str, int, Union[int, float, str, bool]]
+    ) -> bool:
+        if self.resilient:
+            if value[1] <= self._last_timestamps.get(value[0], -1):
+                self.duplicates += 1
+                return False
+            self._last_timestamps[value[0]] = value[1]
+        self.received += 1
+        return True
+
+    def _reconnect(
+        self,
+        error: Optional[grpc.RpcError]
+    ) -> bool:
+        """Open the stream again. The attempts and the outage start are kept until `_recovered`, so an outage
+        spanning several short-lived streams is backed off and reported as one.
+        """
+        client = self.collection.client
+        self.last_error = error
+        self._recovering = False
+        if self._down_since is None:
+            self._down_since = time.monotonic()
+            self._gap_start = time.time_ns()
+
+        while not self.cancelled:
+            if self.max_retries is not None and self._attempt >= self.max_retries:
+                raise self.last_error or grpc.RpcError("Subscription stream ended")
+            delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** self._attempt))
+            self._attempt += 1
+            if self._cancelled.wait(delay):
+                break
+            try:
+                if error is not None and error.code() == grpc.StatusCode.UNAUTHENTICATED and client._username:
+                    client._reauthenticate(self._token)
+                self._token = client._token
+                call = client._subscribe(self.collection.name, self.names, self.events)
+            except grpc.RpcError as e:
+                error = self.last_error = e
+                continue
+            except Exception as e:
+                # Failed authentications (status exceptions) are backed off like the stream errors
+                self.last_error = e
+                continue
+            failed = stream_error(call)
+            if failed is not None:
+                error = self.last_error = failed
+                continue
+
+            self._call = call
+            if self.cancelled:
+                call.cancel()
+                break
+            self._recovering = True
+            self._gap_end = time.time_ns()
+            self._up_since = time.monotonic()
+            return True
+        return False
+
+    def _recovered(
+        self
+    ):
+        """The stream reopened is confirmed working: end the outage."""
+
+        self._recovering = False
+        self._attempt = 0
+        self.reconnects += 1
+        self.downtime += self._up_since - self._down_since
+        self._down_since = None
+        if self.on_gap is not None:
+            self.on_gap(self._gap_start, self._gap_end)
+
+    def _catch_up(
+        self
+    ) -> Iterator[Tuple[str, int, Union[int, float, str, bool]]]:
+
+        try:
+            values = self.collection._ts_variables_get(self.names)
+        except Exception:
+            values = []
+        for value in values:
+            if self._is_new(value):
+                yield value
+
+
+class SubscriptionThread(Thread):
+
+    def __init__(
+        self,
+        subscription: Subscription,
+        **kwargs
+    ):
+        """Thread consuming a subscription, as returned by `Collection.variables_subscribe`."""
+        super().__init__(**kwargs)
+        self.subscription = subscription
+
+    def cancel(
+        self
+    ):
+        self.subscription.cancel()
@@ -0,0 +1,404 @@
+from __future__ import annotations
+import time
+from collections import deque
+from concurrent.futures import Future
+from threading import Condition, Lock, Thread
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple, Union
+
+from .codec import value_field
+
+if TYPE_CHECKING:
+    from .arikedb import Collection
+
+
+class SetCoalescer:
+
+    def __init__(
+        self,
+        collection: Collection,
+        window: float = 0.005,
+        max_batch: int = 1000
+    ):
+        """Merges the single value sets made within `window` seconds (or until `max_batch` values are queued)
+        into one `ts_variables_set` request. Each `submit` returns a future resolved with the part of the
+        response concerning its own variable. A value of an unsupported type raises TypeError in `submit`,
+        so it can't fail the request of the others.
+        """
+        self.collection = collection
+        self.window = window
+        self.max_batch = max_batch
+        self.requests = 0
+        self.values = 0
+        self._pending: List[Tuple[Tuple[str, Union[int, float, str, bool], Optional[int]], Future]] = []
+        self._cond = Condition()
+        self._closed = False
+        self._thread = Thread(target=self._run, name=f"arikedb-coalescer-{collection.name}", daemon=True)
+        self._thread.start()
+
+    def submit(
+        self,
+        name: str,
+        value: Union[int, float, str, bool],
+        timestamp_ns: Optional[int] = None
+    ) -> Future:
+
+        _, value = value_field(value)
+        future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Set coalescer is closed")
+            self._pending.append(((name, value, timestamp_ns), future))
+            if len(self._pending) == 1 or len(self._pending) >= self.max_batch:
+                self._cond.notify()
+        return future
+
+    def close(
+        self
+    ):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+
+    def _run(
+        self
+    ):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                deadline = time.monotonic() + self.window
+                while len(self._pending) < self.max_batch and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._pending[:self.max_batch]
+                del self._pending[:self.max_batch]
+
+            self._flush(batch)
+
+    def _flush(
+        self,
+        batch: List[Tuple[Tuple[str, Union[int, float, str, bool], Optional[int]], Future]]
+    ):
+        try:
+            result = self.collection.ts_variables_set([values for values, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        self.requests += 1
+        self.values += len(batch)
+        not_found = set(result["not_found"])
+        invalid_type = set(result["invalid_type"])
+        for (name, _, _), future in batch:
+            future.set_result(self._slice(name, not_found, invalid_type))
+
+    @staticmethod
+    def _slice(
+        name: str,
+        not_found: set,
+        invalid_type: set
+    ) -> Dict[str, List[str]]:
+        return {
+            "not_found": [name] if name in not_found else [],
+            "invalid_type": [name] if name in invalid_type else [],
+        }
+
+
+class BufferedWriter:
+
+    overflow_policies = ("block", "drop")
+
+    def __init__(
+        self,
+        collection: Collection,
+        max_queue: int = 100_000,
+        flush_interval: float = 0.1,
+        max_batch: int = 10_000,
+        overflow: str = "block"
+    ):
+        """Write-behind writer for time series variables. Values are queued in memory and a background thread
+        sends them with `ts_variables_set` every `flush_interval` seconds, or as soon as `max_batch` values are
+        queued. When the queue holds `max_queue` values, `write` blocks ("block") or discards the value ("drop").
+
+        Values written without timestamp are stamped when queued, not when flushed. The values of a batch whose
+        request fails are lost, and counted in `dropped` like those discarded on overflow.
+        """
+        if overflow not in self.overflow_policies:
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+
+        self.collection = collection
+        self.max_queue = max_queue
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.overflow = overflow
+
+        self.written = 0
+        self.dropped = 0
+        self.flushes = 0
+        self.errors = 0
+        self.last_error: Optional[Exception] = None
+        self.last_flush_latency = 0.0
+        self.max_flush_latency = 0.0
+        self.total_flush_latency = 0.0
+
+        self._queue: deque = deque()
+        self._in_flight = 0
+        self._flush_requested = False
+        self._send_failed = False
+        self._closed = False
+        self._cond = Condition()
+        self._thread = Thread(target=self._run, name=f"arikedb-writer-{collection.name}", daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def queue_depth(
+        self
+    ) -> int:
+        return len(self._queue)
+
+    @property
+    def mean_flush_latency(
+        self
+    ) -> float:
+        return self.total_flush_latency / self.flushes if self.flushes else 0.0
+
+    def write(
+        self,
+        name: str,
+        value: Union[int, float, str, bool],
+        timestamp_ns: Optional[int] = None
+    ) -> bool:
+
+        return self.write_many([(name, value, timestamp_ns)]) == 1
+
+    def write_many(
+        self,
+        values: Iterable[Tuple[str, Union[int, float, str, bool], Optional[int]]]
+    ) -> int:
+        """Queue values and return how many of them were accepted (the rest were dropped)."""
+
+        now = time.time_ns()
+        accepted = 0
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Writer is closed")
+            for x in values:
+                if self.overflow == "drop" and len(self._queue) >= self.max_queue:
+                    self.dropped += 1
+                    continue
+                while len(self._queue) >= self.max_queue:
+                    self._cond.notify_all()
+                    self._cond.wait()
+                    if self._closed:
+                        raise RuntimeError("Writer is closed")
+                timestamp_ns = x[2] if len(x) == 3 and x[2] is not None else now
+                self._queue.append((x[0], x[1], timestamp_ns))
+                accepted += 1
+            self.written += accepted
+            if len(self._queue) >= self.max_batch:
+                self._cond.notify_all()
+        return accepted
+
+    def flush(
+        self,
+        timeout: Optional[float] = None
+    ) -> bool:
+        """Send every queued value now and wait until it is done. Returns False on timeout, or if a batch failed
+        to be sent meanwhile.
+        """
+        with self._cond:
+            self._flush_requested = True
+            self._send_failed = False
+            self._cond.notify_all()
+            done = self._cond.wait_for(lambda: not self._queue and not self._in_flight, timeout)
+            return done and not self._send_failed
+
+    def close(
+        self,
+        timeout: Optional[float] = None
+    ):
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+    def _run(
+        self
+    ):
+        while True:
+            with self._cond:
+                deadline = time.monotonic() + self.flush_interval
+                while len(self._queue) < self.max_batch and not self._flush_requested and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if not self._queue:
+                    self._flush_requested = False
+                    self._cond.notify_all()
+                    if self._closed:
+                        return
+                    continue
+                batch = [self._queue.popleft() for _ in range(min(self.max_batch, len(self._queue)))]
+                self._in_flight = len(batch)
+                self._cond.notify_all()
+
+            self._send(batch)
+
+            with self._cond:
+                self._in_flight = 0
+                self._cond.notify_all()
+
+    def _send(
+        self,
+        batch: List[Tuple[str, Union[int, float, str, bool], int]]
+    ):
+        t0 = time.monotonic()
+        try:
+            self.collection.ts_variables_set(batch)
+        except Exception as e:
+            with self._cond:
+                self.errors += 1
+                self.last_error = e
+                self.dropped += len(batch)
+                self._send_failed = True
+            return
+        latency = time.monotonic() - t0
+        self.flushes += 1
+        self.last_flush_latency = latency
+        self.total_flush_latency += latency
+        self.max_flush_latency = max(self.max_flush_latency, latency)
+
+
+class DeadbandWriter:
+
+    def __init__(
+        self,
+        collection: Collection,
+        absolute: float = 0.0,
+        percent: float = 0.0,
+        max_silence: Optional[float] = None,
+        writer: Optional[BufferedWriter] = None
+    ):
+        """Report-by-exception writer. A value is only sent if it differs from the last value sent for its
+        variable by more than the deadband: the largest of `absolute` and `percent` % of the last value sent
+        (any change for strings and booleans). A value within the deadband is still sent when the last one
+        was sent more than `max_silence` seconds ago.
+
+        Values are sent with `ts_variables_set`, or queued in `writer` if given.
+        """
+        self.collection = collection
+        self.absolute = absolute
+        self.percent = percent
+        self.max_silence = max_silence
+        self.writer = writer
+
+        self.sent = 0
+        self.suppressed = 0
+
+        self._last: Dict[str, Tuple[Union[int, float, str, bool], float]] = {}
+        self._lock = Lock()
+
+    @property
+    def suppression_ratio(
+        self
+    ) -> float:
+        total = self.sent + self.suppressed
+        return self.suppressed / total if total else 0.0
+
+    def write(
+        self,
+        name: str,
+        value: Union[int, float, str, bool],
+        timestamp_ns: Optional[int] = None
+    ) -> bool:
+        """Send the value if it is outside the deadband. Returns whether it was sent."""
+
+        return self.write_many([(name, value, timestamp_ns)]) == 1
+
+    def write_many(
+        self,
+        values: Iterable[Tuple[str, Union[int, float, str, bool], Optional[int]]]
+    ) -> int:
+        """Send the values outside the deadband in a single request and return how many were sent (values dropped
+        by `writer` are not sent, and the next value of their variables is sent whatever it is).
+        """
+
+        now = time.monotonic()
+        batch = []
+        with self._lock:
+            for x in values:
+                if self._changed(x[0], x[1], now):
+                    self._last[x[0]] = (x[1], now)
+                    batch.append((x[0], x[1], x[2]) if len(x) == 3 and x[2] is not None else (x[0], x[1]))
+                else:
+                    self.suppressed += 1
+
+        if not batch:
+            return 0
+        try:
+            if self.writer is not None:
+                accepted = self.writer.write_many(batch)
+                result = None
+            else:
+                accepted = len(batch)
+                result = self.collection.ts_variables_set(batch)
+        except Exception:
+            self.forget(x[0] for x in batch)
+            raise
+
+        if accepted < len(batch):
+            # A writer dropping on overflow accepts the values up to a full queue and drops the rest
+            self.forget(x[0] for x in batch[accepted:])
+        if result is not None:
+            rejected = set(result["not_found"]) | set(result["invalid_type"])
+            if rejected:
+                self.forget(rejected)
+        with self._lock:
+            self.sent += accepted
+        return accepted
+
+    def forget(
+        self,
+        names: Optional[Iterable[str]] = None
+    ):
+        """Forget the last values sent (of `names`, or all), so the next values are sent whatever they are."""
+
+        with self._lock:
+            if names is None:
+                self._last.clear()
+            else:
+                for name in names:
+                    self._last.pop(name, None)
+
+    def _changed(
+        self,
+        name: str,
+        value: Union[int, float, str, bool],
+        now: float
+    ) -> bool:
+
+        last = self._last.get(name)
+        if last is None:
+            return True
+        last_value, sent_at = last
+        if self.max_silence is not None and now - sent_at >= self.max_silence:
+            return True
+        if isinstance(value, (str, bool)) or isinstance(last_value, (str, bool)):
+            return value != last_value
+        deadband = max(self.absolute, abs(last_value) * self.percent / 100)
+        return abs(value - last_value) > deadband
@@ -34,7 +34,7 @@ def arikedb_test(coll: Collection):
     if WRITE:
         coll.ts_variables_set(data2)
     else:
-        coll.ts_variables_get(keys2)
+        coll.ts_variables_get(keys2, columnar=True)
     print(f"ArikeDB time: {time.time_ns() - t0} ns")
 
 
@@ -0,0 +1,25 @@
+import pytest
+
+from arikedb import Arikedb, ValueType
+from fake_server import FakeServer
+
+
+@pytest.fixture
+def server():
+    server = FakeServer()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def client(server):
+    with Arikedb(port=server.port) as client:
+        yield client
+
+
+@pytest.fixture
+def collection(client):
+    client.create_collections(["collection1"])
+    collection = client.collection_handle("collection1")
+    collection.create_ts_variables([("int_var", ValueType.Int), ("float_var", ValueType.Float)])
+    return collection
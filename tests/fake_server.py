@@ -0,0 +1,360 @@
+"""In-memory ArikeDB server implementing the RPCs of the client, for tests."""
+from __future__ import annotations
+import fnmatch
+import queue
+import threading
+import time
+import uuid
+from concurrent import futures
+from typing import Dict, Optional
+
+import grpc
+
+from arikedb.arike_main_pb2_grpc import ArikedbRPCServicer, add_ArikedbRPCServicer_to_server
+from arikedb.arike_auth_pb2 import AuthenticateResponse
+from arikedb.arike_collection_pb2 import CollectionMeta, CreateCollectionsResponse, DeleteCollectionsResponse, \
+    ListCollectionsResponse
+from arikedb.arike_ts_variable_pb2 import TsVariableMeta, TsVarValue, CreateVariablesResponse, DeleteVariablesResponse, \
+    ListVariablesResponse, SetVariablesResponse, GetVariablesResponse
+from arikedb.arike_stack_pb2 import StackMeta, StackValue, CreateStacksResponse, DeleteStacksResponse, ListStacksResponse, \
+    PutStacksResponse, PopStacksResponse
+from arikedb.arike_fifo_pb2 import FifoMeta, FifoValue, CreateFifosResponse, DeleteFifosResponse, ListFifosResponse, \
+    PushFifosResponse, PullFifosResponse
+from arikedb.arike_sorted_list_pb2 import SortedListMeta, SortedListValue, CreateSortedListsResponse, \
+    DeleteSortedListsResponse, ListSortedListsResponse, InsertSortedListsResponse, BiggestSortedListsResponse, \
+    SmallestSortedListsResponse
+
+VALUE_FIELDS = ("int_value", "float_value", "str_value", "bool_value")
+
+OK = 0
+SESSION_EXPIRED = 3
+COLLECTION_NOT_FOUND = 7
+VARIABLE_NOT_FOUND = 8
+TYPE_ERROR = 10
+
+
+class FakeArikedb(ArikedbRPCServicer):
+
+    def __init__(
+        self,
+        users: Optional[Dict[str, str]] = None
+    ):
+        self.users = users
+        self.tokens = set()
+        self.collections = {}
+        self.calls: Dict[str, int] = {}
+        self.fail_next: Dict[str, int] = {}
+        self.delays: Dict[str, float] = {}
+        self.requests = []
+        self._subscribers = []
+        self._lock = threading.RLock()
+
+    def _enter(self, method, request, context):
+        with self._lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+            self.requests.append((method, request))
+            if self.fail_next.get(method):
+                self.fail_next[method] -= 1
+                context.abort(grpc.StatusCode.UNAVAILABLE, "injected failure")
+        if self.delays.get(method):
+            time.sleep(self.delays[method])
+
+    def _authenticated(self, context):
+        if self.users is None:
+            return True
+        return dict(context.invocation_metadata()).get("authorization") in self.tokens
+
+    def Authenticate(self, request, context):
+        self._enter("Authenticate", request, context)
+        if self.users and self.users.get(request.username) == request.password:
+            token = uuid.uuid4().hex
+            self.tokens.add(token)
+            return AuthenticateResponse(status=OK, token=token)
+        return AuthenticateResponse(status=6)
+
+    def CreateCollections(self, request, context):
+        self._enter("CreateCollections", request, context)
+        already_exists = []
+        with self._lock:
+            for meta in request.collections:
+                if meta.name in self.collections:
+                    already_exists.append(meta.name)
+                else:
+                    self.collections[meta.name] = {"variables": {}, "stacks": {}, "fifos": {}, "sorted_lists": {}}
+        return CreateCollectionsResponse(status=OK, already_exists=already_exists)
+
+    def DeleteCollections(self, request, context):
+        self._enter("DeleteCollections", request, context)
+        with self._lock:
+            not_found = [name for name in request.names if self.collections.pop(name, None) is None]
+        return DeleteCollectionsResponse(status=OK, not_found=not_found)
+
+    def ListCollections(self, request, context):
+        self._enter("ListCollections", request, context)
+        pattern = request.pattern if request.HasField("pattern") else "*"
+        return ListCollectionsResponse(status=OK, collections=[
+            CollectionMeta(name=name) for name in self.collections if fnmatch.fnmatch(name, pattern)
+        ])
+
+    def CreateVariables(self, request, context):
+        self._enter("CreateVariables", request, context)
+        if not self._authenticated(context):
+            return CreateVariablesResponse(status=SESSION_EXPIRED)
+        collection = self.collections.get(request.collection)
+        if collection is None:
+            return CreateVariablesResponse(status=COLLECTION_NOT_FOUND)
+        already_exists = []
+        for meta in request.variables:
+            if meta.name in collection["variables"]:
+                already_exists.append(meta.name)
+            else:
+                collection["variables"][meta.name] = [meta.val_type, None, 0]
+        return CreateVariablesResponse(status=OK, already_exists=already_exists)
+
+    def DeleteVariables(self, request, context):
+        self._enter("DeleteVariables", request, context)
+        collection = self.collections.get(request.collection)
+        if collection is None:
+            return DeleteVariablesResponse(status=COLLECTION_NOT_FOUND)
+        not_found = [name for name in request.names if collection["variables"].pop(name, None) is None]
+        return DeleteVariablesResponse(status=OK, not_found=not_found)
+
+    def ListVariables(self, request, context):
+        self._enter("ListVariables", request, context)
+        collection = self.collections.get(request.collection)
+        if collection is None:
+            return ListVariablesResponse(status=COLLECTION_NOT_FOUND)
+        pattern = request.pattern if request.HasField("pattern") else "*"
+        return ListVariablesResponse(status=OK, variables=[
+            TsVariableMeta(name=name, val_type=v[0]) for name, v in collection["variables"].items()
+            if fnmatch.fnmatch(name, pattern)
+        ])
+
+    def SetVariables(self, request, context):
+        self._enter("SetVariables", request, context)
+        if not self._authenticated(context):
+            return SetVariablesResponse(status=SESSION_EXPIRED)
+        collection = self.collections.get(request.collection)
+        if collection is None:
+            return SetVariablesResponse(status=COLLECTION_NOT_FOUND)
+        not_found, invalid_type = [], []
+        now = time.time_ns()
+        for value in request.values:
+            variable = collection["variables"].get(value.name)
+            if variable is None:
+                not_found.append(value.name)
+                continue
+            field = VALUE_FIELDS[variable[0]]
+            if not value.HasField(field) or any(value.HasField(f) for f in VALUE_FIELDS if f != field):
+                invalid_type.append(value.name)
+                continue
+            if value.HasField("timestamp"):
+                timestamp = value.timestamp
+            else:
+                timestamp = request.timestamp if request.HasField("timestamp") else now
+            variable[1:] = [getattr(value, field), timestamp]
+            for subscriber in list(self._subscribers):
+                if subscriber[0] == request.collection and value.name in subscriber[1]:
+                    subscriber[2].put(TsVarValue(name=value.name, val_type=variable[0], timestamp=timestamp,
+                                                 **{field: variable[1]}))
+        status = VARIABLE_NOT_FOUND if not_found else (TYPE_ERROR if invalid_type else OK)
+        return SetVariablesResponse(status=status, not_found=not_found, invalid_type=invalid_type)
+
+    def GetVariables(self, request, context):
+        self._enter("GetVariables", request, context)
+        if not self._authenticated(context):
+            return GetVariablesResponse(status=SESSION_EXPIRED)
+        collection = self.collections.get(request.collection)
+        if collection is None:
+            return GetVariablesResponse(status=COLLECTION_NOT_FOUND)
+        values = []
+        for name in request.names:
+            variable = collection["variables"].get(name)
+            if variable is not None and variable[1] is not None:
+                values.append(TsVarValue(name=name, val_type=variable[0], timestamp=variable[2],
+                                         **{VALUE_FIELDS[variable[0]]: variable[1]}))
+        return GetVariablesResponse(status=OK, values=values)
+
+    def SubscribeVariables(self, request, context):
+        self._enter("SubscribeVariables", request, context)
+        if not self._authenticated(context):
+            context.abort(grpc.StatusCode.UNAUTHENTICATED, "session expired")
+        subscriber = (request.collection, set(request.names), queue.Queue())
+        self._subscribers.append(subscriber)
+        context.send_initial_metadata(())
+        try:
+            while context.is_active():
+                try:
+                    yield subscriber[2].get(timeout=0.05)
+                except queue.Empty:
+                    continue
+        finally:
+            self._subscribers.remove(subscriber)
+
+    def _create(self, kind, method, request, items, response_class, context):
+        self._enter(method, request, context)
+        collection = self.collections.get(request.collection)
+        if collection is None:
+            return response_class(status=COLLECTION_NOT_FOUND)
+        already_exists = []
+        for meta in items:
+            if meta.name in collection[kind]:
+                already_exists.append(meta.name)
+            else:
+                collection[kind][meta.name] = [meta.val_type, meta.max_size if meta.HasField("max_size") else None, []]
+        return response_class(status=OK, already_exists=already_exists)
+
+    def _delete(self, kind, method, request, response_class, context):
+        self._enter(method, request, context)
+        collection = self.collections.get(request.collection)
+        if collection is None:
+            return response_class(status=COLLECTION_NOT_FOUND)
+        not_found = [name for name in request.names if collection[kind].pop(name, None) is None]
+        return response_class(status=OK, not_found=not_found)
+
+    def _list(self, kind, method, request, response_class, meta_class, context):
+        self._enter(method, request, context)
+        collection = self.collections.get(request.collection)
+        if collection is None:
+            return response_class(status=COLLECTION_NOT_FOUND)
+        pattern = request.pattern if request.HasField("pattern") else "*"
+        return response_class(status=OK, **{kind: [
+            meta_class(name=name, val_type=a[0], max_size=a[1]) for name, a in collection[kind].items()
+            if fnmatch.fnmatch(name, pattern)
+        ]})
+
+    def _insert(self, kind, method, request, response_class, context, sort=False):
+        self._enter(method, request, context)
+        collection = self.collections.get(request.collection)
+        if collection is None:
+            return response_class(status=COLLECTION_NOT_FOUND)
+        not_found, invalid_type, non_inserted = [], [], []
+        for value in request.values:
+            array = collection[kind].get(value.name)
+            if array is None:
+                not_found.append(value.name)
+                continue
+            val_type, max_size, data = array
+            values = list(getattr(value, VALUE_FIELDS[val_type]))
+            if not values:
+                invalid_type.append(value.name)
+                continue
+            room = len(values) if max_size is None else max(0, min(len(values), max_size - len(data)))
+            data.extend(values[:room])
+            if sort:
+                data.sort()
+            non_inserted.append(len(values) - room)
+        return response_class(status=OK, not_found=not_found, invalid_type=invalid_type, non_inserted=non_inserted)
+
+    def _take(self, kind, method, request, response_class, value_class, context, newest, remove=None):
+        self._enter(method, request, context)
+        collection = self.collections.get(request.collection)
+        if collection is None:
+            return response_class(status=COLLECTION_NOT_FOUND)
+        values = []
+        for names_count in request.names_counts:
+            array = collection[kind].get(names_count.name)
+            if array is None:
+                continue
+            val_type, _, data = array
+            taken = data[::-1][:names_count.n] if newest else data[:names_count.n]
+            if remove is None or names_count.remove:
+                if newest:
+                    del data[len(data) - len(taken):]
+                else:
+                    del data[:len(taken)]
+            values.append(value_class(name=names_count.name, val_type=val_type, **{VALUE_FIELDS[val_type]: taken}))
+        return response_class(status=OK, values=values)
+
+    def CreateStacks(self, request, context):
+        return self._create("stacks", "CreateStacks", request, request.stacks, CreateStacksResponse, context)
+
+    def DeleteStacks(self, request, context):
+        return self._delete("stacks", "DeleteStacks", request, DeleteStacksResponse, context)
+
+    def ListStacks(self, request, context):
+        return self._list("stacks", "ListStacks", request, ListStacksResponse, StackMeta, context)
+
+    def PutStacks(self, request, context):
+        return self._insert("stacks", "PutStacks", request, PutStacksResponse, context)
+
+    def PopStacks(self, request, context):
+        return self._take("stacks", "PopStacks", request, PopStacksResponse, StackValue, context, newest=True)
+
+    def CreateFifos(self, request, context):
+        return self._create("fifos", "CreateFifos", request, request.fifos, CreateFifosResponse, context)
+
+    def DeleteFifos(self, request, context):
+        return self._delete("fifos", "DeleteFifos", request, DeleteFifosResponse, context)
+
+    def ListFifos(self, request, context):
+        return self._list("fifos", "ListFifos", request, ListFifosResponse, FifoMeta, context)
+
+    def PushFifos(self, request, context):
+        return self._insert("fifos", "PushFifos", request, PushFifosResponse, context)
+
+    def PullFifos(self, request, context):
+        return self._take("fifos", "PullFifos", request, PullFifosResponse, FifoValue, context, newest=False)
+
+    def CreateSortedLists(self, request, context):
+        return self._create("sorted_lists", "CreateSortedLists", request, request.sorted_lists,
+                            CreateSortedListsResponse, context)
+
+    def DeleteSortedLists(self, request, context):
+        return self._delete("sorted_lists", "DeleteSortedLists", request, DeleteSortedListsResponse, context)
+
+    def ListSortedLists(self, request, context):
+        return self._list("sorted_lists", "ListSortedLists", request, ListSortedListsResponse, SortedListMeta, context)
+
+    def InsertSortedLists(self, request, context):
+        return self._insert("sorted_lists", "InsertSortedLists", request, InsertSortedListsResponse, context, sort=True)
+
+    def BiggestSortedLists(self, request, context):
+        return self._take("sorted_lists", "BiggestSortedLists", request, BiggestSortedListsResponse, SortedListValue,
+                          context, newest=True, remove=True)
+
+    def SmallestSortedLists(self, request, context):
+        return self._take("sorted_lists", "SmallestSortedLists", request, SmallestSortedListsResponse, SortedListValue,
+                          context, newest=False, remove=True)
+
+
+class FakeServer:
+
+    def __init__(
+        self,
+        port: int = 0,
+        users: Optional[Dict[str, str]] = None
+    ):
+        """Fake ArikeDB server on localhost. `stop` and `start` again keep the port, to simulate an outage."""
+
+        self.port = port
+        self.users = users
+        self.fake: Optional[FakeArikedb] = None
+        self._server = None
+        self.start()
+
+    @property
+    def address(
+        self
+    ) -> str:
+        return f"127.0.0.1:{self.port}"
+
+    def start(
+        self,
+        keep_data: bool = True
+    ):
+        """Start serving, with the data of the previous run unless `keep_data` is False."""
+
+        previous = self.fake
+        self.fake = FakeArikedb(self.users)
+        if previous is not None and keep_data:
+            self.fake.collections = previous.collections
+        self._server = grpc.server(futures.ThreadPoolExecutor(max_workers=32))
+        add_ArikedbRPCServicer_to_server(self.fake, self._server)
+        self.port = self._server.add_insecure_port(f"127.0.0.1:{self.port}")
+        self._server.start()
+
+    def stop(
+        self
+    ):
+        self._server.stop(0).wait()
@@ -0,0 +1,41 @@
+import pytest
+
+from arikedb import ValueType
+
+np = pytest.importorskip("numpy")
+
+
+@pytest.fixture
+def arrays(collection):
+    collection.create_stacks([("str_stack", ValueType.String, None), ("int_stack", ValueType.Int, None)])
+    return collection
+
+
+def test_out_buffer_of_another_kind_keeps_values(arrays):
+    arrays.stacks_put([("str_stack", ["a", "bc"])])
+    buffer = np.zeros(4, dtype=np.int64)
+
+    name, values = arrays.stack("str_stack").pop(2, out=buffer)
+    assert name == "str_stack"
+    assert sorted(values) == ["a", "bc"]
+    assert list(buffer) == [0, 0, 0, 0]
+
+
+def test_out_buffer_too_narrow_keeps_values(arrays):
+    arrays.stacks_put([("int_stack", [300, 1000])])
+    buffer = np.zeros(4, dtype=np.uint8)
+
+    _, values = arrays.stack("int_stack").pop(2, out=buffer)
+    assert sorted(values) == [300, 1000]
+    assert values.dtype == np.int64
+    assert list(buffer) == [0, 0, 0, 0]
+
+
+def test_out_buffer_written_in_place(arrays):
+    arrays.stacks_put([("int_stack", [1, 2, 3])])
+    buffer = np.zeros(4, dtype=np.int64)
+
+    _, values = arrays.stack("int_stack").pop(3, out=buffer)
+    assert sorted(values) == [1, 2, 3]
+    assert values.base is buffer
+    assert sorted(buffer[:3]) == [1, 2, 3]
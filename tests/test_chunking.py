@@ -0,0 +1,93 @@
+import math
+
+import pytest
+
+from arikedb import Arikedb, ValueType
+from arikedb.arike_ts_variable_pb2 import SetVariablesRequest
+from arikedb.codec import split_request, ts_values
+
+
+@pytest.fixture
+def small_client(server):
+    with Arikedb(port=server.port, max_request_size=2000) as client:
+        client.create_collections(["collection1"])
+        yield client
+
+
+def set_request(values):
+    return SetVariablesRequest(collection="collection1", timestamp=5, values=ts_values(values))
+
+
+def test_split_request_bounds_parts():
+    request = set_request([(f"var{i}", i) for i in range(500)])
+    parts = split_request(request, "values", 1000)
+
+    assert math.ceil(request.ByteSize() / 1000) <= len(parts) <= 2 * math.ceil(request.ByteSize() * 1.1 / 1000)
+    assert all(part.ByteSize() <= 1000 for part in parts)
+    assert all(part.collection == "collection1" and part.timestamp == 5 for part in parts)
+    assert [v.name for part in parts for v in part.values] == [v.name for v in request.values]
+    assert split_request(request, "values", request.ByteSize()) == [request]
+
+
+def test_split_request_sends_oversized_entry_alone():
+    request = set_request([("small0", 1), ("big", "x" * 5000), ("small1", 2)])
+    parts = split_request(request, "values", 1000)
+
+    assert [[v.name for v in part.values] for part in parts] == [["small0"], ["big"], ["small1"]]
+
+
+def test_chunked_set_and_get(server, small_client):
+    collection = small_client.collection_handle("collection1")
+    names = [f"var{i}" for i in range(500)]
+    collection.create_ts_variables([(name, ValueType.Int) for name in names] + [("missing_type", ValueType.Float)])
+
+    values = [(name, i) for i, name in enumerate(names)] + [("missing", 1), ("missing_type", 1)]
+    expected_parts = len(split_request(set_request(values), "values", 2000))
+    assert expected_parts > 1
+
+    assert collection.ts_variables_set(values) == {"not_found": ["missing"], "invalid_type": ["missing_type"]}
+    assert server.fake.calls["SetVariables"] == expected_parts
+    assert collection.ts_variables_set_async(values).result(5.0) == {"not_found": ["missing"],
+                                                                     "invalid_type": ["missing_type"]}
+    assert server.fake.calls["SetVariables"] == 2 * expected_parts
+
+    asked = list(reversed(names))
+    rows = collection.ts_variables_get(asked)
+    assert server.fake.calls["GetVariables"] > 1
+    assert [row[0] for row in rows] == asked
+    assert [row[2] for row in rows] == list(range(499, -1, -1))
+    assert collection.ts_variables_get_async(asked).result(5.0) == rows
+
+    columns = collection.ts_variables_get(asked, columnar=True)
+    assert list(columns[0]) == asked
+    assert list(columns[2]) == list(range(499, -1, -1))
+    async_columns = collection.ts_variables_get_async(asked, columnar=True).result(5.0)
+    assert list(async_columns[0]) == asked
+    assert list(async_columns[2]) == list(columns[2])
+
+
+def test_chunked_array_insert_merges_non_inserted(server, small_client):
+    collection = small_client.collection_handle("collection1")
+    collection.create_fifos([("fifo", ValueType.Int, 1500), ("other", ValueType.Int, None)])
+
+    result = collection.fifos_push([("fifo", list(range(3000))), ("other", [1, 2])])
+    assert server.fake.calls["PushFifos"] > 1
+    assert result == {"not_found": [], "invalid_type": [], "non_inserted": {"fifo": 1500, "other": 0}}
+
+    # Parts of the same array are sent in order
+    _, values = collection.fifos_pull([("fifo", 1500)])[0]
+    assert list(values) == list(range(1500))
+
+    result = collection.fifos_push_async([("fifo", list(range(3000)))]).result(5.0)
+    assert result["non_inserted"] == {"fifo": 1500}
+    _, values = collection.fifos_pull([("fifo", 1500)])[0]
+    assert list(values) == list(range(1500))
+
+
+def test_oversized_value_sent_alone(server, small_client):
+    collection = small_client.collection_handle("collection1")
+    collection.create_ts_variables([("big", ValueType.String), ("small", ValueType.Int)])
+
+    assert collection.ts_variables_set([("small", 1), ("big", "x" * 5000)]) == {"not_found": [], "invalid_type": []}
+    assert server.fake.calls["SetVariables"] == 2
+    assert [row[2] for row in collection.ts_variables_get(["big", "small"])] == ["x" * 5000, 1]
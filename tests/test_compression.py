@@ -0,0 +1,55 @@
+import math
+import random
+
+import pytest
+
+from arikedb.compression import swinging_door, compress
+
+
+def max_error(timestamps, values, kept):
+    error = 0.0
+    for a, b in zip(kept, kept[1:]):
+        for i in range(a + 1, b):
+            interpolated = values[a] + (values[b] - values[a]) * (timestamps[i] - timestamps[a]) / (timestamps[b] - timestamps[a])
+            error = max(error, abs(interpolated - values[i]))
+    return error
+
+
+def test_swinging_door_error_bound():
+    rng = random.Random(1)
+    timestamps = list(range(0, 10_000, 10))
+    values = [math.sin(t / 500) + rng.uniform(-0.01, 0.01) for t in timestamps]
+
+    kept = swinging_door(timestamps, values, 0.05)
+    assert kept[0] == 0 and kept[-1] == len(values) - 1
+    assert len(kept) < len(values) / 5
+    assert max_error(timestamps, values, kept) <= 0.05 + 1e-9
+
+
+def test_swinging_door_keeps_straight_line_ends():
+    assert swinging_door([0, 1, 2, 3, 4], [0.0, 1.0, 2.0, 3.0, 4.0], 0.0) == [0, 4]
+
+
+@pytest.mark.parametrize("values, expected", [
+    ([0.0, 1.0, math.nan, 3.0, 4.0], [0, 1, 2, 3, 4]),
+    ([0.0, 1.0, 2.0, 3.0, math.nan, 5.0, 6.0, 7.0], [0, 3, 4, 5, 7]),
+    ([math.nan, math.nan, 2.0, 3.0, 4.0], [0, 1, 2, 4]),
+    ([0.0, 1.0, 2.0, math.inf], [0, 2, 3]),
+])
+def test_swinging_door_keeps_non_finite_samples(values, expected):
+    assert swinging_door(list(range(len(values))), values, 0.1) == expected
+
+
+def test_swinging_door_rejects_unordered_timestamps():
+    with pytest.raises(ValueError):
+        swinging_door([0, 2, 1], [0.0, 1.0, 2.0], 0.1)
+
+
+def test_compress_numpy():
+    np = pytest.importorskip("numpy")
+    timestamps = np.arange(100, dtype=np.int64)
+    values = np.where(timestamps < 50, 0.0, 1.0)
+
+    kept_timestamps, kept_values = compress(timestamps, values, 0.01)
+    assert isinstance(kept_values, np.ndarray)
+    assert list(kept_timestamps) == [0, 49, 50, 99]
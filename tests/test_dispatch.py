@@ -0,0 +1,61 @@
+import threading
+
+import pytest
+
+from arikedb import CallbackDispatcher
+
+
+def test_close_releases_blocked_submit_without_losing_it():
+    release = threading.Event()
+    started = threading.Event()
+    run = []
+
+    def _callback(value):
+        started.set()
+        release.wait(5.0)
+        run.append(value[0])
+
+    dispatcher = CallbackDispatcher(max_queue=1, policy="block")
+    assert dispatcher.submit(_callback, ("var0", 0, 0))
+    assert started.wait(5.0)
+    assert dispatcher.submit(_callback, ("var1", 0, 0))
+
+    results = []
+    blocked = threading.Thread(target=lambda: results.append(dispatcher.submit(_callback, ("var2", 0, 0))))
+    blocked.start()
+    closing = threading.Thread(target=dispatcher.close)
+    closing.start()
+    blocked.join(5.0)
+
+    assert results == [False]
+    release.set()
+    closing.join(5.0)
+    assert run == ["var0", "var1"]
+    assert dispatcher.dispatched == 2
+    assert dispatcher.dropped == 1
+    with pytest.raises(RuntimeError):
+        dispatcher.submit(_callback, ("var3", 0, 0))
+
+
+@pytest.mark.parametrize("policy", ["drop_newest", "drop_oldest", "coalesce"])
+def test_counters_add_up_under_concurrent_submits(policy):
+    dispatcher = CallbackDispatcher(workers=4, max_queue=5, policy=policy, ordered=True)
+
+    def _callback(value):
+        if value[2] % 7 == 0:
+            raise ValueError("callback failure")
+
+    def _submit(thread):
+        for i in range(2000):
+            dispatcher.submit(_callback, (f"var{(thread + i) % 8}", 0, i))
+
+    threads = [threading.Thread(target=_submit, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    dispatcher.close()
+
+    assert dispatcher.dispatched + dispatcher.dropped + dispatcher.coalesced == 8000
+    assert dispatcher.errors <= dispatcher.dispatched
+    assert dispatcher.queue_depth == 0
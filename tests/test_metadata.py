@@ -0,0 +1,38 @@
+import time
+
+from arikedb import Arikedb, ValueType
+
+
+def test_listing_collections_keeps_cached_handles(server):
+    with Arikedb(port=server.port, metadata_ttl=60.0) as client:
+        client.create_collections(["collection1", "collection2"])
+        collection = client.collection("collection1")
+        collection.create_ts_variables([("var0", ValueType.Int)])
+        variable = collection.ts_variable("var0")
+
+        listed = {c.name: c for c in client.collections()}
+        assert listed["collection1"] is collection
+        assert client.collection("collection1") is collection
+
+        # The collection still serves its handles from its own cache
+        calls = server.fake.calls["ListVariables"]
+        assert client.collection("collection1").ts_variable("var0") is variable
+        assert server.fake.calls["ListVariables"] == calls
+
+        client.create_collections(["collection3"])
+        client.delete_collections(["collection2"])
+        listed = {c.name: c for c in client.collections()}
+        assert sorted(listed) == ["collection1", "collection3"]
+        assert listed["collection1"] is collection
+        assert client.collection("collection2") is None
+
+
+def test_expired_listing_reuses_handles(server):
+    with Arikedb(port=server.port, metadata_ttl=0.05) as client:
+        client.create_collections(["collection1"])
+        collection = client.collection("collection1")
+
+        time.sleep(0.1)
+        calls = server.fake.calls["ListCollections"]
+        assert client.collection("collection1") is collection
+        assert server.fake.calls["ListCollections"] == calls + 1
@@ -0,0 +1,61 @@
+import grpc
+import pytest
+
+from arikedb import ValueType
+from arikedb.common import CollectionNotFound
+
+
+@pytest.fixture
+def collections(client, collection):
+    client.create_collections(["collection2"])
+    other = client.collection_handle("collection2")
+    other.create_ts_variables([("var0", ValueType.Int)])
+    return collection, other
+
+
+def test_multi_set_and_get(client, collections):
+    collection, other = collections
+    result = client.multi_set({collection: [("int_var", 1), ("float_var", 2.5)], "collection2": [("var0", 3)]})
+    assert result == {"results": {"collection1": {"not_found": [], "invalid_type": []},
+                                  "collection2": {"not_found": [], "invalid_type": []}},
+                      "errors": {}}
+
+    result = client.multi_get({"collection1": ["float_var", "int_var"], other: ["var0"]})
+    assert result["errors"] == {}
+    assert [v[2] for v in result["results"]["collection1"]] == [2.5, 1]
+    assert [v[2] for v in result["results"]["collection2"]] == [3]
+
+    names, _, values = client.multi_get({"collection2": ["var0"]}, columnar=True)["results"]["collection2"]
+    assert list(names) == ["var0"] and list(values) == [3]
+
+
+def test_multi_errors_per_collection(server, client, collections):
+    result = client.multi_get({"collection1": ["int_var"], "missing": ["var0"]})
+    assert list(result["results"]) == ["collection1"]
+    assert isinstance(result["errors"]["missing"], CollectionNotFound)
+
+    server.fake.fail_next["SetVariables"] = 1
+    result = client.multi_set({"collection1": [("int_var", 1)]})
+    assert result["results"] == {}
+    assert result["errors"]["collection1"].code() == grpc.StatusCode.UNAVAILABLE
+
+    # Failing to build a request only fails its collection
+    result = client.multi_set({"collection1": [("int_var", None)], "collection2": [("var0", 1)]})
+    assert isinstance(result["errors"]["collection1"], TypeError)
+    assert result["results"]["collection2"] == {"not_found": [], "invalid_type": []}
+
+
+def test_multi_timeout_cancels_pending(server, client, collections):
+    server.fake.delays["GetVariables"] = 1.0
+    result = client.multi_get({"collection1": ["int_var"], "collection2": ["var0"]}, timeout=0.2)
+    assert result["results"] == {}
+    assert set(result["errors"]) == {"collection1", "collection2"}
+    assert all(isinstance(error, TimeoutError) for error in result["errors"].values())
+
+
+def test_multi_rejects_collection_given_twice(client, collections):
+    collection, _ = collections
+    with pytest.raises(ValueError):
+        client.multi_get({"collection1": ["int_var"], collection: ["float_var"]})
+    with pytest.raises(ValueError):
+        client.multi_set({collection: [("int_var", 1)], "collection1": [("float_var", 1.5)]})
@@ -0,0 +1,131 @@
+import threading
+import time
+
+import grpc
+import pytest
+
+from arikedb import Arikedb, CallPolicy, ValueType
+from arikedb.arike_collection_pb2 import ListCollectionsRequest
+from fake_server import FakeServer
+
+
+@pytest.fixture
+def auth_server():
+    server = FakeServer(users={"user": "password"})
+    yield server
+    server.stop()
+
+
+def make_client(server, **kwargs):
+    return Arikedb(port=server.port, **kwargs)
+
+
+def test_read_retried_after_unavailable(server, collection):
+    policy = collection.client.policy
+    server.fake.fail_next["GetVariables"] = 2
+    assert collection.ts_variables_get(["int_var"]) == []
+    assert server.fake.calls["GetVariables"] == 3
+    assert policy.stats("GetVariables").retries == 2
+
+    server.fake.fail_next["GetVariables"] = 2
+    assert collection.ts_variables_get_async(["int_var"]).result(5.0) == []
+    assert server.fake.calls["GetVariables"] == 6
+    assert policy.stats("GetVariables").retries == 4
+
+
+def test_read_gives_up_after_max_retries(server):
+    with make_client(server, policy=CallPolicy(max_retries=1, backoff=0.0)) as client:
+        server.fake.fail_next["ListCollections"] = 2
+        with pytest.raises(grpc.RpcError) as e:
+            client.collections()
+        assert e.value.code() == grpc.StatusCode.UNAVAILABLE
+        assert server.fake.calls["ListCollections"] == 2
+
+
+def test_set_not_retried(server, collection):
+    server.fake.fail_next["SetVariables"] = 1
+    with pytest.raises(grpc.RpcError):
+        collection.ts_variables_set([("int_var", 1)])
+    assert server.fake.calls["SetVariables"] == 1
+
+    server.fake.fail_next["SetVariables"] = 1
+    with pytest.raises(grpc.RpcError):
+        collection.ts_variables_set_async([("int_var", 1)]).result(5.0)
+    assert server.fake.calls["SetVariables"] == 2
+    assert collection.client.policy.stats("SetVariables").retries == 0
+
+
+@pytest.mark.parametrize("use_futures", [False, True])
+def test_concurrent_expired_calls_reauthenticate_once(auth_server, use_futures):
+    with make_client(auth_server, username="user", password="password") as client:
+        client.create_collections(["collection1"])
+        collection = client.collection_handle("collection1")
+        collection.create_ts_variables([("int_var", ValueType.Int)])
+        collection.ts_variables_set([("int_var", 5)])
+        assert auth_server.fake.calls["Authenticate"] == 1
+
+        auth_server.fake.tokens.clear()
+        if use_futures:
+            futures = [collection.ts_variables_get_async(["int_var"]) for _ in range(8)]
+            results = [future.result(5.0) for future in futures]
+        else:
+            results = []
+            barrier = threading.Barrier(8)
+
+            def _get():
+                barrier.wait()
+                results.append(collection.ts_variables_get(["int_var"]))
+
+            threads = [threading.Thread(target=_get) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        assert [r[0][2] for r in results] == [5] * 8
+        assert auth_server.fake.calls["Authenticate"] == 2
+        assert client.policy.stats("GetVariables").reauthentications >= 1
+
+
+def test_expired_set_sent_again_once(auth_server):
+    with make_client(auth_server, username="user", password="password") as client:
+        client.create_collections(["collection1"])
+        collection = client.collection_handle("collection1")
+        collection.create_ts_variables([("int_var", ValueType.Int)])
+
+        auth_server.fake.tokens.clear()
+        assert collection.ts_variables_set([("int_var", 1)]) == {"not_found": [], "invalid_type": []}
+        auth_server.fake.tokens.clear()
+        assert collection.ts_variables_set_async([("int_var", 2)]).result(5.0) == {"not_found": [], "invalid_type": []}
+        assert auth_server.fake.calls["Authenticate"] == 3
+        assert auth_server.fake.calls["SetVariables"] == 4
+
+
+@pytest.mark.parametrize("use_futures", [False, True])
+def test_deadline_covers_retries(server, use_futures):
+    policy = CallPolicy(timeout=0.5, backoff=0.2, max_backoff=0.2, max_retries=100)
+    with make_client(server, policy=policy) as client:
+        server.fake.fail_next["ListCollections"] = 1000
+        started = time.monotonic()
+        with pytest.raises(grpc.RpcError):
+            if use_futures:
+                client._exec_future("ListCollections", ListCollectionsRequest()).result(5.0)
+            else:
+                client.collections()
+        assert time.monotonic() - started < 0.8
+        assert 0 < policy.stats("ListCollections").retries < 100
+
+
+@pytest.mark.parametrize("use_futures", [False, True])
+def test_deadline_bounds_stalled_retry(server, collection, use_futures):
+    collection.client.policy.timeout = 0.5
+    server.fake.fail_next["GetVariables"] = 1
+    server.fake.delays["GetVariables"] = 2.0
+    started = time.monotonic()
+    with pytest.raises(grpc.RpcError) as e:
+        if use_futures:
+            collection.ts_variables_get_async(["int_var"]).result(5.0)
+        else:
+            collection.ts_variables_get(["int_var"])
+    assert e.value.code() == grpc.StatusCode.DEADLINE_EXCEEDED
+    assert time.monotonic() - started < 0.8
@@ -0,0 +1,30 @@
+import pytest
+
+
+def test_prepared_set_switches_value_field(collection):
+    prepared = collection.prepare_set(["float_var", "int_var"])
+
+    assert prepared.execute([1, 2])["invalid_type"] == ["float_var"]
+    assert prepared.execute([1.5, 2]) == {"not_found": [], "invalid_type": []}
+    assert not prepared._request.values[0].HasField("int_value")
+    assert prepared.execute([3.5, 4]) == {"not_found": [], "invalid_type": []}
+    assert [v[2] for v in collection.ts_variables_get(["float_var", "int_var"])] == [3.5, 4]
+
+
+def test_prepared_set_switches_value_field_from_array(collection):
+    np = pytest.importorskip("numpy")
+    prepared = collection.prepare_set(["float_var", "int_var"])
+
+    assert prepared.execute([1.5, 2]) == {"not_found": [], "invalid_type": []}
+    assert prepared.execute(np.array([2.5, 3.0]))["invalid_type"] == ["int_var"]
+    assert not prepared._request.values[1].HasField("int_value")
+    assert prepared.execute([3.5, 4]) == {"not_found": [], "invalid_type": []}
+    assert [v[2] for v in collection.ts_variables_get(["float_var", "int_var"])] == [3.5, 4]
+
+
+def test_prepared_get(collection):
+    collection.ts_variables_set([("int_var", 7), ("float_var", 0.5)])
+    prepared = collection.prepare_get(["int_var", "float_var"])
+    assert [v[2] for v in prepared.execute()] == [7, 0.5]
+    names, _, values = prepared.execute(columnar=True)
+    assert names == ["int_var", "float_var"]
@@ -0,0 +1,69 @@
+import threading
+
+import pytest
+
+from arikedb import Arikedb
+from arikedb.replicas import HedgeTimers
+from fake_server import FakeServer
+
+
+@pytest.fixture
+def replica_servers():
+    servers = [FakeServer() for _ in range(2)]
+    yield servers
+    for server in servers:
+        server.stop()
+
+
+def test_hedged_reads_alternate_first_replica(server, replica_servers):
+    addresses = [server.address for server in replica_servers]
+    with Arikedb(port=server.port, replicas=addresses, hedge_reads=True, hedge_delay=60.0) as client:
+        for server in replica_servers:
+            server.fake.collections["collection1"] = {"variables": {}, "stacks": {}, "fifos": {}, "sorted_lists": {}}
+        for _ in range(4):
+            client.collections()
+
+        assert client.replicas.hedged == 0
+        assert [server.fake.calls["ListCollections"] for server in replica_servers] == [2, 2]
+
+
+def test_hedges_leave_first_attempts_in_turn(replica_servers):
+    with Arikedb(port=replica_servers[0].port, replicas=[s.address for s in replica_servers]) as client:
+        replicas = client.replicas
+        firsts = []
+        for _ in range(4):
+            first = replicas._pick()
+            assert replicas._pick(exclude=first) is not first
+            firsts.append(first)
+
+        assert firsts == replicas.replicas * 2
+
+
+def test_hedges_share_one_thread(replica_servers):
+    addresses = [server.address for server in replica_servers]
+    with Arikedb(port=replica_servers[0].port, replicas=addresses, hedge_reads=True, hedge_delay=0.0) as client:
+        for _ in range(50):
+            client.collections()
+        hedge_threads = [t for t in threading.enumerate() if t.name == "arikedb-hedges"]
+        assert client.replicas.hedged > 0
+        assert client.replicas.reads == 50
+
+    assert len(hedge_threads) == 1
+    assert not hedge_threads[0].is_alive()
+    assert not any(isinstance(t, threading.Timer) for t in threading.enumerate())
+
+
+def test_hedge_timers_run_in_order_and_cancel():
+    timers = HedgeTimers()
+    called = []
+    done = threading.Event()
+    timers.schedule(0.05, lambda: called.append("late") or done.set())
+    cancelled = timers.schedule(0.01, lambda: called.append("cancelled"))
+    timers.schedule(0.0, lambda: called.append("first"))
+    timers.cancel(cancelled)
+
+    assert done.wait(5.0)
+    timers.close()
+    assert called == ["first", "late"]
+    with pytest.raises(RuntimeError):
+        timers.schedule(0.0, lambda: None)
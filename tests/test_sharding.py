@@ -0,0 +1,252 @@
+import queue
+import time
+
+import pytest
+
+from arikedb import HashRing, ShardedArikedb, ValueType, VarEvent, Event
+from fake_server import FakeServer
+
+KEYS = [f"collection/var{i}" for i in range(20_000)]
+
+
+def test_hash_ring_add_moves_keys_to_new_node_only():
+    ring = HashRing(["node0", "node1", "node2"])
+    before = {key: ring.node_for(key) for key in KEYS}
+    ring.add("node3")
+
+    moved = [key for key in KEYS if ring.node_for(key) != before[key]]
+    assert all(ring.node_for(key) == "node3" for key in moved)
+    assert 0.15 < len(moved) / len(KEYS) < 0.35
+
+
+def test_hash_ring_remove_moves_keys_of_removed_node_only():
+    ring = HashRing(["node0", "node1", "node2", "node3"])
+    before = {key: ring.node_for(key) for key in KEYS}
+    ring.remove("node1")
+
+    for key in KEYS:
+        if before[key] != "node1":
+            assert ring.node_for(key) == before[key]
+        else:
+            assert ring.node_for(key) != "node1"
+    assert 0.15 < sum(node == "node1" for node in before.values()) / len(KEYS) < 0.35
+
+
+def test_hash_ring_spreads_keys():
+    ring = HashRing(["node0", "node1", "node2"])
+    counts = {}
+    for key in KEYS:
+        node = ring.node_for(key)
+        counts[node] = counts.get(node, 0) + 1
+    assert min(counts.values()) > len(KEYS) / 3 * 0.7
+
+
+@pytest.fixture
+def servers():
+    servers = [FakeServer() for _ in range(3)]
+    yield servers
+    for server in servers:
+        server.stop()
+
+
+@pytest.fixture
+def sharded(servers):
+    with ShardedArikedb([server.address for server in servers], shard_by="variable") as db:
+        db.create_collections(["collection1"])
+        yield db
+
+
+def names_sent(server, method):
+    return [v.name for m, request in server.fake.requests if m == method for v in request.values]
+
+
+def test_collections_exist_on_every_node(servers, sharded):
+    assert all("collection1" in server.fake.collections for server in servers)
+    assert [c.name for c in sharded.collections()] == ["collection1"]
+
+
+def test_variables_split_per_node_and_merged(servers, sharded):
+    collection = sharded.collection("collection1")
+    names = [f"var{i}" for i in range(30)]
+    assert collection.create_ts_variables([(name, ValueType.Int) for name in names]) == {"already_exists": []}
+    assert len(collection.ts_variables()) == 30
+
+    result = collection.ts_variables_set([(name, i) for i, name in enumerate(names)] + [("missing", 1)])
+    assert result == {"not_found": ["missing"], "invalid_type": []}
+
+    # Each node only got the names it owns, in a single request
+    sent = {}
+    for server in servers:
+        assert server.fake.calls["SetVariables"] == 1
+        for name in names_sent(server, "SetVariables"):
+            sent[name] = server.address
+    assert len(set(sent.values())) == 3
+    for name in names:
+        assert sharded.client(f"collection1/{name}")._port == int(sent[name].rsplit(":", 1)[1])
+
+    # Results come back in the order asked
+    asked = list(reversed(names))
+    assert [v[0] for v in collection.ts_variables_get(asked)] == asked
+    assert [v[2] for v in collection.ts_variables_get(asked)] == list(range(29, -1, -1))
+    assert collection.ts_variables_get_async(asked).result() == collection.ts_variables_get(asked)
+
+    assert collection.ts_variables_set_columns(names, list(range(100, 130))) == {"not_found": [], "invalid_type": []}
+    assert [v[2] for v in collection.ts_variables_get(names[:3])] == [100, 101, 102]
+    assert collection.ts_variables_set_async([(names[0], -1)]).result() == {"not_found": [], "invalid_type": []}
+    assert collection.ts_variables_get([names[0]])[0][2] == -1
+
+
+def test_empty_batches_keep_result_shape(sharded):
+    collection = sharded.collection("collection1")
+    assert collection.ts_variables_set([]) == {"not_found": [], "invalid_type": []}
+    assert collection.ts_variables_get([]) == []
+    assert collection.create_ts_variables([]) == {"already_exists": []}
+    assert collection.fifos_push([]) == {"not_found": [], "invalid_type": [], "non_inserted": {}}
+    assert sharded.create_collections([]) == {"already_exists": [], "license_exceeded": []}
+
+
+def test_arrays_split_per_node(sharded):
+    np = pytest.importorskip("numpy")
+    collection = sharded.collection("collection1")
+    names = [f"fifo{i}" for i in range(10)]
+    collection.create_fifos([(name, ValueType.Int, None) for name in names])
+    collection.fifos_push([(name, [i, i + 1]) for i, name in enumerate(names)])
+
+    buffers = {name: np.zeros(4, dtype=np.int64) for name in names}
+    pulled = collection.fifos_pull([(name, 2) for name in names], out=buffers)
+    assert [name for name, _ in pulled] == names
+    for i, (name, values) in enumerate(pulled):
+        assert list(values) == [i, i + 1]
+        assert list(buffers[name][:2]) == [i, i + 1]
+
+    collection.fifos_push_async([(names[0], [7])]).result()
+    assert collection.fifos_pull_async([names[0]]).result() == [(names[0], [7])]
+
+
+def test_writer_and_subscription(sharded):
+    collection = sharded.collection("collection1")
+    collection.create_ts_variables([(f"var{i}", ValueType.Int) for i in range(10)])
+
+    with collection.writer(flush_interval=60.0) as writer:
+        writer.write_many([(f"var{i}", i) for i in range(10)])
+        assert writer.flush(5.0)
+    assert [v[2] for v in collection.ts_variables_get([f"var{i}" for i in range(10)])] == list(range(10))
+
+    with collection.subscribe(["var0"], [VarEvent(Event.OnSet)]) as subscription:
+        time.sleep(0.2)
+        collection.ts_variables_set([("var0", 42)])
+        assert next(iter(subscription))[2] == 42
+
+    spread = [f"var{i}" for i in range(10)]
+    with pytest.raises(ValueError):
+        collection.subscribe(spread, [VarEvent(Event.OnSet)])
+
+
+def test_collection_mode_routes_to_one_node(servers):
+    with ShardedArikedb([server.address for server in servers]) as db:
+        db.create_collections(["collection1", "collection2", "collection3", "collection4"])
+        owners = {name: db.client(name)._port for name in ["collection1", "collection2", "collection3", "collection4"]}
+        for server in servers:
+            assert sorted(server.fake.collections) == sorted(n for n, port in owners.items() if port == server.port)
+
+        collection = db.collection("collection1")
+        collection.create_ts_variables([("var0", ValueType.Float)])
+        collection.ts_variables_set([("var0", 1.5)])
+        assert collection.ts_variables_get(["var0"])[0][2] == 1.5
+
+
+def test_repeated_names_get_one_row_each(sharded):
+    collection = sharded.collection("collection1")
+    collection.create_ts_variables([(f"var{i}", ValueType.Int) for i in range(6)])
+    collection.ts_variables_set([(f"var{i}", i) for i in range(6)])
+
+    names = ["var0", "var3", "var0", "var5", "var3"]
+    assert [v[0] for v in collection.ts_variables_get(names)] == names
+    assert [v[0] for v in collection.ts_variables_get_async(names).result()] == names
+    assert [v[0] for v in collection.prepare_get(names).execute()] == names
+
+
+def test_prepared_and_backfill(sharded):
+    collection = sharded.collection("collection1")
+    names = [f"var{i}" for i in range(8)]
+    collection.create_ts_variables([(name, ValueType.Int) for name in names])
+
+    prepared = collection.prepare_set(names)
+    assert prepared.execute(list(range(8))) == {"not_found": [], "invalid_type": []}
+    assert sorted(prepared.execute([1.5] * 8)["invalid_type"]) == names
+    get = collection.prepare_get(list(reversed(names)))
+    assert [v[2] for v in get.execute()] == list(range(7, -1, -1))
+    columns = get.execute(columnar=True)
+    assert list(columns[0]) == list(reversed(names))
+
+    result = collection.ts_variables_backfill([(name, [1, 2, 3], [5, 5, 5]) for name in names] + [("missing", [1], [1])])
+    assert result["not_found"] == ["missing"]
+    assert result["points"] == 25
+    assert result["sent"] == 17
+    assert [v[2] for v in collection.ts_variables_get(names)] == [5] * 8
+
+
+def test_value_cache_and_set_coalescing_per_node(sharded):
+    collection = sharded.collection("collection1")
+    names = [f"var{i}" for i in range(6)]
+    collection.create_ts_variables([(name, ValueType.Int) for name in names])
+    collection.ts_variables_set([(name, 1) for name in names])
+
+    caches = collection.enable_value_cache()
+    coalescers = collection.enable_set_coalescing(window=0.05)
+    try:
+        assert len(caches) == len(coalescers) == 3
+        collection.ts_variables_get(names)
+        collection.ts_variables_get(names)
+        assert sum(cache.hits for cache in caches) == 6
+
+        futures = [collection.ts_variable(name).set(2) for name in names]
+        assert all(future.result(5.0) == {"not_found": [], "invalid_type": []} for future in futures)
+        assert sum(coalescer.values for coalescer in coalescers) == 6
+    finally:
+        collection.disable_set_coalescing()
+        collection.disable_value_cache()
+    assert [v[2] for v in collection.ts_variables_get(names)] == [2] * 6
+
+
+def test_subscription_manager_spans_nodes(sharded):
+    collection = sharded.collection("collection1")
+    names = [f"var{i}" for i in range(30)]
+    collection.create_ts_variables([(name, ValueType.Int) for name in names])
+    received = queue.Queue()
+
+    nodes = len({sharded.client(f"collection1/{name}") for name in names})
+
+    manager = collection.subscription_manager
+    interest = manager.add(names, [VarEvent(Event.OnSet)], received.put)
+    try:
+        deadline = time.monotonic() + 5.0
+        while manager.streams < nodes and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert manager.streams == nodes
+        collection.ts_variables_set([(name, 3) for name in names])
+        assert sorted(received.get(timeout=5.0)[0] for _ in names) == sorted(names)
+        manager.remove(interest)
+    finally:
+        manager.close()
+
+
+def test_multi_get_set_verify_and_policy(servers, sharded):
+    sharded.create_collections(["collection2"])
+    for name in ["collection1", "collection2"]:
+        sharded.collection(name).create_ts_variables([("var0", ValueType.Int), ("var1", ValueType.Int)])
+
+    result = sharded.multi_set({"collection1": [("var0", 1), ("var1", 2)],
+                                sharded.collection_handle("collection2"): [("var0", 3)]})
+    assert result["errors"] == {}
+    assert result["results"]["collection1"] == {"not_found": [], "invalid_type": []}
+    result = sharded.multi_get({"collection1": ["var1", "var0"], "collection2": ["var0"]})
+    assert [v[2] for v in result["results"]["collection1"]] == [2, 1]
+    assert [v[2] for v in result["results"]["collection2"]] == [3]
+
+    with pytest.raises(ValueError):
+        sharded.multi_get({"collection1": ["var0"], sharded.collection_handle("collection1"): ["var1"]})
+
+    assert sharded.verify_collections(["collection1", "missing", sharded.collection_handle("collection2")]) == ["missing"]
+    assert all(client.policy is sharded.policy for client in sharded._clients.values())
+    assert sharded.policy.stats("GetVariables").attempts > 0
@@ -0,0 +1,145 @@
+import time
+from threading import Thread
+
+import grpc
+import pytest
+
+from arikedb import Arikedb, VarEvent, Event, ValueType
+from arikedb.common import Unauthenticated
+from fake_server import FakeServer
+
+
+def consume(subscription, values, errors):
+
+    def _run():
+        try:
+            for value in subscription:
+                values.append(value)
+        except grpc.RpcError as e:
+            errors.append(e)
+
+    thread = Thread(target=_run, daemon=True)
+    thread.start()
+    return thread
+
+
+def wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.02)
+    return True
+
+
+def test_resilient_subscription_survives_server_restart(server, collection):
+    gaps = []
+    subscription = collection.subscribe(["int_var"], [VarEvent(Event.OnSet)], resilient=True, backoff=0.05,
+                                        max_backoff=0.2, on_gap=lambda start, end: gaps.append((start, end)))
+    values, errors = [], []
+    thread = consume(subscription, values, errors)
+    time.sleep(0.2)
+    collection.ts_variables_set([("int_var", 1)])
+    assert wait_until(lambda: len(values) == 1)
+
+    server.stop()
+    time.sleep(1.0)
+    server.start()
+
+    # Set while the subscription may still be reconnecting: delivered by the stream or the catch-up read
+    assert wait_until(lambda: _try_set(collection, 2))
+    assert wait_until(lambda: [v[2] for v in values] == [1, 2])
+    collection.ts_variables_set([("int_var", 3)])
+    assert wait_until(lambda: [v[2] for v in values] == [1, 2, 3])
+
+    # A single outage is a single reconnect and gap, whatever the number of attempts
+    assert subscription.reconnects == 1
+    assert len(gaps) == 1
+    assert gaps[0][0] < gaps[0][1]
+    assert subscription.downtime >= 1.0
+
+    subscription.cancel()
+    thread.join(2)
+    assert not errors
+
+
+def test_resilient_subscription_gives_up_after_max_retries(server, collection):
+    subscription = collection.subscribe(["int_var"], [VarEvent(Event.OnSet)], resilient=True, backoff=0.05,
+                                        max_backoff=0.1, max_retries=2)
+    values, errors = [], []
+    thread = consume(subscription, values, errors)
+    time.sleep(0.2)
+
+    server.stop()
+    thread.join(3)
+    assert not thread.is_alive()
+    assert len(errors) == 1
+    assert errors[0].code() == grpc.StatusCode.UNAVAILABLE
+    assert subscription.reconnects == 0
+
+
+@pytest.fixture
+def auth_collection():
+    server = FakeServer(users={"user": "password"})
+    with Arikedb(port=server.port, username="user", password="password") as client:
+        client.create_collections(["collection1"])
+        collection = client.collection_handle("collection1")
+        collection.create_ts_variables([("int_var", ValueType.Int)])
+        yield server, collection
+    server.stop()
+
+
+def test_resilient_subscriptions_reauthenticate_once(auth_collection):
+    server, collection = auth_collection
+    subscriptions = [
+        collection.subscribe(["int_var"], [VarEvent(Event.OnSet)], resilient=True, backoff=0.05, max_backoff=0.1)
+        for _ in range(4)
+    ]
+    consumers = [(subscription, []) for subscription in subscriptions]
+    errors = []
+    threads = [consume(subscription, values, errors) for subscription, values in consumers]
+    time.sleep(0.2)
+
+    # The restarted server forgot the tokens
+    server.stop()
+    server.start()
+    assert wait_until(lambda: _try_set(collection, 1))
+    assert wait_until(lambda: all([v[2] for v in values] == [1] for _, values in consumers))
+    assert server.fake.calls["Authenticate"] == 1
+
+    for subscription, thread in zip(subscriptions, threads):
+        subscription.cancel()
+        thread.join(2)
+    assert not errors
+
+
+def test_resilient_subscription_backs_off_failed_authentication(auth_collection):
+    server, collection = auth_collection
+    subscription = collection.subscribe(["int_var"], [VarEvent(Event.OnSet)], resilient=True, backoff=0.05,
+                                        max_backoff=0.1)
+    values, errors = [], []
+    thread = consume(subscription, values, errors)
+    time.sleep(0.2)
+
+    server.stop()
+    server.users = {"user": "other password"}
+    server.start()
+    assert wait_until(lambda: isinstance(subscription.last_error, Unauthenticated))
+    assert wait_until(lambda: server.fake.calls.get("Authenticate", 0) >= 3)
+    assert thread.is_alive()
+
+    server.fake.users = {"user": "password"}
+    assert wait_until(lambda: _try_set(collection, 1))
+    assert wait_until(lambda: [v[2] for v in values] == [1])
+
+    subscription.cancel()
+    thread.join(2)
+    assert not errors
+
+
+def _try_set(collection, value):
+    try:
+        collection.ts_variables_set([("int_var", value)])
+    except (grpc.RpcError, Unauthenticated):
+        return False
+    return True
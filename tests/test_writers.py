@@ -0,0 +1,70 @@
+import grpc
+import pytest
+
+from arikedb import BufferedWriter, DeadbandWriter, ValueType
+
+
+def test_deadband_writer_forgets_values_dropped_by_writer(collection):
+    collection.create_ts_variables([("var0", ValueType.Int), ("var1", ValueType.Int), ("var2", ValueType.Int)])
+    with BufferedWriter(collection, max_queue=2, flush_interval=60.0, overflow="drop") as buffered:
+        deadband = DeadbandWriter(collection, absolute=10.0, writer=buffered)
+
+        assert deadband.write_many([("var0", 1), ("var1", 1), ("var2", 1)]) == 2
+        assert deadband.sent == 2
+        assert buffered.dropped == 1
+
+        assert buffered.flush(5.0)
+        # var2 was never sent, so its next value is sent even within the deadband
+        assert deadband.write("var2", 2)
+        assert not deadband.write("var0", 2)
+        assert buffered.flush(5.0)
+
+    assert [v[2] for v in collection.ts_variables_get(["var0", "var1", "var2"])] == [1, 1, 2]
+
+
+def test_set_coalescer_batches_and_slices_results(collection):
+    coalescer = collection.enable_set_coalescing(window=0.2)
+    try:
+        futures = [
+            collection.ts_variable("int_var").set(3),
+            collection.ts_variable("float_var").set(4),
+            coalescer.submit("missing", 5),
+        ]
+        results = [future.result(5.0) for future in futures]
+    finally:
+        collection.disable_set_coalescing()
+
+    assert coalescer.requests == 1
+    assert coalescer.values == 3
+    assert results == [
+        {"not_found": [], "invalid_type": []},
+        {"not_found": [], "invalid_type": ["float_var"]},
+        {"not_found": ["missing"], "invalid_type": []},
+    ]
+    assert collection.ts_variables_get(["int_var"])[0][2] == 3
+
+
+def test_set_coalescer_rejects_unsupported_value_alone(collection):
+    coalescer = collection.enable_set_coalescing(window=0.2)
+    try:
+        valid = coalescer.submit("int_var", 1)
+        with pytest.raises(TypeError):
+            coalescer.submit("float_var", None)
+        assert valid.result(5.0) == {"not_found": [], "invalid_type": []}
+    finally:
+        collection.disable_set_coalescing()
+
+    assert coalescer.requests == 1
+    assert collection.ts_variables_get(["int_var"])[0][2] == 1
+
+
+def test_set_coalescer_fails_futures_of_failed_request(server, collection):
+    coalescer = collection.enable_set_coalescing(window=0.2)
+    try:
+        server.fake.fail_next["SetVariables"] = 1
+        futures = [coalescer.submit("int_var", 1), coalescer.submit("float_var", 1.5)]
+        for future in futures:
+            with pytest.raises(grpc.RpcError):
+                future.result(5.0)
+    finally:
+        collection.disable_set_coalescing()